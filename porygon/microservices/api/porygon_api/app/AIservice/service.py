@@ -34,7 +34,7 @@ class AIService:
             model_input = [{"input": request.query}]
             logger.info(f"Preparing model input: {model_input}")
 
-            result = model_manager.predict(model_input)
+            result = await model_manager.apredict(model_input)
 
             if result is None:
                 logger.error("Prediction result is empty")
@@ -55,6 +55,12 @@ async def health_check():
     }
 
 
+@app.get("/serving/stats")
+async def get_serving_stats():
+    """MLflow serving 連線池與請求統計"""
+    return model_manager.pool_stats()
+
+
 @app.get("/metric")
 async def get_api_metrics(date: str = Query(None, description="日期格式 YYYY-MM-DD，默認為最近24小時")):
 
@@ -103,3 +109,4 @@ async def startup_event():
 async def shutdown_event():
     """應用關閉時執行的操作"""
     logger.info("Porygon API Server is closing...")
+    await model_manager.aclose()
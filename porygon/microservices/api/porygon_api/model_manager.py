@@ -1,10 +1,18 @@
 import logging
 import requests
 import os
-from typing import List, Dict, Any
+import time
+import random
+import asyncio
+import threading
+import httpx
+from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# 這些狀態碼代表 serving 端暫時無法處理，可以重試
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
 
 class MLflowModelManager:
     _instance = None
@@ -27,10 +35,136 @@ class MLflowModelManager:
             "http://35.201.255.108"
         )
         self.endpoint_url = f"{self.mlflow_endpoint}/invocations"
+
+        # 連線池與重試設定
+        self.max_connections = int(os.getenv("MLFLOW_SERVING_MAX_CONNECTIONS", 20))
+        self.max_keepalive_connections = int(os.getenv("MLFLOW_SERVING_MAX_KEEPALIVE", 10))
+        self.keepalive_expiry = float(os.getenv("MLFLOW_SERVING_KEEPALIVE_EXPIRY", 30))
+        self.connect_timeout = float(os.getenv("MLFLOW_SERVING_CONNECT_TIMEOUT", 5))
+        # 單次請求 (含重試) 的總時限
+        self.deadline = float(os.getenv("MLFLOW_SERVING_TIMEOUT", 30))
+        self.max_retries = int(os.getenv("MLFLOW_SERVING_MAX_RETRIES", 2))
+        self.retry_backoff = float(os.getenv("MLFLOW_SERVING_RETRY_BACKOFF", 0.2))
+        self.http2 = os.getenv("MLFLOW_SERVING_HTTP2", "true").lower() == "true"
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._session = requests.Session()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "in_flight": 0, "retries": 0, "errors": 0, "timeouts": 0}
         self._initialized = True
 
         logger.info(f"MLflow serving endpoint configured: {self.endpoint_url}")
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """延遲建立共用的 AsyncClient，keep-alive 連線在請求之間重複使用"""
+        if self._client is None or self._client.is_closed:
+            if self.http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("h2 is not installed, falling back to HTTP/1.1")
+                    self.http2 = False
+
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.deadline, connect=self.connect_timeout),
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    def _count(self, key: str, delta: int = 1):
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def _backoff(self, attempt: int, remaining: float) -> float:
+        """指數退避加上 full jitter，不超過剩餘時限"""
+        return min(remaining, random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    async def apredict(self, model_input: List[Dict[str, Any]], timeout: Optional[float] = None) -> Any:
+        """
+        以共用連線池非同步呼叫 MLflow model serving endpoint
+        連線錯誤與 429/502/503/504 會在時限內重試
+        Args:
+            model_input: 模型輸入，格式為 List[Dict[str, Any]]
+            timeout: 本次請求 (含重試) 的總時限，預設為 MLFLOW_SERVING_TIMEOUT
+        Returns:
+            模型預測結果
+        """
+        payload = {"inputs": model_input[0]}
+        deadline = time.monotonic() + (timeout or self.deadline)
+        client = self._get_client()
+
+        self._count("requests")
+        self._count("in_flight")
+        try:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    raise httpx.TimeoutException(f"Deadline exceeded calling {self.endpoint_url}")
+
+                try:
+                    response = await client.post(
+                        self.endpoint_url,
+                        json=payload,
+                        timeout=httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining)),
+                    )
+                    if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                        logger.warning(f"MLflow serving returned {response.status_code}, retrying ({attempt + 1}/{self.max_retries})")
+                    else:
+                        response.raise_for_status()
+                        result = response.json()
+                        logger.info(f"Received response from MLflow serving: {result}")
+                        return result
+                except httpx.TransportError as e:
+                    if isinstance(e, httpx.TimeoutException) and time.monotonic() >= deadline:
+                        self._count("timeouts")
+                        raise
+                    if attempt >= self.max_retries:
+                        raise
+                    logger.warning(f"MLflow serving connection error: {str(e)}, retrying ({attempt + 1}/{self.max_retries})")
+
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt, max(0.0, deadline - time.monotonic())))
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Failed to call MLflow serving endpoint: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error(f"Error response text: {e.response.text}")
+            raise
+        finally:
+            self._count("in_flight", -1)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """連線池與請求統計"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "http2": self.http2,
+        })
+
+        # httpx 沒有公開連線池狀態，依賴的是 httpcore 內部屬性，取不到時略過
+        transport = getattr(self._client, "_transport", None)
+        connections = getattr(getattr(transport, "_pool", None), "connections", None)
+        if isinstance(connections, list):
+            stats["open_connections"] = len(connections)
+            stats["idle_connections"] = sum(
+                1 for conn in connections if callable(getattr(conn, "is_idle", None)) and conn.is_idle()
+            )
+        return stats
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._session.close()
+
     def predict(self, model_input: List[Dict[str, Any]]) -> Any:
         """
         調用 GKE 中的 MLflow model serving endpoint 進行預測
@@ -51,7 +185,7 @@ class MLflowModelManager:
             logger.info(f"Sending request to MLflow serving endpoint: {self.endpoint_url}")
             logger.info(f"Request payload: {payload}")
             logger.info(f"Attempting to connect to: {self.endpoint_url}")
-            response = requests.post(
+            response = self._session.post(
                 url=self.endpoint_url,
                 json=payload,
                 headers=headers,
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from porygon_api.model_manager import model_manager
+
+
+@pytest.fixture
+def serving(monkeypatch):
+    """以 httpx.MockTransport 取代 serving endpoint，handler 依序回傳 responses"""
+    calls = []
+
+    def install(*responses):
+        def handler(request):
+            calls.append(request)
+            response = responses[min(len(calls), len(responses)) - 1]
+            return response(request) if callable(response) else response
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(model_manager, "_client", client)
+        return calls
+
+    monkeypatch.setattr(model_manager, "retry_backoff", 0.001)
+    monkeypatch.setattr(model_manager, "max_retries", 2)
+    monkeypatch.setattr(model_manager, "_stats", dict.fromkeys(model_manager._stats, 0))
+    return install
+
+
+def test_retries_retryable_status_then_succeeds(serving):
+    calls = serving(httpx.Response(503), httpx.Response(502), httpx.Response(200, json={"predictions": ["ok"]}))
+
+    result = asyncio.run(model_manager.apredict([{"input": "hi"}]))
+
+    assert result == {"predictions": ["ok"]}
+    assert len(calls) == 3
+    stats = model_manager.pool_stats()
+    assert (stats["retries"], stats["errors"], stats["in_flight"]) == (2, 0, 0)
+
+
+def test_gives_up_after_max_retries(serving):
+    calls = serving(httpx.Response(503))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(model_manager.apredict([{"input": "hi"}]))
+    assert len(calls) == 3
+    assert model_manager.pool_stats()["errors"] == 1
+
+
+def test_does_not_retry_client_errors(serving):
+    calls = serving(httpx.Response(400))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(model_manager.apredict([{"input": "hi"}]))
+    assert len(calls) == 1
+
+
+def test_retries_transport_errors(serving):
+    def refuse(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    calls = serving(refuse, httpx.Response(200, json={"predictions": ["ok"]}))
+
+    assert asyncio.run(model_manager.apredict([{"input": "hi"}])) == {"predictions": ["ok"]}
+    assert len(calls) == 2
+
+
+def test_deadline_covers_all_attempts(serving, monkeypatch):
+    # 退避時間遠大於時限，第二次嘗試前就應該因時限結束
+    monkeypatch.setattr(model_manager, "retry_backoff", 10)
+    monkeypatch.setattr(model_manager, "max_retries", 5)
+    monkeypatch.setattr("porygon_api.model_manager.random.uniform", lambda low, high: high)
+    calls = serving(httpx.Response(503))
+
+    start = time.monotonic()
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(model_manager.apredict([{"input": "hi"}], timeout=0.1))
+    assert time.monotonic() - start < 1
+    assert len(calls) == 1
+    assert model_manager.pool_stats()["timeouts"] == 1
+
+
+def test_backoff_has_full_jitter_and_respects_deadline(monkeypatch):
+    monkeypatch.setattr(model_manager, "retry_backoff", 0.2)
+    delays = [model_manager._backoff(3, remaining=10) for _ in range(200)]
+    assert all(0 <= delay <= 0.2 * 2 ** 3 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(model_manager._backoff(3, remaining=0.05) for _ in range(50)) <= 0.05
+
+
+def test_pool_stats_without_httpcore_pool(serving):
+    # MockTransport 沒有 _pool，只回傳計數
+    serving(httpx.Response(200, json={}))
+    stats = model_manager.pool_stats()
+    assert "open_connections" not in stats
+    assert stats["max_connections"] == model_manager.max_connections
@@ -10,6 +10,8 @@ mlflow.set_tracking_uri(MLFLOW_URI)
 
 EXPERIMENT_NAME = "Porygon_EXPERIMENT"
 AGENT_NAME = "Porygon_wikipedia_agent"
+# API 服務透過 MODEL_ALIAS_URI=models:/Porygon_wikipedia_agent@production 輪詢此 alias 熱切換
+MODEL_ALIAS = os.getenv("MODEL_ALIAS", "production")
 
 experiment_info = mlflow.get_experiment_by_name(EXPERIMENT_NAME)
 if experiment_info:
@@ -41,6 +43,13 @@ with mlflow.start_run(run_name="porygon-wikipedia-agent", tags=tags) as run:
         )
         print(f"Registered model: {registered_model.name} version {registered_model.version}")
 
+        mlflow.MlflowClient().set_registered_model_alias(
+            name=AGENT_NAME,
+            alias=MODEL_ALIAS,
+            version=registered_model.version
+        )
+        print(f"Alias '{MODEL_ALIAS}' -> version {registered_model.version}")
+
     except Exception as e:
         print(f"Error: {e}")
         import traceback
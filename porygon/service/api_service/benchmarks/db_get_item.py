@@ -0,0 +1,173 @@
+"""
+比較 ItemService.get_item 使用同步 execute_query (pg8000，阻塞 event loop) 與
+async aexecute_query (asyncpg) 時，同一個 event loop 上並發查詢的吞吐量
+
+先啟動本地 Postgres:
+
+    docker run --rm -d --name porygon-pg -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+
+    cd porygon/service/api_service
+    DB_HOST=127.0.0.1 DB_USER=postgres DB_PASSWORD=postgres DB_NAME=postgres \\
+        python -m benchmarks.db_get_item --items 1000 --requests 5000 --concurrency 50
+
+本機 Postgres 16 (同一台機器，--items 1000 --requests 3000 --concurrency 50) 的結果:
+
+    delay_ms=0, pool_size=5
+    sync execute_query (pg8000)         1036 req/s  p50    0.92 ms  p99    2.09 ms  loop lag p99 2895.58 ms
+    aexecute_query (asyncpg)             925 req/s  p50   46.13 ms  p99  236.40 ms  loop lag p99    6.81 ms
+
+    delay_ms=2, pool_size=5
+    sync execute_query (pg8000)          218 req/s  p50    3.96 ms  p99   13.14 ms  loop lag p99 13772.41 ms
+    aexecute_query (asyncpg)             887 req/s  p50   49.92 ms  p99  207.46 ms  loop lag p99    5.88 ms
+
+本機查詢不到 1ms 時同步版本吞吐量略高，但整段期間 event loop 被卡住 (其他請求無法處理)；
+查詢有 2ms 延遲 (接近 Cloud SQL) 時 asyncpg 吞吐量約為 4 倍，p50 由單一 event loop 的 CPU 決定，
+DB_POOL_SIZE=20 時結果相近 (852 req/s)
+"""
+import time
+import random
+import asyncio
+import argparse
+from typing import Awaitable, Callable, List
+
+from porygon_api.database.db_connector import cloud_sql_connector
+
+# items.id 為 VARCHAR，asyncpg 不做隱式轉型，參數明確轉成相同型別
+ITEM_QUERY = """
+SELECT id, name, description, price, quantity, category
+FROM items
+WHERE id = CAST(:id AS VARCHAR)
+"""
+
+# --delay-ms 時以 pg_sleep 模擬 Cloud SQL 的網路與查詢延遲
+DELAYED_ITEM_QUERY = """
+SELECT id, name, description, price, quantity, category
+FROM items, pg_sleep(:delay)
+WHERE id = CAST(:id AS VARCHAR)
+"""
+
+
+def seed_items(count: int):
+    """建立 items 資料表並寫入 count 筆資料 (已存在的 id 會略過)"""
+    cloud_sql_connector.execute_query("""
+    CREATE TABLE IF NOT EXISTS items (
+        id VARCHAR(255) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        description TEXT,
+        price FLOAT NOT NULL,
+        quantity INTEGER NOT NULL,
+        category VARCHAR(255)
+    )
+    """)
+    result = cloud_sql_connector.execute_query(
+        """
+        INSERT INTO items (id, name, description, price, quantity, category)
+        SELECT 'item-' || i, 'Item ' || i, 'benchmark item', i * 1.5, mod(i, 100), 'cat-' || mod(i, 10)
+        FROM generate_series(1, :count) AS i
+        ON CONFLICT (id) DO NOTHING
+        """,
+        {"count": count},
+    )
+    if result["status"] != "success":
+        raise RuntimeError(f"Failed to seed items: {result.get('message')}")
+
+    # 資料表已存在時 CREATE TABLE IF NOT EXISTS 不會檢查欄位型別
+    result = cloud_sql_connector.execute_query(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'items' AND column_name = 'id'"
+    )
+    data_type = result["data"][0]["data_type"] if result["status"] == "success" and result["data"] else None
+    if data_type != "character varying":
+        raise RuntimeError(f"items.id must be VARCHAR, got {data_type}")
+
+
+def _query(item_id: str, delay_ms: float):
+    if delay_ms:
+        return DELAYED_ITEM_QUERY, {"id": item_id, "delay": delay_ms / 1000}
+    return ITEM_QUERY, {"id": item_id}
+
+
+async def sync_get_item(item_id: str, delay_ms: float = 0):
+    """原本的做法: async def 中直接呼叫同步的 execute_query"""
+    return cloud_sql_connector.execute_query(*_query(item_id, delay_ms))
+
+
+async def async_get_item(item_id: str, delay_ms: float = 0):
+    return await cloud_sql_connector.aexecute_query(*_query(item_id, delay_ms))
+
+
+async def run(get_item: Callable[..., Awaitable], ids: List[str], concurrency: int, delay_ms: float) -> dict:
+    queue = list(ids)
+    latencies: List[float] = []
+    # 同時量測 event loop 被阻塞的程度: 每 1ms 排程一次，記錄實際延遲
+    loop_lag: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            scheduled = time.perf_counter()
+            await asyncio.sleep(0.001)
+            loop_lag.append(time.perf_counter() - scheduled - 0.001)
+
+    async def worker():
+        while queue:
+            item_id = queue.pop()
+            start = time.perf_counter()
+            result = await get_item(item_id, delay_ms)
+            latencies.append(time.perf_counter() - start)
+            if result["status"] != "success":
+                raise RuntimeError(result.get("message"))
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+
+    latencies.sort()
+    loop_lag.sort()
+    return {
+        "rps": len(ids) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "loop_lag_p99_ms": loop_lag[int(len(loop_lag) * 0.99) - 1] * 1000 if loop_lag else 0.0,
+    }
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    ids = [f"item-{rng.randint(1, args.items)}" for _ in range(args.requests)]
+
+    # 兩種 pool 都先建立並暖機，不把建立連線的時間算進結果
+    await asyncio.gather(*(async_get_item(ids[0]) for _ in range(5)))
+    await sync_get_item(ids[0])
+
+    print(
+        f"items={args.items} requests={args.requests} concurrency={args.concurrency} "
+        f"delay_ms={args.delay_ms} pool_size={cloud_sql_connector.pool_options['pool_size']}"
+    )
+    for name, get_item in (("sync execute_query (pg8000)", sync_get_item), ("aexecute_query (asyncpg)", async_get_item)):
+        stats = await run(get_item, ids, args.concurrency, args.delay_ms)
+        print(
+            f"{name:<30}{stats['rps']:>10.0f} req/s  p50 {stats['p50_ms']:>7.2f} ms  "
+            f"p99 {stats['p99_ms']:>7.2f} ms  loop lag p99 {stats['loop_lag_p99_ms']:>7.2f} ms"
+        )
+
+    await cloud_sql_connector.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000, help="寫入 items 資料表的筆數")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50, help="同時進行的查詢數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--delay-ms", type=float, default=0, help="每個查詢以 pg_sleep 加入的延遲，模擬實際的網路來回")
+    args = parser.parse_args()
+
+    seed_items(args.items)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+比較原本的 BaseHTTPMiddleware 堆疊與 PipelineMiddleware 在 no-op route 上的每請求開銷
+
+    cd porygon/service/api_service
+    python -m benchmarks.middleware_stack --requests 5000
+
+直接以 ASGI scope 呼叫 app，不經過網路與 HTTP client；BigQuery client 以假物件取代，只量 middleware 本身
+"""
+import io
+import json
+import time
+import uuid
+import asyncio
+import datetime
+import logging
+import argparse
+import statistics
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import mock
+
+with mock.patch("google.cloud.bigquery.Client"):
+    from porygon_api.middleware import logging as bq_logging
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+from porygon_api.middleware.auth import AuthStage
+from porygon_api.middleware.http import TimingStage
+from porygon_api.middleware.pipeline import PipelineMiddleware, RequestIdStage
+from porygon_api.schemas import BaseResponse
+from porygon_api.security.api_key import check_endpoint_permission, verify_api_key
+
+API_KEY = b"admin_key"
+
+
+class _NoopBigQueryClient:
+    def insert_rows_json(self, table_id, rows):
+        return []
+
+
+legacy_bq_client = _NoopBigQueryClient()
+
+
+# 以下三個 middleware 是改成 PipelineMiddleware 之前的實作，固定在這裡作為比較基準
+
+
+class LegacyHttpMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        logging.info(f"Start processing request: {request.method} {request.url.path}")
+
+        try:
+            response = await call_next(request)
+            process_time = time.time() - start_time
+            response.headers["X-Process-Time"] = str(process_time)
+            logging.info(f"Request processed successfully, duration: {process_time:.4f} seconds")
+            return response
+        except Exception as e:
+            process_time = time.time() - start_time
+            logging.error(f"Request processing failed: {str(e)}, duration: {process_time:.4f} seconds")
+            return JSONResponse(
+                status_code=500,
+                content={"detail": "Internal Server Error"}
+            )
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        public_paths = ["/docs", "/openapi.json", "/redoc", "/api/v1/public", "/health/live", "/health/ready"]
+
+        if any(request.url.path.startswith(path) for path in public_paths):
+            return await call_next(request)
+
+        api_key = request.headers.get("X-API-Key")
+        if api_key:
+            try:
+                user_info = verify_api_key(api_key)
+            except HTTPException:
+                logging.warning(f"Invalid API Key: {api_key} for path: {request.url.path}")
+                return JSONResponse(
+                    status_code=401,
+                    content=BaseResponse(responseCode=401, responseMessage="Invalid API Key.", results=None).model_dump()
+                )
+        else:
+            logging.warning(f"Missing API Key for path: {request.url.path}")
+            return JSONResponse(
+                status_code=401,
+                content=BaseResponse(
+                    responseCode=401, responseMessage="Missing authentication credentials.", results=None
+                ).model_dump()
+            )
+
+        request.state.user = user_info
+
+        endpoint_path = request.url.path
+        method = request.method
+
+        if not check_endpoint_permission(user_info, endpoint_path, method):
+            logging.warning(f"Permission denied for user {user_info['user_id']} to access {method} {endpoint_path}")
+            return JSONResponse(
+                status_code=403,
+                content=BaseResponse(
+                    responseCode=403,
+                    responseMessage=f"You do not have permission to access this endpoint: {method} {endpoint_path}",
+                    results=None
+                ).model_dump()
+            )
+
+        return await call_next(request)
+
+
+class LegacyBigQueryLoggingMiddleware(BaseHTTPMiddleware):
+    """讀完整個 request / response body、切換 stdout / stderr，並在請求中同步寫入 BigQuery (這裡以假 client 取代)"""
+
+    async def dispatch(self, request: Request, call_next):
+        log_capture = io.StringIO()
+        request_id = str(uuid.uuid4())
+        request_time = datetime.datetime.now()
+        start_time = time.time()
+        request_body_str = ""
+        response_body_str = ""
+        status_code = 500
+        error = None
+        response = None
+
+        try:
+            request_body = await request.body()
+            request_body_str = request_body.decode("utf-8")
+
+            async def receive():
+                return {"type": "http.request", "body": request_body}
+            request._receive = receive
+
+            with redirect_stdout(log_capture), redirect_stderr(log_capture):
+                try:
+                    response = await call_next(request)
+                    response_body = b""
+                    async for chunk in response.body_iterator:
+                        response_body += chunk
+                    response_body_str = response_body.decode("utf-8")
+                    response = Response(
+                        content=response_body,
+                        status_code=response.status_code,
+                        headers=dict(response.headers),
+                        media_type=response.media_type
+                    )
+                    status_code = response.status_code
+                except Exception as inner_e:
+                    error = str(inner_e)
+                    response = JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+                    status_code = 500
+        finally:
+            process_time = time.time() - start_time
+            row = {
+                "request_id": request_id,
+                "request_body": request_body_str[:8000],
+                "response_body": response_body_str[:8000],
+                "create_time": request_time.isoformat(),
+                "request_time": request_time.isoformat(),
+                "response_time": datetime.datetime.now().isoformat(),
+                "method": request.method,
+                "path": request.url.path,
+                "status_code": status_code,
+                "latency_ms": process_time * 1000,
+                "client_ip": request.client.host if request.client else "unknown",
+                "user_agent": request.headers.get("user-agent", "unknown"),
+                "error": error,
+                "log": log_capture.getvalue()[:8000],
+                "request_headers": json.dumps(dict(request.headers)),
+                "query_params": json.dumps(dict(request.query_params))
+            }
+            legacy_bq_client.insert_rows_json(bq_logging.table_id, [row])
+
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/noop")
+    async def noop():
+        return {"ok": True}
+
+    if stack == "baseline":
+        pass
+    elif stack == "old":
+        app.add_middleware(LegacyBigQueryLoggingMiddleware)
+        app.add_middleware(LegacyAuthMiddleware)
+        app.add_middleware(LegacyHttpMiddleware)
+    elif stack == "new":
+        app.add_middleware(
+            PipelineMiddleware,
+            stages=[RequestIdStage(), TimingStage(), AuthStage(), bq_logging.LoggingStage()]
+        )
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    return app
+
+
+async def call(app, scope):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def run(stack: str, requests: int, warmup: int):
+    app = build_app(stack)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/noop",
+        "raw_path": b"/noop",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"x-api-key", API_KEY)],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    for _ in range(warmup):
+        await call(app, scope)
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call(app, scope)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    args = parser.parse_args()
+
+    # 只量 middleware，不量 log 輸出
+    logging.disable(logging.CRITICAL)
+    bq_logging.bq_shipper.enqueue = lambda row: True
+
+    results = {stack: asyncio.run(run(stack, args.requests, args.warmup)) for stack in ("baseline", "old", "new")}
+    baseline = results["baseline"]["mean_us"]
+    print(f"{'stack':<10}{'mean (us)':>12}{'p50 (us)':>12}{'p99 (us)':>12}{'overhead (us)':>16}")
+    for stack, result in results.items():
+        print(
+            f"{stack:<10}{result['mean_us']:>12.1f}{result['p50_us']:>12.1f}"
+            f"{result['p99_us']:>12.1f}{result['mean_us'] - baseline:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+比較逐一 re.match 的權限檢查與預先編譯的 PermissionMatcher (含 / 不含 decision cache)
+
+    cd porygon/service/api_service
+    python -m benchmarks.permission_matcher --roles 500 --patterns 50
+"""
+import re
+import time
+import random
+import argparse
+from typing import Any, Dict, List, Tuple
+
+from porygon_api.security.api_key import PermissionMatcher
+
+METHODS = ["GET", "POST", "PUT", "DELETE"]
+
+
+def legacy_check(roles_permissions: Dict[str, Dict[str, Any]], role: str, method: str, path: str) -> bool:
+    """原本 check_endpoint_permission 的做法，每次請求重新組 regex"""
+    allowed_endpoints = roles_permissions.get(role, {}).get("endpoints", [])
+    if "*" in allowed_endpoints:
+        return True
+    request_pattern = f"{method} {path}"
+    for pattern in allowed_endpoints:
+        if re.match(pattern.replace("*", ".*"), request_pattern):
+            return True
+    return False
+
+
+def build_roles(roles: int, patterns: int, rng: random.Random) -> Dict[str, Dict[str, Any]]:
+    table = {"admin": {"endpoints": ["*"]}}
+    for r in range(roles):
+        endpoints = []
+        for p in range(patterns):
+            method = rng.choice(METHODS)
+            if rng.random() < 0.5:
+                endpoints.append(f"{method} /api/v1/service{p}/resource{r % 37}/*")
+            else:
+                endpoints.append(f"{method} /api/v1/service{p}/resource{r % 37}/action{p}")
+        table[f"role_{r}"] = {"endpoints": endpoints}
+    return table
+
+
+def build_requests(table: Dict[str, Dict[str, Any]], count: int, distinct: int, rng: random.Random) -> List[Tuple[str, str, str]]:
+    roles = list(table)
+    pool = [
+        (rng.choice(roles), rng.choice(METHODS), f"/api/v1/service{rng.randrange(60)}/resource{rng.randrange(37)}/action{rng.randrange(60)}")
+        for _ in range(distinct)
+    ]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def timed(fn, requests: List[Tuple[str, str, str]]) -> float:
+    start = time.perf_counter()
+    for role, method, path in requests:
+        fn(role, method, path)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", type=int, default=500)
+    parser.add_argument("--patterns", type=int, default=50, help="每個角色的 endpoint pattern 數")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=2000, help="不同 (role, method, path) 組合數")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    table = build_roles(args.roles, args.patterns, rng)
+    requests = build_requests(table, args.requests, args.distinct, rng)
+
+    matcher = PermissionMatcher(table, cache_size=4096)
+
+    # 各角色的 regex 在第一次用到時編譯，先跑一輪編譯並確認結果與原本一致
+    start = time.perf_counter()
+    for role, method, path in requests:
+        matcher._decide(role, method, path)
+    compile_ms = (time.perf_counter() - start) * 1000
+    mismatches = sum(
+        legacy_check(table, role, method, path) != matcher._decide(role, method, path)
+        for role, method, path in requests[:1000]
+    )
+
+    legacy_us = timed(lambda role, method, path: legacy_check(table, role, method, path), requests)
+    compiled_us = timed(matcher._decide, requests)
+    cached_us = timed(matcher.is_allowed, requests)
+
+    print(f"roles={len(table)} patterns/role={args.patterns} requests={args.requests} distinct={args.distinct}")
+    print(f"first pass (lazy compile): {compile_ms:.1f} ms, mismatches vs legacy in 1000 checks: {mismatches}")
+    print(f"{'legacy re.match loop':<28}{legacy_us:>10.2f} us/check")
+    print(f"{'compiled, no cache':<28}{compiled_us:>10.2f} us/check")
+    print(f"{'compiled + LRU cache':<28}{cached_us:>10.2f} us/check  {matcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -50,7 +50,14 @@ echo "Starting Porygon API Service on Project: ${GCP_PROJECT}"
 echo "MLflow Tracking URI: ${MLFLOW_TRACKING_URI}"
 echo "Model URI: ${MODEL_URI}"
 
-# 啟動 Gunicorn 服務器
-exec gunicorn -b "${HOST}:${PORT}" -w 4 --timeout 300 --preload \
+# gunicorn 多個 worker 共用 Prometheus 指標，每次啟動清空
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}" && mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+
+# worker 數，Cloud SQL 的 DB_MAX_CONNECTIONS 依此平分給每個 worker 的 pool
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-4}"
+
+# 啟動 Gunicorn 服務器 (會自動讀取工作目錄下的 gunicorn.conf.py)
+exec gunicorn -b "${HOST}:${PORT}" -w "${WEB_CONCURRENCY}" --timeout 300 --preload \
   --access-logfile=- --error-logfile=- --log-level=info \
   porygon_api.main:app -k uvicorn.workers.UvicornWorker
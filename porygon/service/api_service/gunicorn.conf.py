@@ -0,0 +1,8 @@
+import os
+
+
+def child_exit(server, worker):
+    """worker 結束時移除它的 Prometheus live gauge (in-flight 請求數、模型載入狀態)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
-from porygon_api.app.AIservice.v1 import wikipedia_agent
+from porygon_api.app.AIservice.v1 import wikipedia_agent, models
 
 router = APIRouter()
 
 router.include_router(router=wikipedia_agent.router, prefix="/wikipedia_agent")
+router.include_router(router=models.router, prefix="/models")
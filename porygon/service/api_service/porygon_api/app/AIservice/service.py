@@ -1,7 +1,14 @@
+import os
+import asyncio
 import logging
-from typing import List
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from porygon_api.app.AIservice.schemas import QueryRequest, PredictResponse
 from porygon_api.model_manager import model_manager
+from porygon_api.inference.batching import PredictBatcher
+from porygon_api.inference.executor import InferenceQueueFull, inference_executor
+from porygon_api.inference.streaming import END_OF_STREAM, StreamingCallbackHandler, iterate_events
+from porygon_api.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -20,21 +27,51 @@ class AIService:
         if self._initialized:
             return
         logger.info("Initializing AIService")
+        # 每個模型各自一個批次派發器，合併同時間窗內的請求一次送進 model.predict
+        self.batchers: Dict[str, PredictBatcher] = {}
+        # 相同問題 (忽略大小寫與空白差異) 直接回傳快取的答案
+        self.answer_cache = TTLCache(
+            maxsize=int(os.getenv("AI_CACHE_MAX_SIZE", 1024)),
+            ttl=float(os.getenv("AI_CACHE_TTL_SECONDS", 3600)),
+        )
         self._initialized = True
 
-    async def predict(self, request: QueryRequest) -> List[PredictResponse]:
+    def _get_batcher(self, model_name: str) -> PredictBatcher:
+        batcher = self.batchers.get(model_name)
+        if batcher is None:
+            batcher = PredictBatcher(partial(model_manager.predict, model_name=model_name))
+            self.batchers[model_name] = batcher
+        return batcher
+
+    @staticmethod
+    def _cache_key(model_name: str, query: str) -> Tuple[str, str, str]:
+        """以模型名稱 + model_uri + 正規化後的問題作為快取 key，換模型後舊答案自然失效"""
+        normalized = " ".join(query.split()).casefold()
+        return (model_name, model_manager.get_model_uri(model_name), normalized)
+
+    async def predict(self, request: QueryRequest, model_name: Optional[str] = None) -> List[PredictResponse]:
         """使用模型進行預測
         Args:
             request: 查詢請求，包含用戶輸入
+            model_name: MODEL_REGISTRY 中的模型名稱，預設為預設模型
 
         Returns:
             包含模型預測結果的 List
+        Raises:
+            UnknownModelError: 模型名稱未註冊
         """
+        model_name = model_manager.get_slot(model_name).name
         try:
-            model_input = [{"input": request.query}]
+            cache_key = self._cache_key(model_name, request.query)
+            cached_answer = self.answer_cache.get(cache_key)
+            if cached_answer is not None:
+                logger.info(f"Answer cache hit: {request.query}")
+                return [PredictResponse(answers=cached_answer)]
+
+            model_input = {"input": request.query}
             logger.info(f"Preparing model input: {model_input}")
 
-            result = model_manager.predict(model_input)
+            result = await self._get_batcher(model_name).submit(model_input)
 
             if result is None:
                 logger.error("Prediction result is empty")
@@ -48,9 +85,72 @@ class AIService:
                 answer = str(result)
 
             logger.info(f"Formatted answer: {answer}")
+            self.answer_cache.set(cache_key, answer)
             return [PredictResponse(answers=answer)]
+        except InferenceQueueFull:
+            # 交給 router 回傳 503
+            raise
         except Exception as e:
             logger.error(f"Error occurred during prediction: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return [PredictResponse(answers=f"An internal error occurred: {str(e)[:100]}")]
+
+    async def start_stream(
+        self, request: QueryRequest, model_name: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """開始串流預測
+        排入推論執行緒池的檢查在回傳前完成，呼叫端可以在送出 response header 之前回覆 503
+        Args:
+            request: 查詢請求，包含用戶輸入
+            model_name: MODEL_REGISTRY 中的模型名稱，預設為預設模型
+
+        Returns:
+            依序產生 (event, data) 的 async iterator，最後一個事件為 final 或 error
+        Raises:
+            UnknownModelError: 模型名稱未註冊
+            InferenceQueueFull: 推論佇列已滿
+        """
+        model_name = model_manager.get_slot(model_name).name
+        cache_key = self._cache_key(model_name, request.query)
+        cached_answer = self.answer_cache.get(cache_key)
+        if cached_answer is not None:
+            logger.info(f"Answer cache hit: {request.query}")
+            return self._cached_stream(cached_answer)
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        handler = StreamingCallbackHandler(loop, queue)
+        future = inference_executor.submit(
+            model_manager.stream_predict, {"input": request.query}, [handler], model_name
+        )
+        # 所有 callback 事件都已排入 queue 之後才會收到結束事件
+        future.add_done_callback(lambda _: queue.put_nowait((END_OF_STREAM, {})))
+        return self._stream_events(queue, future, cache_key)
+
+    @staticmethod
+    async def _cached_stream(answer: str) -> AsyncIterator[Tuple[str, Any]]:
+        yield "final", [PredictResponse(answers=answer)]
+
+    async def _stream_events(
+        self, queue: asyncio.Queue, future: asyncio.Future, cache_key: Tuple[str, str, str]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        async for event, data in iterate_events(queue):
+            yield event, data
+
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Error occurred during streaming prediction: {str(e)}")
+            yield "error", f"An internal error occurred: {str(e)[:100]}"
+            return
+
+        if result is None:
+            logger.error("Prediction result is empty")
+            yield "final", [PredictResponse(answers="Prediction failed. Please try again later.")]
+            return
+
+        answer = str(result)
+        logger.info(f"Formatted answer: {answer}")
+        self.answer_cache.set(cache_key, answer)
+        yield "final", [PredictResponse(answers=answer)]
@@ -0,0 +1,93 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import JSONResponse
+from porygon_api.app.AIservice.schemas import QueryRequest, QueryResponse
+from porygon_api.app.AIservice.dependencies import get_ai_service
+from porygon_api.app.AIservice.service import AIService
+from porygon_api.inference.executor import InferenceQueueFull
+from porygon_api.model_manager import UnknownModelError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+async def _query_model(request: QueryRequest, ai_service: AIService, model_name: Optional[str]):
+    try:
+        logger.info(f"Received query request for model {model_name}: {request.query}")
+        results = await ai_service.predict(request, model_name=model_name)
+        logger.info(f"Query on model {model_name} completed: {results}")
+
+        return QueryResponse(
+            responseCode=200,
+            responseMessage="OK",
+            results=results
+        )
+    except UnknownModelError:
+        logger.warning(f"Unknown model: {model_name}")
+        return JSONResponse(
+            status_code=404,
+            content=QueryResponse(
+                responseCode=404,
+                responseMessage=f"Model {model_name} Not Found.",
+                results=[]
+            ).model_dump()
+        )
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected query on model {model_name}, {str(e)}")
+        return JSONResponse(
+            status_code=503,
+            content=QueryResponse(
+                responseCode=503,
+                responseMessage="The system is busy. Please try again later.",
+                results=[]
+            ).model_dump(),
+            headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        logger.error(f"An error occurred while processing the query on model {model_name}: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+
+        return QueryResponse(
+            responseCode=500,
+            responseMessage=f"Query failed: {str(e)}",
+            results=[]
+        )
+
+
+@router.post("/", response_model=QueryResponse)
+async def query_model_by_header(
+    request: QueryRequest,
+    x_model_name: Optional[str] = Header(None),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    以 X-Model-Name header 選擇模型，未帶 header 時使用預設模型
+    Args:
+        request: 包含用戶查詢的請求
+        x_model_name: MODEL_REGISTRY 中的模型名稱
+        ai_service: AI 服務依賴注入
+    Returns:
+        包含回答結果
+    """
+    return await _query_model(request, ai_service, x_model_name)
+
+
+@router.post("/{model_name}/", response_model=QueryResponse)
+async def query_model_by_route(
+    model_name: str,
+    request: QueryRequest,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    以路徑選擇模型
+    Args:
+        model_name: MODEL_REGISTRY 中的模型名稱
+        request: 包含用戶查詢的請求
+        ai_service: AI 服務依賴注入
+    Returns:
+        包含回答結果
+    """
+    return await _query_model(request, ai_service, model_name)
@@ -1,8 +1,11 @@
 import logging
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 from porygon_api.app.AIservice.schemas import QueryRequest, QueryResponse
 from porygon_api.app.AIservice.dependencies import get_ai_service
 from porygon_api.app.AIservice.service import AIService
+from porygon_api.inference.executor import InferenceQueueFull
+from porygon_api.inference.streaming import format_sse
 from porygon_api.model_manager import model_manager
 
 logger = logging.getLogger(__name__)
@@ -41,6 +44,17 @@ async def query_knowledge_base(
             responseMessage="OK",
             results=results
         )
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected Wikipedia query, {str(e)}")
+        return JSONResponse(
+            status_code=503,
+            content=QueryResponse(
+                responseCode=503,
+                responseMessage="The system is busy. Please try again later.",
+                results=[]
+            ).model_dump(),
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"An error occurred while processing the Wikipedia query: {str(e)}")
         import traceback
@@ -51,3 +65,59 @@ async def query_knowledge_base(
             responseMessage=f"Query failed: {str(e)}",
             results=[]
         )
+
+
+@router.post("/stream")
+async def stream_knowledge_base(
+    request: QueryRequest,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    使用 Wikipedia Agent 查詢知識庫，以 Server-Sent Events 回傳
+    事件依序為 step / observation / token (agent 執行中) 與最後的 final (QueryResponse)，失敗時為 error
+    Args:
+        request: 包含用戶查詢的請求
+        ai_service: AI 服務依賴注入
+    Returns:
+        text/event-stream 串流
+    """
+    logger.info(f"Received Wikipedia streaming query request: {request.query}")
+    if model_manager.get_model() is None:
+        logger.error("Model not loaded. Cannot process the query.")
+        return JSONResponse(
+            status_code=503,
+            content=QueryResponse(
+                responseCode=503,
+                responseMessage="The system is not ready yet. Please try again later.",
+                results=[]
+            ).model_dump()
+        )
+
+    try:
+        events = await ai_service.start_stream(request)
+    except InferenceQueueFull as e:
+        logger.warning(f"Rejected Wikipedia streaming query, {str(e)}")
+        return JSONResponse(
+            status_code=503,
+            content=QueryResponse(
+                responseCode=503,
+                responseMessage="The system is busy. Please try again later.",
+                results=[]
+            ).model_dump(),
+            headers={"Retry-After": "1"}
+        )
+
+    async def event_stream():
+        async for event, data in events:
+            if event == "final":
+                data = QueryResponse(responseCode=200, responseMessage="OK", results=data).model_dump()
+            elif event == "error":
+                data = QueryResponse(responseCode=500, responseMessage=f"Query failed: {data}", results=[]).model_dump()
+            yield format_sse(event, data)
+        logger.info("Wikipedia streaming query completed")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
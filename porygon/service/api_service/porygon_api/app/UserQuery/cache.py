@@ -0,0 +1,113 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from porygon_api.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 資料庫中不存在的 id 以這個值快取 (negative cache)
+_NOT_FOUND = object()
+
+
+class ReadThroughCache:
+    """
+    Read-through 快取，同一個 key 同時未命中時只執行一次 loader (single-flight)
+    不存在的 id 快取 negative_ttl 秒，loader 的例外不快取；每個 worker 各自一份
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Awaitable[Optional[Any]]],
+        maxsize: int = 10000,
+        ttl: float = 60.0,
+        negative_ttl: float = 10.0,
+    ):
+        self.loader = loader
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.load_errors = 0
+        self.invalidations = 0
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """回傳 key 對應的資料，不存在時回傳 None"""
+        value = self._cache.get(key)
+        if value is _NOT_FOUND:
+            self.negative_hits += 1
+            return None
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self.loader(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._store(key, done))
+        # 發起查詢的請求被取消 (client 斷線) 時，查詢仍繼續，等待中的其他請求照常取得結果
+        return await asyncio.shield(task)
+
+    def _store(self, key: Hashable, task: asyncio.Task):
+        # 查詢期間 key 被 invalidate 時，結果可能已過期，不寫回快取
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.load_errors += 1
+            return
+        value = task.result()
+        if value is None:
+            self._cache.set(key, _NOT_FOUND, ttl=self.negative_ttl)
+        else:
+            self._cache.set(key, value)
+
+    def invalidate(self, key: Hashable):
+        """資料寫入後呼叫，移除快取與進行中的查詢，下一次 get 重新讀取"""
+        self.invalidations += 1
+        self._cache.invalidate(key)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self.invalidations += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        cache_stats = self._cache.stats()
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return {
+            "size": cache_stats["size"],
+            "maxsize": cache_stats["maxsize"],
+            "ttl_seconds": cache_stats["ttl_seconds"],
+            "negative_ttl_seconds": self.negative_ttl,
+            "evictions": cache_stats["evictions"],
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "load_errors": self.load_errors,
+            "invalidations": self.invalidations,
+            "inflight": len(self._inflight),
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+
+def create_item_cache(loader: Callable[[Hashable], Awaitable[Optional[Any]]]) -> ReadThroughCache:
+    return ReadThroughCache(
+        loader,
+        maxsize=int(os.getenv("ITEM_CACHE_MAX_SIZE", 10000)),
+        ttl=float(os.getenv("ITEM_CACHE_TTL_SECONDS", 60)),
+        negative_ttl=float(os.getenv("ITEM_CACHE_NEGATIVE_TTL_SECONDS", 10)),
+    )
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """
+    DataLoader 式的批次查詢，window_ms 內的 load(key) 合併成一次 batch_fn(keys)
+    batch_fn 回傳 {key: value}，結果中沒有的 key 得到 None
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        max_batch_size: int = 500,
+        window_ms: float = 1.0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        # 同一批中重複的 key 只查一次
+        self._pending: Dict[Hashable, List[asyncio.Future]] = {}
+        self._scheduled: Optional[asyncio.Handle] = None
+        self._inflight = set()
+        self.loads = 0
+        self.batches = 0
+        self.batched_keys = 0
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.loads += 1
+        self._pending.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._scheduled is None:
+            if self.window > 0:
+                self._scheduled = loop.call_later(self.window, self._dispatch)
+            else:
+                self._scheduled = loop.call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        loop = asyncio.get_running_loop()
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            chunk = keys[start:start + self.max_batch_size]
+            task = loop.create_task(self._run(chunk, pending))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, keys: List[Hashable], pending: Dict[Hashable, List[asyncio.Future]]):
+        self.batches += 1
+        self.batched_keys += len(keys)
+        logger.debug(f"Dispatching batch load, size: {len(keys)}")
+        try:
+            results = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                for future in pending[key]:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key in keys:
+            value = results.get(key)
+            for future in pending[key]:
+                # 呼叫端已取消 (client 斷線) 的 future 不需要結果
+                if not future.done():
+                    future.set_result(value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "loads": self.loads,
+            "batches": self.batches,
+            "batched_keys": self.batched_keys,
+            "average_batch_size": self.batched_keys / self.batches if self.batches else 0.0,
+        }
@@ -1,4 +1,5 @@
-from typing import Optional, Dict, Any
+import os
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 
 from porygon_api.schemas import BaseResponse
@@ -25,6 +26,27 @@ class ItemResponse(BaseModel):
     properties: Optional[Dict[str, Any]] = None
 
 
+# 單次批次查詢最多的 id 數
+GET_ITEMS_MAX_IDS = int(os.getenv("ITEM_BATCH_MAX_IDS", 500))
+
+
+class ItemBatchRequest(BaseModel):
+    """批次查詢物品請求"""
+    item_ids: List[str] = Field(..., min_length=1, max_length=GET_ITEMS_MAX_IDS, description="物品 ID 列表")
+
+
+class ItemBatchResponse(BaseModel):
+    """批次查詢物品回應，items 依請求順序排列，不存在的 ID 列在 missing"""
+    items: List[ItemResponse]
+    missing: List[str]
+
+
+class ItemPageResponse(BaseModel):
+    """分頁查詢物品回應，next_cursor 傳入下一次請求的 after，最後一頁為 None"""
+    items: List[ItemResponse]
+    next_cursor: Optional[str] = None
+
+
 class FirestoreItemResponse(BaseResponse[Dict[str, Any]]):
     """Firestore 操作回應"""
     pass
@@ -1,10 +1,18 @@
+import os
+import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 
+from porygon_api.app.UserQuery.cache import create_item_cache
+from porygon_api.app.UserQuery.loader import BatchLoader
 from porygon_api.database.db_connector import cloud_sql_connector, firestore_connector
+from porygon_api.monitoring.prometheus import observe_db
 
 logger = logging.getLogger(__name__)
 
+ITEM_COLUMNS = ("id", "name", "description", "price", "quantity", "category")
+
 
 class ItemService:
     """提供搜尋資料庫服務，提供對 Cloud SQL 和 Firestore 的操作"""
@@ -21,11 +29,19 @@ class ItemService:
         if self._initialized:
             return
         logger.info("Initializing ItemService")
+        # 同一個時間窗內不同 id 的查詢合併成一次 WHERE id = ANY(:ids)
+        self.item_loader = BatchLoader(
+            self._load_items,
+            max_batch_size=int(os.getenv("ITEM_LOADER_MAX_BATCH_SIZE", 500)),
+            window_ms=float(os.getenv("ITEM_LOADER_WINDOW_MS", 1)),
+        )
+        # 熱門 item 直接由記憶體回應；同一個 id 同時未命中時只查詢一次
+        self.item_cache = create_item_cache(self.item_loader.load)
         self._initialized = True
 
     async def get_item(self, item_id: str) -> Optional[Dict[str, Any]]:
         """
-        Retrieve a specific item from Cloud SQL.
+        Retrieve a specific item, reading through the item cache.
 
         Args:
             item_id: The ID of the item.
@@ -34,31 +50,12 @@ class ItemService:
             A dictionary containing item data if found, otherwise None.
         """
         try:
-            # SQL query using named parameters
-            query = """
-            SELECT id, name, description, price, quantity, category
-            FROM items
-            WHERE id = :id
-            """
-
-            # Parameter dictionary
-            params = {"id": item_id}
-
-            logger.info(f"Querying Cloud SQL for item: {item_id}")
-            result = cloud_sql_connector.execute_query(query, params)
-
-            if result["status"] == "success" and "data" in result and result["data"]:
-                item = result["data"][0]
-                logger.info(f"Successfully retrieved item: {item_id}")
-
-                # Set missing optional fields to None
-                item.setdefault("tags", None)
-                item.setdefault("properties", None)
-
-                return item
-            else:
+            item = await self.item_cache.get(item_id)
+            if item is None:
                 logger.error(f"Item not found: {item_id}")
                 return None
+            # 快取中的 dict 由所有請求共用，回傳複本
+            return dict(item)
 
         except Exception as e:
             logger.error(f"Error occurred while querying item: {str(e)}")
@@ -66,6 +63,96 @@ class ItemService:
             logger.error(traceback.format_exc())
             return None
 
+    async def get_items(self, item_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Retrieve multiple items, reading through the item cache.
+        Cache misses are merged into one `WHERE id = ANY(:ids)` query by the item loader.
+
+        Args:
+            item_ids: The IDs of the items; duplicates are queried once.
+
+        Returns:
+            A dictionary of item_id -> item data, None for ids that do not exist.
+        Raises:
+            RuntimeError: The query failed.
+        """
+        unique_ids = list(dict.fromkeys(item_ids))
+        items = await asyncio.gather(*(self.item_cache.get(item_id) for item_id in unique_ids))
+        return {
+            item_id: dict(item) if item is not None else None
+            for item_id, item in zip(unique_ids, items)
+        }
+
+    async def _load_items(self, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Query items from Cloud SQL in one round trip (item loader batch function).
+
+        Returns:
+            A dictionary of item_id -> item data for the ids that exist.
+        Raises:
+            RuntimeError: The query failed; the result is not cached.
+        """
+        # SQL query using named parameters
+        # items.id is VARCHAR; asyncpg does no implicit casting, so the array type is spelled out
+        query = """
+        SELECT id, name, description, price, quantity, category
+        FROM items
+        WHERE id = ANY(CAST(:ids AS VARCHAR[]))
+        """
+
+        # Parameter dictionary
+        params = {"ids": list(item_ids)}
+
+        logger.info(f"Querying Cloud SQL for {len(item_ids)} items")
+        result = await cloud_sql_connector.aexecute_query(query, params)
+
+        if result["status"] != "success":
+            raise RuntimeError(f"Failed to query items: {result.get('message')}")
+
+        items = {}
+        for item in result["data"]:
+            # Set missing optional fields to None
+            item.setdefault("tags", None)
+            item.setdefault("properties", None)
+            items[item["id"]] = item
+        return items
+
+    async def list_items(self, after: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List items ordered by id with keyset pagination.
+
+        Args:
+            after: The next_cursor of the previous page, None for the first page.
+            limit: Page size.
+
+        Returns:
+            (items, next_cursor); next_cursor is None on the last page.
+        Raises:
+            RuntimeError: The query failed.
+        """
+        result = await cloud_sql_connector.apaginate_keyset("items", "id", ITEM_COLUMNS, after=after, limit=limit)
+        if result["status"] != "success":
+            raise RuntimeError(f"Failed to list items: {result.get('message')}")
+        return result["data"], result["next_cursor"]
+
+    async def export_items(self) -> AsyncIterator[bytes]:
+        """
+        Stream the whole items table as NDJSON, one batch of lines per server-side cursor batch.
+        The table is never fully loaded into memory.
+        """
+        rows = 0
+        async for batch in cloud_sql_connector.astream_query(
+            f"SELECT {', '.join(ITEM_COLUMNS)} FROM items", row_format="tuple"
+        ):
+            rows += len(batch)
+            lines = [json.dumps(dict(zip(ITEM_COLUMNS, row)), ensure_ascii=False, default=str) for row in batch]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+        logger.info(f"Exported {rows} items")
+
+    def invalidate_item(self, item_id: str):
+        """寫入或刪除 item 後呼叫，讓下一次讀取重新查詢 Cloud SQL"""
+        self.item_cache.invalidate(item_id)
+
     async def get_product(self, collection: str, product_id: str) -> Dict[str, Any]:
         """根據自定義欄位 product_id 從 Firestore 獲取特定物品
 
@@ -79,12 +166,13 @@ class ItemService:
         try:
             logger.info(f"Querying Firestore collection '{collection}' for product_id: {product_id}")
             client = firestore_connector.connect()
-            docs = (
-                client.collection(collection)
-                .where("Product_id", "==", product_id)
-                .stream()
-            )
-            doc = next(docs, None)
+            with observe_db("firestore", "query"):
+                docs = (
+                    client.collection(collection)
+                    .where("Product_id", "==", product_id)
+                    .stream()
+                )
+                doc = next(docs, None)
 
             if doc and doc.exists:
                 logger.info(f"Successfully retrieved product_id: {product_id} from Firestore")
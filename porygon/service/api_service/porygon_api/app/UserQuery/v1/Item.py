@@ -1,7 +1,15 @@
 import logging
-from fastapi import APIRouter, Depends
-
-from porygon_api.app.UserQuery.schemas import FirestoreItemResponse, ItemResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from porygon_api.app.UserQuery.schemas import (
+    FirestoreItemResponse,
+    ItemBatchRequest,
+    ItemBatchResponse,
+    ItemPageResponse,
+    ItemResponse,
+)
 
 from porygon_api.app.UserQuery.dependencies import get_item_service
 from porygon_api.app.UserQuery.service import ItemService
@@ -55,6 +63,90 @@ async def get_item(
         )
 
 
+@router.post("/GetItems", response_model=BaseResponse[ItemBatchResponse])
+async def get_items(
+    request: ItemBatchRequest,
+    item_service: ItemService = Depends(get_item_service)
+):
+    """
+    根據多個 ID 從 Cloud SQL 批次獲取物品，未快取的 ID 合併成一次查詢
+    Args:
+        request: 物品 ID 列表
+        item_service: 物品服務依賴注入
+    Returns:
+        依請求順序排列的物品與不存在的 ID
+    """
+    try:
+        logger.info(f"Get Items Request: {len(request.item_ids)} ids")
+        results = await item_service.get_items(request.item_ids)
+
+        items = [item for item in results.values() if item is not None]
+        missing = [item_id for item_id, item in results.items() if item is None]
+        if missing:
+            logger.info(f"Items Not Found: {missing}")
+
+        return BaseResponse[ItemBatchResponse](
+            responseCode=200,
+            responseMessage=f"Got {len(items)} Items Successfully.",
+            results=ItemBatchResponse(items=items, missing=missing)
+        )
+    except Exception as e:
+        logger.error(f"Error occurred while searching items: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+
+        return BaseResponse[ItemBatchResponse](
+            responseCode=500,
+            responseMessage=f"Failed to process request: {str(e)}",
+            results=None
+        )
+
+
+@router.get("/ListItems", response_model=BaseResponse[ItemPageResponse])
+async def list_items(
+    after: Optional[str] = Query(None, description="上一頁回傳的 next_cursor"),
+    limit: int = Query(100, ge=1, le=1000, description="每頁筆數"),
+    item_service: ItemService = Depends(get_item_service)
+):
+    """
+    依 ID 排序分頁列出物品 (keyset pagination，深分頁的成本與第一頁相同)
+    Args:
+        after: 上一頁回傳的 next_cursor，第一頁不需帶入
+        limit: 每頁筆數
+        item_service: 物品服務依賴注入
+    Returns:
+        本頁物品與下一頁的 cursor
+    """
+    try:
+        items, next_cursor = await item_service.list_items(after=after, limit=limit)
+        return BaseResponse[ItemPageResponse](
+            responseCode=200,
+            responseMessage=f"Listed {len(items)} Items Successfully.",
+            results=ItemPageResponse(items=items, next_cursor=next_cursor)
+        )
+    except Exception as e:
+        logger.error(f"Error occurred while listing items: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+
+        return BaseResponse[ItemPageResponse](
+            responseCode=500,
+            responseMessage=f"Failed to process request: {str(e)}",
+            results=None
+        )
+
+
+@router.get("/ExportItems")
+async def export_items(item_service: ItemService = Depends(get_item_service)):
+    """
+    以 NDJSON 串流匯出整個 items 資料表，每行一筆物品
+    資料以 server-side cursor 分批讀取並直接送出，不會整份放進記憶體；
+    傳輸中途發生錯誤時回應會提前結束
+    """
+    logger.info("Export Items Request")
+    return StreamingResponse(item_service.export_items(), media_type="application/x-ndjson")
+
+
 @router.get("/GetProducts/{collection}/{product_id}", response_model=FirestoreItemResponse)
 async def get_firestore_item(
     collection: str,
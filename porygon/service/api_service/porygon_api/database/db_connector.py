@@ -1,11 +1,160 @@
 import os
+import re
+import time
+import asyncio
 import logging
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
 import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from google.cloud import firestore
+from porygon_api.monitoring.prometheus import (
+    DB_CONNECTION_AGE,
+    DB_OPERATION_DURATION,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT,
+    observe_db,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# dict: 每列一個 dict (預設)；tuple: 每列一個 tuple，另外回傳 columns；
+# columnar: {column: [values]}，不需要逐列建立 dict
+ROW_FORMATS = ("dict", "tuple", "columnar")
+# stream_query / astream_query 每批從 server-side cursor 讀取的列數
+STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", 1000))
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+
+def _format_rows(keys: List[str], rows: Sequence, row_format: str):
+    """把 Row 轉成指定的格式"""
+    if row_format == "tuple":
+        return [tuple(row) for row in rows]
+    if row_format == "columnar":
+        if not rows:
+            return {key: [] for key in keys}
+        return {key: list(values) for key, values in zip(keys, zip(*rows))}
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _check_row_format(row_format: str):
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Unknown row_format: {row_format}, expected one of {ROW_FORMATS}")
+
+
+def _keyset_query(table: str, key: str, columns: Sequence[str], where: Optional[str], has_cursor: bool) -> str:
+    """
+    組出 keyset pagination 的 SQL: WHERE key > :keyset_after ORDER BY key LIMIT :keyset_limit
+    table / column 名稱無法用參數傳入，只接受一般的識別字；where 為呼叫端撰寫的條件，值請以參數傳入
+    """
+    for name in (table, key, *columns):
+        if name != "*" and not _IDENTIFIER.match(name):
+            raise ValueError(f"Invalid identifier: {name}")
+    if "." in key:
+        raise ValueError(f"Keyset column must be a plain column name: {key}")
+    if "*" not in columns and key not in columns:
+        raise ValueError(f"Keyset column {key} must be selected")
+
+    conditions = []
+    if where:
+        conditions.append(f"({where})")
+    if has_cursor:
+        conditions.append(f"{key} > :keyset_after")
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + f" ORDER BY {key} LIMIT :keyset_limit"
+
+
+def _next_cursor(response: Dict[str, Any], key: str, limit: int, row_format: str) -> Optional[Any]:
+    """本頁已滿時回傳最後一列的 key 作為下一頁的 cursor，沒有下一頁時回傳 None"""
+    data = response["data"]
+    if row_format == "columnar":
+        values = data[key]
+        return values[-1] if len(values) >= limit else None
+    if len(data) < limit:
+        return None
+    if row_format == "tuple":
+        return data[-1][response["columns"].index(key)]
+    return data[-1][key]
+
+
+def _sync_pool_options() -> Dict[str, Any]:
+    """同步 (pg8000) pool 只給背景執行緒 (例如 API key 重新載入) 使用，固定為很小的 pool"""
+    return {
+        "pool_size": int(os.getenv("DB_SYNC_POOL_SIZE", 1)),
+        "max_overflow": int(os.getenv("DB_SYNC_MAX_OVERFLOW", 1)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+
+
+def _pool_options() -> Dict[str, Any]:
+    """
+    async (asyncpg) connection pool 設定，每個 gunicorn worker 各自一個 pool
+    未設定 DB_POOL_SIZE 但設定了 DB_MAX_CONNECTIONS (這個 instance 可用的連線總數) 時，
+    依 WEB_CONCURRENCY (worker 數) 平分，扣掉每個 worker 的 max_overflow 與同步 pool 的上限
+    """
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 2))
+    if os.getenv("DB_POOL_SIZE"):
+        pool_size = int(os.getenv("DB_POOL_SIZE"))
+    elif os.getenv("DB_MAX_CONNECTIONS"):
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+        sync_options = _sync_pool_options()
+        sync_connections = sync_options["pool_size"] + sync_options["max_overflow"]
+        pool_size = max(1, int(os.getenv("DB_MAX_CONNECTIONS")) // workers - max_overflow - sync_connections)
+    else:
+        pool_size = 5
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+
+
+def _instrument_pool(pool: sqlalchemy.pool.Pool, name: str):
+    """以 pool event 記錄取出中的連線數、超出 pool_size 的連線數與連線存在時間"""
+    checked_out = DB_POOL_CHECKED_OUT.labels(pool=name)
+    overflow = DB_POOL_OVERFLOW.labels(pool=name)
+    connection_age = DB_CONNECTION_AGE.labels(pool=name)
+    in_use = [0]
+
+    def update_gauges():
+        checked_out.set(in_use[0])
+        overflow.set(max(0, in_use[0] - pool.size()))
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info["created_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        in_use[0] += 1
+        update_gauges()
+        created_at = connection_record.info.get("created_at")
+        if created_at is not None:
+            connection_age.observe(time.monotonic() - created_at)
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        in_use[0] -= 1
+        update_gauges()
+
+
+def _pool_stats(pool: sqlalchemy.pool.Pool) -> Dict[str, Any]:
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+    }
+
 
 class CloudSQLConnector:
     """Cloud SQL (PostgreSQL) connector, using SQLAlchemy"""
@@ -29,8 +178,70 @@ class CloudSQLConnector:
         self.db_name = os.getenv("DB_NAME", "mlflow")
         self.db_port = int(os.getenv("DB_PORT", 5432))
         self.engine = None
+        # asyncpg 的 async engine，供 async def 的 route 使用，不阻塞 event loop
+        self.async_engine: Optional[AsyncEngine] = None
+        self._async_engine_lock = asyncio.Lock()
+        self.pool_options = _pool_options()
+        self.sync_pool_options = _sync_pool_options()
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.warmup_error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
         self._initialized = True
 
+    def _url(self, drivername: str) -> sqlalchemy.engine.URL:
+        return sqlalchemy.engine.url.URL.create(
+            drivername=drivername,
+            username=self.db_user,
+            password=self.db_pass,
+            host=self.db_host,
+            port=self.db_port,
+            database=self.db_name,
+        )
+
+    @contextmanager
+    def _connection(self, engine) -> Iterator[sqlalchemy.engine.Connection]:
+        """從同步 pool 取得連線，記錄等待時間"""
+        start_time = time.perf_counter()
+        try:
+            conn = engine.connect()
+        except sqlalchemy.exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(pool="sync").inc()
+            logger.warning(f"Cloud SQL pool exhausted: {engine.pool.status()}")
+            raise
+        finally:
+            DB_POOL_WAIT.labels(pool="sync").observe(time.perf_counter() - start_time)
+        with conn:
+            yield conn
+
+    @asynccontextmanager
+    async def _aconnection(self, engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
+        """從 async pool 取得連線，記錄等待時間"""
+        start_time = time.perf_counter()
+        conn = engine.connect()
+        try:
+            await conn.start()
+        except sqlalchemy.exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(pool="async").inc()
+            logger.warning(f"Cloud SQL async pool exhausted: {engine.sync_engine.pool.status()}")
+            raise
+        finally:
+            DB_POOL_WAIT.labels(pool="async").observe(time.perf_counter() - start_time)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    @staticmethod
+    def _fetch_result(result, row_format: str = "dict") -> Dict[str, Any]:
+        """把 SQLAlchemy 的 result 轉成 execute_query 回傳的格式"""
+        if result.returns_rows:
+            keys = list(result.keys())
+            response = {"status": "success", "data": _format_rows(keys, result.all(), row_format)}
+            if row_format != "dict":
+                response["columns"] = keys
+            return response
+        return {"status": "success", "rows_affected": result.rowcount}
+
     def connect(self):
         """Establish a connection pool to Cloud SQL"""
         if self.engine is None:
@@ -51,19 +262,10 @@ class CloudSQLConnector:
                 #    )
 
                 self.engine = sqlalchemy.create_engine(
-                    sqlalchemy.engine.url.URL.create(
-                        drivername="postgresql+pg8000",
-                        username=self.db_user,
-                        password=self.db_pass,
-                        host=self.db_host,
-                        port=self.db_port,
-                        database=self.db_name,
-                    ),
-                    pool_size=5,
-                    max_overflow=2,
-                    pool_timeout=30,
-                    pool_recycle=1800,
+                    self._url("postgresql+pg8000"),
+                    **self.sync_pool_options,
                 )
+                _instrument_pool(self.engine.pool, "sync")
 
                 # Test Connection
                 with self.engine.connect() as conn:
@@ -76,21 +278,25 @@ class CloudSQLConnector:
 
         return self.engine
 
-    def execute_query(self, query, params=None):
+    def execute_query(self, query, params=None, row_format="dict"):
         """執行 SQL 查詢並返回結果
 
         Args:
             query: SQL 查詢字符串
             params: 查詢參數 (可選)
+            row_format: dict (預設) / tuple / columnar，見 ROW_FORMATS
 
         Returns:
             包含操作結果的字典
         """
+        start_time = time.perf_counter()
+        status = "error"
         try:
+            _check_row_format(row_format)
             engine = self.connect()
             sql = sqlalchemy.text(query)
 
-            with engine.connect() as conn:
+            with self._connection(engine) as conn:
                 if params:
                     result = conn.execute(sql, params)
                 else:
@@ -98,19 +304,264 @@ class CloudSQLConnector:
 
                 conn.commit()
 
-                if result.returns_rows:
-                    rows = []
-                    for row in result:
-                        rows.append({key: value for key, value in row._mapping.items()})
-                    return {"status": "success", "data": rows}
+                response = self._fetch_result(result, row_format)
+                status = "success"
+                return response
+
+        except Exception as e:
+            logger.error(f"SQL query execution failed: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return {"status": "error", "message": str(e)}
+        finally:
+            DB_OPERATION_DURATION.labels(backend="cloudsql", operation="execute_query", status=status).observe(
+                time.perf_counter() - start_time
+            )
+
+    async def connect_async(self) -> AsyncEngine:
+        """Establish an asyncpg connection pool to Cloud SQL"""
+        if self.async_engine is not None:
+            return self.async_engine
+
+        async with self._async_engine_lock:
+            if self.async_engine is None:
+                try:
+                    logger.info(f"Connecting to Cloud SQL (asyncpg): {self.db_host}:{self.db_port}/{self.db_name}")
+                    engine = create_async_engine(
+                        self._url("postgresql+asyncpg"),
+                        **self.pool_options,
+                    )
+                    _instrument_pool(engine.sync_engine.pool, "async")
+
+                    # Test Connection
+                    async with engine.connect() as conn:
+                        await conn.execute(sqlalchemy.text("SELECT 1"))
+
+                    self.async_engine = engine
+                    logger.info("Cloud SQL async connection pool created successfully")
+                except Exception as e:
+                    logger.error(f"Cloud SQL async connection failed: {str(e)}")
+                    raise
+
+        return self.async_engine
+
+    async def aexecute_query(self, query, params=None, row_format="dict"):
+        """execute_query 的 async 版本，回傳格式相同
+
+        Args:
+            query: SQL 查詢字符串
+            params: 查詢參數 (可選)
+            row_format: dict (預設) / tuple / columnar，見 ROW_FORMATS
+
+        Returns:
+            包含操作結果的字典
+        """
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            _check_row_format(row_format)
+            engine = await self.connect_async()
+            sql = sqlalchemy.text(query)
+
+            async with self._aconnection(engine) as conn:
+                if params:
+                    result = await conn.execute(sql, params)
                 else:
-                    return {"status": "success", "rows_affected": result.rowcount}
+                    result = await conn.execute(sql)
+
+                await conn.commit()
+
+                response = self._fetch_result(result, row_format)
+                status = "success"
+                return response
 
         except Exception as e:
             logger.error(f"SQL query execution failed: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return {"status": "error", "message": str(e)}
+        finally:
+            DB_OPERATION_DURATION.labels(backend="cloudsql", operation="aexecute_query", status=status).observe(
+                time.perf_counter() - start_time
+            )
+
+    def stream_query(self, query, params=None, batch_size=None, row_format="dict") -> Iterator:
+        """以 server-side cursor 分批讀取查詢結果，不會把整個結果集放進記憶體
+
+        Args:
+            query: SQL 查詢字符串
+            params: 查詢參數 (可選)
+            batch_size: 每批列數 (預設 DB_STREAM_BATCH_SIZE)
+            row_format: dict (預設) / tuple / columnar；tuple 的欄位順序與 SELECT 相同
+
+        Yields:
+            每批的資料，格式與 execute_query 的 data 相同
+        Raises:
+            查詢失敗時直接拋出例外 (已經 yield 的資料無法回收成錯誤回應)
+        """
+        _check_row_format(row_format)
+        batch_size = batch_size or STREAM_BATCH_SIZE
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            engine = self.connect()
+            with self._connection(engine) as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                    sqlalchemy.text(query), params or {}
+                )
+                keys = list(result.keys())
+                for partition in result.partitions(batch_size):
+                    yield _format_rows(keys, partition, row_format)
+            status = "success"
+        except GeneratorExit:
+            # 呼叫端提前結束 (例如 client 斷線)
+            status = "cancelled"
+            raise
+        finally:
+            DB_OPERATION_DURATION.labels(backend="cloudsql", operation="stream_query", status=status).observe(
+                time.perf_counter() - start_time
+            )
+
+    async def astream_query(self, query, params=None, batch_size=None, row_format="dict") -> AsyncIterator:
+        """stream_query 的 async 版本 (asyncpg server-side cursor)
+
+        Yields:
+            每批的資料，格式與 execute_query 的 data 相同
+        """
+        _check_row_format(row_format)
+        batch_size = batch_size or STREAM_BATCH_SIZE
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            engine = await self.connect_async()
+            async with self._aconnection(engine) as conn:
+                result = await conn.stream(
+                    sqlalchemy.text(query), params or {}, execution_options={"yield_per": batch_size}
+                )
+                keys = list(result.keys())
+                async for partition in result.partitions(batch_size):
+                    yield _format_rows(keys, partition, row_format)
+            status = "success"
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        finally:
+            DB_OPERATION_DURATION.labels(backend="cloudsql", operation="astream_query", status=status).observe(
+                time.perf_counter() - start_time
+            )
+
+    def paginate_keyset(
+        self, table, key, columns=("*",), after=None, limit=100, where=None, params=None, row_format="dict"
+    ):
+        """以 keyset (WHERE key > :after ORDER BY key) 分頁查詢，深分頁不需要像 OFFSET 一樣掃過前面的列
+
+        Args:
+            table: 資料表名稱
+            key: 排序且唯一的欄位，例如 primary key
+            columns: 要查詢的欄位，必須包含 key
+            after: 上一頁回傳的 next_cursor，第一頁為 None
+            limit: 每頁列數
+            where: (可選) 額外條件，值請透過 params 傳入
+            params: where 使用的查詢參數
+            row_format: dict (預設) / tuple / columnar
+
+        Returns:
+            execute_query 的結果，另外帶 next_cursor (沒有下一頁時為 None)
+        """
+        try:
+            query = _keyset_query(table, key, columns, where, after is not None)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        response = self.execute_query(query, self._keyset_params(params, after, limit), row_format)
+        if response["status"] == "success":
+            response["next_cursor"] = _next_cursor(response, key, limit, row_format)
+        return response
+
+    async def apaginate_keyset(
+        self, table, key, columns=("*",), after=None, limit=100, where=None, params=None, row_format="dict"
+    ):
+        """paginate_keyset 的 async 版本"""
+        try:
+            query = _keyset_query(table, key, columns, where, after is not None)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        response = await self.aexecute_query(query, self._keyset_params(params, after, limit), row_format)
+        if response["status"] == "success":
+            response["next_cursor"] = _next_cursor(response, key, limit, row_format)
+        return response
+
+    @staticmethod
+    def _keyset_params(params: Optional[Dict[str, Any]], after: Any, limit: int) -> Dict[str, Any]:
+        keyset_params = dict(params or {})
+        keyset_params["keyset_limit"] = limit
+        if after is not None:
+            keyset_params["keyset_after"] = after
+        return keyset_params
+
+    async def warmup(self, connections: Optional[int] = None) -> bool:
+        """
+        啟動時建立 async pool 並預先開啟 connections 條連線 (預設 DB_POOL_WARMUP_CONNECTIONS 或 pool_size)，
+        第一個請求不需要等待建立連線；失敗時只記錄錯誤，之後的請求照常在需要時建立連線
+        """
+        if connections is None:
+            connections = int(os.getenv("DB_POOL_WARMUP_CONNECTIONS", self.pool_options["pool_size"]))
+        connections = min(connections, self.pool_options["pool_size"])
+        timeout = float(os.getenv("DB_POOL_WARMUP_TIMEOUT_SECONDS", 10))
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._open_connections(connections), timeout)
+        except Exception as e:
+            self.warmup_error = str(e) or type(e).__name__
+            logger.error(f"Cloud SQL pool warmup failed: {self.warmup_error}")
+            return False
+        finally:
+            self.warmup_seconds = time.perf_counter() - start_time
+        logger.info(f"Cloud SQL pool warmed up with {connections} connections in {self.warmup_seconds:.2f}s")
+        return True
+
+    async def _open_connections(self, connections: int):
+        engine = await self.connect_async()
+        opened: List[AsyncConnection] = []
+
+        async def open_one():
+            conn = engine.connect()
+            await conn.start()
+            opened.append(conn)
+            await conn.execute(sqlalchemy.text("SELECT 1"))
+
+        try:
+            # 同時持有所有連線，確保 pool 中有 connections 條不同的連線
+            results = await asyncio.gather(*(open_one() for _ in range(connections)), return_exceptions=True)
+        finally:
+            await asyncio.gather(*(conn.close() for conn in opened), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+    def start_warmup(self):
+        """在背景執行 warmup，不阻塞啟動；完成前 readiness probe 回 503"""
+        if os.getenv("DB_POOL_WARMUP", "true").lower() in ("0", "false", "no"):
+            return
+        if self.warmup_task is None:
+            self.warmup_task = asyncio.get_running_loop().create_task(self.warmup())
+
+    @property
+    def warmup_finished(self) -> bool:
+        """warmup 已結束 (不論成功或失敗) 或未啟用"""
+        return self.warmup_task is None or self.warmup_task.done()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {
+            "options": self.pool_options,
+            "sync_options": self.sync_pool_options,
+            "sync": _pool_stats(self.engine.pool) if self.engine is not None else None,
+            "async": _pool_stats(self.async_engine.sync_engine.pool) if self.async_engine is not None else None,
+            "warmup": {
+                "finished": self.warmup_finished,
+                "seconds": self.warmup_seconds,
+                "error": self.warmup_error,
+            },
+        }
 
     def close(self):
         """Close the database connection pool"""
@@ -118,6 +569,14 @@ class CloudSQLConnector:
             self.engine.dispose()
             logger.info("Cloud SQL connection pool closed")
 
+    async def aclose(self):
+        """Close both connection pools"""
+        self.close()
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+            self.async_engine = None
+            logger.info("Cloud SQL async connection pool closed")
+
 
 class FirestoreConnector:
     """Firestore connector"""
@@ -144,7 +603,8 @@ class FirestoreConnector:
         if self.client is None:
             try:
                 logger.info(f"Connecting to Firestore: Project {self.project_id}")
-                self.client = firestore.Client(project=self.project_id, database="default")
+                with observe_db("firestore", "connect"):
+                    self.client = firestore.Client(project=self.project_id, database="default")
                 logger.info("Firestore connection successful")
             except Exception as e:
                 logger.error(f"Firestore connection failed: {str(e)}")
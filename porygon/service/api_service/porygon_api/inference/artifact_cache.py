@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, List, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+MODEL_DIR = "model"
+LOCK_DIR = ".locks"
+
+# models:/<name>/<version> 或 models:/<name>@<alias>
+MODELS_URI_PATTERN = re.compile(r"^models:/(?P<name>[^/@]+)(?:/(?P<version>[^/@]+)|@(?P<alias>[^/@]+))$")
+
+
+class ArtifactCacheError(Exception):
+    """無法透過快取取得 artifact，呼叫端應直接從來源載入"""
+
+
+class ArtifactCache:
+    """
+    以內容摘要 (digest) 定址的本地模型 artifact 快取
+    目錄結構: <root>/<digest>/model/... 與 <root>/<digest>/manifest.json
+    來源的 digest 由 bucket 的物件 metadata (md5/crc32c) 計算，不需下載；
+    digest 沒變時直接從本地讀取，可掛載成 node 上的共用 volume 給多個 worker 使用
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None, verify: bool = None):
+        self.root = root if root is not None else os.getenv("ARTIFACT_CACHE_DIR")
+        self.max_bytes = max_bytes or int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+        if verify is None:
+            verify = os.getenv("ARTIFACT_CACHE_VERIFY", "true").lower() == "true"
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def acquire(self, uri: str) -> "ArtifactLease":
+        """
+        取得 uri 對應的本地模型目錄；回傳的 lease 持有共享鎖，release 之前不會被任何 worker 淘汰，
+        模型載入後仍可能延遲讀取檔案，應在模型被淘汰或換版後才 release
+        Raises:
+            ArtifactCacheError: 無法計算 digest、下載或驗證失敗
+        """
+        try:
+            source = self._resolve_source(uri)
+            digest = self._source_digest(source)
+            entry = os.path.join(self.root, digest)
+
+            lock_file = self._lock(digest, fcntl.LOCK_SH)
+            try:
+                if self._is_valid(entry):
+                    self.hits += 1
+                    logger.info(f"Artifact cache hit: {uri} -> {entry}")
+                else:
+                    # 先放開共享鎖再取排他鎖，避免兩個 worker 同時升級而互相等待
+                    lock_file.close()
+                    lock_file = self._lock(digest, fcntl.LOCK_EX)
+                    if self._is_valid(entry, repair=True):
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                        self._fill(source, entry)
+                    fcntl.flock(lock_file, fcntl.LOCK_SH)
+
+                manifest_path = os.path.join(entry, MANIFEST_FILE)
+                with open(manifest_path) as f:
+                    total_bytes = json.load(f)["total_bytes"]
+                os.utime(manifest_path)
+            except FileNotFoundError:
+                lock_file.close()
+                # 降為共享鎖的瞬間被其他 worker 淘汰
+                raise ArtifactCacheError(f"Artifact cache entry {entry} was evicted")
+            except BaseException:
+                lock_file.close()
+                raise
+        except ArtifactCacheError:
+            raise
+        except Exception as e:
+            raise ArtifactCacheError(f"Artifact cache unavailable for {uri}: {str(e)}") from e
+
+        self._evict(keep=digest)
+        return ArtifactLease(digest, os.path.join(entry, MODEL_DIR), total_bytes, lock_file)
+
+    @contextmanager
+    def checkout(self, uri: str) -> Iterator[str]:
+        """只在區塊內使用模型目錄時的簡便寫法"""
+        lease = self.acquire(uri)
+        try:
+            yield lease.path
+        finally:
+            lease.release()
+
+    def _resolve_source(self, uri: str) -> str:
+        """models:/ uri 換成 registry 記錄的實際 artifact 位置"""
+        match = MODELS_URI_PATTERN.match(uri)
+        if match is None:
+            return uri
+
+        from mlflow.tracking import MlflowClient
+        client = MlflowClient()
+        if match.group("alias"):
+            model_version = client.get_model_version_by_alias(match.group("name"), match.group("alias"))
+        else:
+            model_version = client.get_model_version(match.group("name"), match.group("version"))
+        return model_version.source
+
+    def _source_digest(self, source: str) -> str:
+        """依來源的檔案清單與各檔 checksum/大小計算 digest"""
+        parsed = urlparse(source)
+        if parsed.scheme == "gs":
+            entries = self._list_gcs(parsed.netloc, parsed.path.lstrip("/"))
+        elif parsed.scheme in ("", "file"):
+            entries = self._list_local(parsed.path if parsed.scheme == "file" else source)
+        else:
+            raise ArtifactCacheError(f"Unsupported artifact source: {source}")
+
+        if not entries:
+            raise ArtifactCacheError(f"No artifacts found at {source}")
+
+        hasher = hashlib.sha256(source.rstrip("/").encode())
+        for name, fingerprint in sorted(entries):
+            hasher.update(f"\0{name}\0{fingerprint}".encode())
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _list_gcs(bucket: str, prefix: str) -> List[Tuple[str, str]]:
+        from google.cloud import storage
+
+        prefix = prefix.rstrip("/") + "/"
+        blobs = storage.Client().list_blobs(bucket, prefix=prefix)
+        return [
+            (blob.name[len(prefix):], f"{blob.size}:{blob.md5_hash or blob.crc32c}")
+            for blob in blobs
+            if not blob.name.endswith("/")
+        ]
+
+    @staticmethod
+    def _list_local(path: str) -> List[Tuple[str, str]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                stat = os.stat(full_path)
+                entries.append((os.path.relpath(full_path, path), f"{stat.st_size}:{stat.st_mtime_ns}"))
+        return entries
+
+    def _lock_path(self, digest: str) -> str:
+        return os.path.join(self.root, LOCK_DIR, f"{digest}.lock")
+
+    def _lock(self, digest: str, flags: int) -> IO:
+        """
+        取得跨 process 的檔案鎖 (同一個 node 上的 worker 共用)，回傳開啟中的鎖檔，關閉即釋放
+        等待期間鎖檔被淘汰刪除時重新開啟，確保所有 worker 鎖的是同一個檔案
+        """
+        path = self._lock_path(digest)
+        while True:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            lock_file = open(path, "a")
+            try:
+                fcntl.flock(lock_file, flags)
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path)):
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+
+    def _is_valid(self, entry: str, repair: bool = False) -> bool:
+        """檢查 manifest 中每個檔案的大小，開啟 verify 時再比對 sha256；repair 時刪除損壞的 entry (需持有排他鎖)"""
+        manifest_path = os.path.join(entry, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return False
+
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            model_dir = os.path.join(entry, MODEL_DIR)
+            for name, meta in manifest["files"].items():
+                path = os.path.join(model_dir, name)
+                if os.path.getsize(path) != meta["size"]:
+                    raise ValueError(f"size mismatch: {name}")
+                if self.verify and _sha256(path) != meta["sha256"]:
+                    raise ValueError(f"checksum mismatch: {name}")
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Artifact cache entry {entry} is corrupted, refetching: {str(e)}")
+            if repair:
+                shutil.rmtree(entry, ignore_errors=True)
+            return False
+
+    def _fill(self, source: str, entry: str):
+        """下載到暫存目錄、寫入 manifest 後再 rename，其他 worker 不會看到下載一半的內容"""
+        start_time = time.time()
+        tmp_entry = f"{entry}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        shutil.rmtree(entry, ignore_errors=True)
+        model_dir = os.path.join(tmp_entry, MODEL_DIR)
+
+        try:
+            logger.info(f"Artifact cache miss, downloading {source}")
+            parsed = urlparse(source)
+            if parsed.scheme in ("", "file"):
+                shutil.copytree(parsed.path if parsed.scheme == "file" else source, model_dir)
+            else:
+                import mlflow
+                os.makedirs(tmp_entry)
+                downloaded = mlflow.artifacts.download_artifacts(artifact_uri=source, dst_path=tmp_entry)
+                os.rename(downloaded, model_dir)
+
+            files = {}
+            for dirpath, _, filenames in os.walk(model_dir):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    files[os.path.relpath(path, model_dir)] = {
+                        "size": os.path.getsize(path),
+                        "sha256": _sha256(path),
+                    }
+
+            manifest = {
+                "source": source,
+                "created_at": time.time(),
+                "total_bytes": sum(meta["size"] for meta in files.values()),
+                "files": files,
+            }
+            with open(os.path.join(tmp_entry, MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f)
+
+            os.rename(tmp_entry, entry)
+        except Exception:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            raise
+
+        logger.info(
+            f"Artifact cached at {entry}, {manifest['total_bytes'] / 1024 ** 2:.1f} MiB, "
+            f"duration: {time.time() - start_time:.2f} 秒"
+        )
+
+    def _evict(self, keep: str):
+        """
+        總大小超過上限時，依最後使用時間 (manifest mtime) 淘汰；
+        有 worker 持有 lease (模型仍在使用) 的 entry 會被略過，淘汰時一併刪除鎖檔
+        """
+        entries: Dict[str, Tuple[float, int]] = {}
+        for digest in os.listdir(self.root):
+            if digest == LOCK_DIR:
+                continue
+            manifest_path = os.path.join(self.root, digest, MANIFEST_FILE)
+            try:
+                with open(manifest_path) as f:
+                    total_bytes = json.load(f)["total_bytes"]
+                entries[digest] = (os.path.getmtime(manifest_path), total_bytes)
+            except (OSError, ValueError, KeyError):
+                continue
+
+        total = sum(size for _, size in entries.values())
+        for digest, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            if self._remove(digest):
+                total -= size
+                self.evictions += 1
+                logger.info(f"Evicted artifact cache entry {digest}")
+
+        # 下載失敗等情況留下、沒有對應 entry 的鎖檔
+        for lock_name in os.listdir(os.path.join(self.root, LOCK_DIR)):
+            digest = lock_name[:-len(".lock")]
+            if lock_name.endswith(".lock") and digest not in entries and digest != keep:
+                self._remove(digest)
+
+    def _remove(self, digest: str) -> bool:
+        """在排他鎖下刪除 entry 與鎖檔，有 worker 持有鎖時返回 False"""
+        try:
+            lock_file = self._lock(digest, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        with lock_file:
+            shutil.rmtree(os.path.join(self.root, digest), ignore_errors=True)
+            # 持有鎖時刪除，等待中的 worker 取得鎖後會發現檔案已換而重新開啟
+            os.unlink(self._lock_path(digest))
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "root": self.root,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ArtifactLease:
+    """ArtifactCache.acquire 取得的模型目錄，持有共享鎖直到 release"""
+
+    def __init__(self, digest: str, path: str, total_bytes: int, lock_file: IO):
+        self.digest = digest
+        self.path = path
+        self.total_bytes = total_bytes
+        self._lock_file = lock_file
+
+    def release(self):
+        if not self._lock_file.closed:
+            self._lock_file.close()
+
+
+def _sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+artifact_cache = ArtifactCache()
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+from porygon_api.inference.executor import InferenceExecutor, InferenceQueueFull, inference_executor
+
+logger = logging.getLogger(__name__)
+
+
+class PredictBatcher:
+    """
+    微批次 (micro-batching) 派發器
+    收集同一時間窗內的多個預測請求，合併成一次 model.predict([...]) 呼叫，
+    再把結果依序分發回各個呼叫者；批次在推論執行緒池中執行，不會阻塞 event loop。
+    等待組成批次的請求數有上限，超過時直接拒絕 (InferenceQueueFull)
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Any]], Any],
+        max_batch_size: Optional[int] = None,
+        window_ms: Optional[float] = None,
+        executor: Optional[InferenceExecutor] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.predict_fn = predict_fn
+        self.executor = executor or inference_executor
+        self.max_batch_size = max_batch_size or int(os.getenv("PREDICT_BATCH_MAX_SIZE", 8))
+        if window_ms is None:
+            window_ms = float(os.getenv("PREDICT_BATCH_WINDOW_MS", 20))
+        self.window = window_ms / 1000
+        # 預設為推論執行緒池最多能容納的批次數 x 每批筆數
+        self.max_pending = max_pending or int(os.getenv(
+            "PREDICT_BATCH_MAX_PENDING",
+            (self.executor.max_workers + self.executor.max_queue) * self.max_batch_size,
+        ))
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    def _ensure_worker(self):
+        """在目前的 event loop 上啟動收集批次的 worker"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"PredictBatcher started, max_batch_size: {self.max_batch_size}, "
+                f"window: {self.window * 1000:.0f} ms"
+            )
+
+    async def submit(self, item: Any) -> Any:
+        """
+        提交單筆模型輸入，等待所屬批次完成後取得該筆的預測結果
+        Args:
+            item: 單筆模型輸入，例如 {"input": "..."}
+        Returns:
+            該筆輸入對應的預測結果
+        Raises:
+            InferenceQueueFull: 等待組成批次的請求已達上限
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise InferenceQueueFull(f"Predict batch queue is full ({self.max_pending} pending)")
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        """等待第一筆請求，之後在時間窗內盡量湊滿一個批次"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # 批次交給執行緒池後立即收集下一批，並行度由 executor 控制
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        # 已經取消 (client 斷線) 的請求不需要再送進模型
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        inputs = [item for item, _ in batch]
+        logger.info(f"Dispatching predict batch, size: {len(inputs)}")
+
+        try:
+            results = await self.executor.run(self.predict_fn, inputs)
+        except Exception as e:
+            logger.error(f"Batch prediction error: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if results is None:
+            outputs = [None] * len(batch)
+        elif isinstance(results, list) and len(results) == len(batch):
+            outputs = results
+        elif len(batch) == 1:
+            outputs = [results]
+        else:
+            error = RuntimeError(
+                f"Batch prediction returned {type(results).__name__} "
+                f"that does not match batch size {len(batch)}"
+            )
+            logger.error(str(error))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
@@ -0,0 +1,123 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """推論佇列已滿，呼叫端應直接回傳 503"""
+
+
+class InferenceExecutor:
+    """
+    推論專用的有界執行緒池
+    同步的 model.predict 在這裡執行，不再佔住 uvicorn 的 event loop；
+    正在執行加上等待中的工作超過上限時直接拒絕 (backpressure)
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None):
+        self.max_workers = max_workers or int(os.getenv("INFERENCE_MAX_WORKERS", 4))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("INFERENCE_MAX_QUEUE", 16))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._wait_times = deque(maxlen=1024)
+
+    def submit(self, fn: Callable[..., Any], *args) -> "asyncio.Future":
+        """
+        同步完成 admission 檢查後把 fn(*args) 排入推論執行緒池，需在 event loop 中呼叫
+        Raises:
+            InferenceQueueFull: 執行中與等待中的工作已達上限
+        """
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise InferenceQueueFull(
+                    f"Inference queue is full ({self._running} running, {self._queued} waiting)"
+                )
+            self._queued += 1
+
+        submitted_at = time.perf_counter()
+        # 保留呼叫端的 contextvars (例如 request id) 到執行緒中
+        context = contextvars.copy_context()
+        # 等待中的名額只能釋放一次: 由開始執行的 _task 或取消時的 done callback 釋放
+        dequeued = [False]
+
+        def _dequeue() -> bool:
+            if dequeued[0]:
+                return False
+            dequeued[0] = True
+            self._queued -= 1
+            return True
+
+        def _task():
+            with self._lock:
+                _dequeue()
+                self._running += 1
+                self._wait_times.append(time.perf_counter() - submitted_at)
+            try:
+                return context.run(fn, *args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        def _release(_):
+            # 開始執行前就被取消 (client 斷線、timeout) 時 _task 不會執行，在這裡釋放名額
+            with self._lock:
+                if _dequeue():
+                    self._cancelled += 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, _task)
+        future.add_done_callback(_release)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        在推論執行緒池中執行 fn(*args) 並等待結果
+        Raises:
+            InferenceQueueFull: 執行中與等待中的工作已達上限
+        """
+        return await self.submit(fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        """回傳佇列深度與等待時間，用於評估 Pod 的規格與數量"""
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            stats = {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+            }
+
+        if wait_times:
+            stats["wait_ms"] = {
+                "p50": wait_times[len(wait_times) // 2] * 1000,
+                "p95": wait_times[min(len(wait_times) - 1, int(len(wait_times) * 0.95))] * 1000,
+                "max": wait_times[-1] * 1000,
+            }
+        else:
+            stats["wait_ms"] = {"p50": 0.0, "p95": 0.0, "max": 0.0}
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,198 @@
+import os
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from mlflow.entities import Metric, Param
+from mlflow.tracking import MlflowClient
+
+logger = logging.getLogger(__name__)
+
+# MLflow log_batch 單次最多 1000 筆 metric
+LOG_BATCH_MAX_METRICS = 1000
+
+
+@dataclass
+class RunRecord:
+    """單次預測要寫入 MLflow 的資料"""
+    run_name: str
+    tags: Dict[str, str] = field(default_factory=dict)
+    params: Dict[str, Any] = field(default_factory=dict)
+    metrics: Dict[str, float] = field(default_factory=dict)
+    start_time: int = field(default_factory=lambda: int(time.time() * 1000))
+    end_time: Optional[int] = None
+    status: str = "FINISHED"
+
+
+class MlflowRunLogger:
+    """
+    非同步的 MLflow run 記錄緩衝區
+    預測時只把 RunRecord 放進 in-process queue，由背景執行緒批次寫入 tracking server；
+    同一批中 run_name、tags、文字 param 與 status 相同的紀錄合併成一個 run，每筆預測為一個 step
+    """
+
+    def __init__(
+        self,
+        max_queue: int = None,
+        batch_size: int = None,
+        flush_interval: float = None,
+    ):
+        self.max_queue = max_queue or int(os.getenv("MLFLOW_LOG_MAX_QUEUE", 1000))
+        self.batch_size = batch_size or int(os.getenv("MLFLOW_LOG_BATCH_SIZE", 50))
+        self.flush_interval = flush_interval or float(os.getenv("MLFLOW_LOG_FLUSH_INTERVAL_SECONDS", 5))
+        self.max_backoff = float(os.getenv("MLFLOW_LOG_MAX_BACKOFF_SECONDS", 60))
+        self.experiment_id: Optional[str] = None
+        self._queue: "queue.Queue[RunRecord]" = queue.Queue(maxsize=self.max_queue)
+        self._client: Optional[MlflowClient] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # start() 之前 (例如 MLflow 設定失敗) 不收紀錄
+        self.enabled = False
+        self.logged = 0
+        self.runs_created = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.failed_flushes = 0
+
+    def start(self, experiment_id: Optional[str], client: Optional[MlflowClient] = None):
+        """設定 experiment 並啟動背景寫入執行緒"""
+        self.experiment_id = experiment_id
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._client = client or MlflowClient()
+            self.enabled = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mlflow-run-logger", daemon=True)
+            self._thread.start()
+        logger.info(f"MLflow run logger started, experiment_id: {experiment_id}")
+
+    def log_run(self, record: RunRecord):
+        """放入 queue 後立即返回；queue 已滿時丟棄，不阻塞預測"""
+        if not self.enabled:
+            self.skipped += 1
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"MLflow run log queue is full, dropped run: {record.run_name}")
+
+    def _drain(self, timeout: float) -> List[RunRecord]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stop.is_set():
+            batch = self._drain(self.flush_interval)
+            if not batch:
+                continue
+            try:
+                self._flush(batch)
+                backoff = 0.0
+            except Exception as e:
+                # tracking server 異常：丟棄這批並退避，避免 queue 無限累積
+                self.failed_flushes += 1
+                self.dropped += len(batch)
+                backoff = min(self.max_backoff, max(1.0, backoff * 2))
+                logger.warning(
+                    f"MLflow run log flush failed, dropped {len(batch)} runs, "
+                    f"retry in {backoff:.0f} 秒: {str(e)}"
+                )
+                self._stop.wait(backoff)
+
+    def _flush(self, batch: List[RunRecord]):
+        if self.experiment_id is None:
+            raise RuntimeError("MLflow experiment is not configured")
+
+        for (run_name, tags, params, status), records in self._group(batch).items():
+            run = self._client.create_run(
+                experiment_id=self.experiment_id,
+                start_time=min(record.start_time for record in records),
+                tags={**dict(tags), "prediction_count": str(len(records))},
+                run_name=run_name,
+            )
+            metrics = []
+            for step, record in enumerate(records):
+                timestamp = record.end_time or record.start_time
+                values = dict(record.metrics)
+                # 數值 param (例如 batch_size) 每筆不同，改記為 metric
+                values.update({
+                    key: value for key, value in record.params.items()
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)
+                })
+                metrics.extend(Metric(key, float(value), timestamp, step) for key, value in values.items())
+            run_params = [Param(key, value) for key, value in params]
+            for start in range(0, max(len(metrics), 1), LOG_BATCH_MAX_METRICS):
+                self._client.log_batch(
+                    run.info.run_id,
+                    metrics=metrics[start:start + LOG_BATCH_MAX_METRICS],
+                    params=run_params if start == 0 else [],
+                )
+            end_time = max(record.end_time or record.start_time for record in records)
+            self._client.set_terminated(run.info.run_id, status=status, end_time=end_time)
+            self.runs_created += 1
+            self.logged += len(records)
+
+    @staticmethod
+    def _group(batch: List[RunRecord]) -> Dict[Tuple, List[RunRecord]]:
+        """依 run_name、tags、文字 param 與 status 分組，保持原本順序"""
+        groups: Dict[Tuple, List[RunRecord]] = {}
+        for record in batch:
+            params = tuple(sorted(
+                (key, str(value)) for key, value in record.params.items()
+                if not isinstance(value, (int, float)) or isinstance(value, bool)
+            ))
+            key = (record.run_name, tuple(sorted(record.tags.items())), params, record.status)
+            groups.setdefault(key, []).append(record)
+        return groups
+
+    def flush(self, timeout: float = 5.0):
+        """關閉服務前把 queue 中剩下的紀錄寫出"""
+        deadline = time.time() + timeout
+        while not self._queue.empty() and time.time() < deadline:
+            batch = self._drain(0)
+            if not batch:
+                break
+            try:
+                self._flush(batch)
+            except Exception as e:
+                self.dropped += len(batch) + self._queue.qsize()
+                logger.warning(f"MLflow run log final flush failed: {str(e)}")
+                break
+
+    def stop(self):
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "enabled": self.enabled,
+            "logged": self.logged,
+            "runs_created": self.runs_created,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+run_logger = MlflowRunLogger()
@@ -0,0 +1,56 @@
+import json
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# 代表串流結束的事件名稱
+END_OF_STREAM = "__end__"
+
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    """
+    把 LangChain agent 執行中的事件 (推理步驟、工具結果、token) 轉送到 asyncio queue
+    callback 在推論執行緒中觸發，透過 call_soon_threadsafe 交回 event loop
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+
+    def _emit(self, event: str, data: Dict[str, Any]):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self._emit("token", {"token": token})
+
+    def on_agent_action(self, action, **kwargs: Any) -> None:
+        self._emit("step", {
+            "tool": action.tool,
+            "tool_input": str(action.tool_input),
+            "log": action.log,
+        })
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self._emit("observation", {"output": str(output)})
+
+    def on_agent_finish(self, finish, **kwargs: Any) -> None:
+        self._emit("agent_finish", {"log": finish.log})
+
+
+async def iterate_events(queue: asyncio.Queue) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """依序取出 queue 中的事件，直到收到 END_OF_STREAM"""
+    while True:
+        event, data = await queue.get()
+        if event == END_OF_STREAM:
+            return
+        yield event, data
+
+
+def format_sse(event: str, data: Any) -> str:
+    """組成一個 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -1,16 +1,31 @@
 import os
 import logging
+import datetime
 from fastapi import FastAPI
 from fastapi import Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from porygon_api.model_manager import model_manager
+from porygon_api.inference.executor import inference_executor
+from porygon_api.inference.run_logger import run_logger
+from porygon_api.inference.artifact_cache import artifact_cache
+from porygon_api.app.AIservice.dependencies import get_ai_service
 from porygon_api.app.AIservice.router import router as agent_router
 from porygon_api.app.UserQuery.router import router as userquery_router
-from porygon_api.middleware.auth import AuthMiddleware
-from porygon_api.middleware.http import HttpMiddleware
-from porygon_api.middleware.logging import BigQueryLoggingMiddleware
-from google.cloud import bigquery
-from porygon_api.middleware.logging import bq_client
+from porygon_api.app.UserQuery.dependencies import get_item_service
+from porygon_api.security.api_key import api_key_store
+from porygon_api.database.db_connector import cloud_sql_connector
+from porygon_api.middleware.pipeline import PipelineMiddleware, RequestIdStage
+from porygon_api.middleware.auth import AuthStage
+from porygon_api.middleware.http import TimingStage
+from porygon_api.middleware.logging import LoggingStage
+from porygon_api.middleware.rate_limit import RateLimitStage
+from porygon_api.middleware.logging import bq_client, bq_shipper, table_id, logging_policy
+from porygon_api.middleware.metrics import MetricsStage
+from porygon_api.monitoring.rolling_metrics import rolling_metrics
+from porygon_api.monitoring.historical import query_daily_metrics
+from porygon_api.monitoring import prometheus
 
 
 logger = logging.getLogger("porygon_api")
@@ -28,9 +43,13 @@ api_predix = "/api/v1/porygon"
 app.include_router(agent_router, prefix=f"{api_predix}/AIservice")
 app.include_router(userquery_router, prefix=f"{api_predix}/UserQuery")
 
-app.add_middleware(BigQueryLoggingMiddleware)
-app.add_middleware(AuthMiddleware)
-app.add_middleware(HttpMiddleware)
+# 計時、統計、驗證、BigQuery 紀錄、限流合併成單一 pure ASGI middleware，依序執行；
+# 驗證失敗的請求不會進到 LoggingStage，被限流的 429 會寫入紀錄
+rate_limit_stage = RateLimitStage()
+app.add_middleware(
+    PipelineMiddleware,
+    stages=[RequestIdStage(), TimingStage(), MetricsStage(), AuthStage(), LoggingStage(), rate_limit_stage]
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -51,38 +70,83 @@ async def health_check():
     return {
         "status": "healthy" if model_loaded else "degraded",
         "model_loaded": model_loaded,
+        "model_load_state": model_manager.load_state,
         "environment": env_info,
         "version": "1.0.0"
     }
 
 
+@app.get("/health/live")
+async def liveness_probe():
+    """Liveness probe: 只確認 process 還能回應，不檢查模型"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """Readiness probe: 模型載入完成、Cloud SQL pool warmup 結束才回 200，不會觸發載入"""
+    if not cloud_sql_connector.warmup_finished:
+        return JSONResponse(status_code=503, content={"status": "warming_up_db_pool", "error": None})
+    if model_manager.is_ready():
+        return {"status": "ready", "model_uri": model_manager.model_uri}
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": model_manager.load_state,
+            "error": model_manager.load_error,
+        }
+    )
+
+
+@app.get("/inference/stats")
+async def get_inference_stats():
+    """推論執行緒池的佇列深度、等待時間、答案快取命中率與各模型的載入狀態"""
+    return {
+        "models": model_manager.stats(),
+        "executor": inference_executor.stats(),
+        "answer_cache": get_ai_service().answer_cache.stats(),
+        "mlflow_run_logger": run_logger.stats(),
+        "artifact_cache": artifact_cache.stats(),
+        "bigquery_log_shipper": bq_shipper.stats(),
+        "bigquery_logging_policy": logging_policy.stats(),
+        "api_key_store": api_key_store.stats(),
+        "rate_limit": rate_limit_stage.stats(),
+        "item_cache": get_item_service().item_cache.stats(),
+        "item_loader": get_item_service().item_loader.stats(),
+        "cloud_sql_pool": cloud_sql_connector.pool_stats(),
+    }
+
+
+@app.get("/metrics")
+async def get_prometheus_metrics():
+    """Prometheus text exposition，不需 API Key"""
+    content, content_type = prometheus.render()
+    return Response(content=content, media_type=content_type)
+
+
 @app.get("/metric")
 async def get_api_metrics(date: str = Query(None, description="日期格式 YYYY-MM-DD，默認為最近24小時")):
+    """
+    未指定日期時從記憶體中的滑動視窗回傳最近 METRICS_WINDOW_SECONDS 的統計
+    (有 METRICS_SHARED_DIR / PROMETHEUS_MULTIPROC_DIR 時合併所有 worker，回應的 scope 標示範圍)；
+    指定日期時查詢 BigQuery，結果會快取
+    """
+    if not date:
+        metrics = rolling_metrics.snapshot()
+        metrics["source"] = "memory"
+        return metrics
 
     try:
-        if date:
-            date_filter = f"DATE(create_time) = '{date}'"
-        else:
-            date_filter = "create_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)"
-        query = f"""
-            SELECT
-                COUNT(*) as total_requests,
-                AVG(latency_ms) as average_latency_ms,
-                COUNTIF(status_code >= 400) / COUNT(*) as error_rate
-            FROM `genibuilder.porygon_api_logs.api_records`
-            WHERE {date_filter}
-            """
-
-        query_job = bq_client.query(query)
-        results = query_job.result()
-
-        for row in results:
-            return {
-                "total_requests": row.total_requests,
-                "average_latency_ms": row.average_latency_ms,
-                "error_rate": row.error_rate
-            }
-        return {"total_requests": 0, "average_latency_ms": 0, "error_rate": 0}
+        query_date = datetime.date.fromisoformat(date)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid date, expected YYYY-MM-DD", "total_requests": 0, "average_latency_ms": 0, "error_rate": 0}
+        )
+
+    try:
+        metrics = await run_in_threadpool(query_daily_metrics, bq_client, table_id, query_date)
+        return {**metrics, "date": query_date.isoformat(), "source": "bigquery"}
     except Exception as e:
         logging.error(f"Error retrieving metrics: {str(e)}")
         return {"error": str(e), "total_requests": 0, "average_latency_ms": 0, "error_rate": 0}
@@ -93,14 +157,28 @@ async def startup_event():
     """應用啟動時執行的操作"""
     logger.info("Porygon API server is starting...")
 
-    # 確保模型管理器已初始化
-    if model_manager.get_model() is not None:
-        logger.info("Model is loaded successfully! AI server is ready!")
-    else:
-        logger.warning("Model loading failed.AI server could not work.")
+    # 模型在背景載入 (含重試)，完成後 /health/ready 才會回 200；
+    # 載入成功後會自動開始輪詢 registry alias
+    model_manager.start_loading()
+
+    # 整批載入 API key，之後在背景定期重新載入 (撤銷最晚在 API_KEY_REFRESH_SECONDS 內生效)
+    # 第一次載入會查詢資料庫，放到 threadpool 執行不阻塞 event loop
+    await run_in_threadpool(api_key_store.start)
+
+    # 每個 worker 在背景預先建立 Cloud SQL 連線 (gunicorn --preload 時 pool 不能在 fork 前建立)
+    cloud_sql_connector.start_warmup()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """應用關閉時執行的操作"""
     logger.info("Porygon API Server is closing...")
+    model_manager.stop_alias_watcher()
+    inference_executor.shutdown()
+    run_logger.stop()
+    bq_shipper.stop()
+    # 結束前寫出最後的統計，其他 worker 在視窗內仍會合併這段資料
+    rolling_metrics.flush()
+    api_key_store.stop()
+    await rate_limit_stage.close()
+    await cloud_sql_connector.aclose()
@@ -1,61 +1,78 @@
 import logging
-from fastapi import Request, HTTPException
+from typing import Any, Dict, Optional, Tuple
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
 from porygon_api.security.api_key import (
-    verify_api_key,
+    averify_api_key,
     check_endpoint_permission
 )
 from porygon_api.schemas import BaseResponse
+from porygon_api.middleware.pipeline import RequestContext, Stage
 
+public_paths = ["/docs", "/openapi.json", "/redoc", "/api/v1/public", "/health/live", "/health/ready", "/metrics"]
+# str.startswith 接受 tuple，一次比對所有前綴
+_public_prefixes = tuple(public_paths)
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        public_paths = ["/docs", "/openapi.json", "/redoc", "/api/v1/public"]
-
-        if any(request.url.path.startswith(path) for path in public_paths):
-            return await call_next(request)
-
-        api_key = request.headers.get("X-API-Key")
-        if api_key:
-            try:
-                user_info = verify_api_key(api_key)
-            except HTTPException:
-                logging.warning(f"Invalid API Key: {api_key} for path: {request.url.path}")
-                return JSONResponse(
-                    status_code=401,
-                    content=BaseResponse(
-                        responseCode=401,
-                        responseMessage="Invalid API Key.",
-                        results=None
-                    ).model_dump()
-                )
-        else:
-            logging.warning(f"Missing API Key for path: {request.url.path}")
-
-            return JSONResponse(
+
+async def authenticate(path: str, method: str, api_key: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[JSONResponse]]:
+    """
+    驗證 API Key 與 endpoint 權限
+    Returns:
+        (user_info, None) 驗證通過；public path 的 user_info 為 None
+        (None, error_response) 驗證失敗，直接回傳該 response
+    """
+    if path.startswith(_public_prefixes):
+        return None, None
+
+    if api_key:
+        try:
+            user_info = await averify_api_key(api_key)
+        except HTTPException:
+            logging.warning(f"Invalid API Key: {api_key[:4]}*** for path: {path}")
+            return None, JSONResponse(
                 status_code=401,
                 content=BaseResponse(
                     responseCode=401,
-                    responseMessage="Missing authentication credentials.",
+                    responseMessage="Invalid API Key.",
                     results=None
                 ).model_dump()
             )
+    else:
+        logging.warning(f"Missing API Key for path: {path}")
 
-        request.state.user = user_info
+        return None, JSONResponse(
+            status_code=401,
+            content=BaseResponse(
+                responseCode=401,
+                responseMessage="Missing authentication credentials.",
+                results=None
+            ).model_dump()
+        )
 
-        endpoint_path = request.url.path
-        method = request.method
+    if not check_endpoint_permission(user_info, path, method):
+        logging.warning(f"Permission denied for user {user_info['user_id']} to access {method} {path}")
+        return None, JSONResponse(
+            status_code=403,
+            content=BaseResponse(
+                responseCode=403,
+                responseMessage=f"You do not have permission to access this endpoint: {method} {path}",
+                results=None
+            ).model_dump()
+        )
 
-        if not check_endpoint_permission(user_info, endpoint_path, method):
-            logging.warning(f"Permission denied for user {user_info['user_id']} to access {method} {endpoint_path}")
-            return JSONResponse(
-                status_code=403,
-                content=BaseResponse(
-                    responseCode=403,
-                    responseMessage=f"You do not have permission to access this endpoint: {method} {endpoint_path}",
-                    results=None
-                ).model_dump()
-            )
+    return user_info, None
+
+
+class AuthStage(Stage):
+    """PipelineMiddleware 的驗證 stage，驗證失敗時後面的 stage 不會執行"""
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        user_info, error_response = await authenticate(ctx.path, ctx.method, ctx.headers.get("X-API-Key"))
+        if error_response is not None:
+            return error_response
 
-        return await call_next(request)
+        if user_info is not None:
+            # 與 request.state.user 相同
+            ctx.scope.setdefault("state", {})["user"] = user_info
+        return None
@@ -1,27 +1,24 @@
-import time
 import logging
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
-from fastapi.responses import JSONResponse
+from typing import Optional
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+from porygon_api.middleware.pipeline import RequestContext, Stage
 
 logger = logging.getLogger(__name__)
 
 
-class HttpMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        logger.info(f"Start processing request: {request.method} {request.url.path}")
+class TimingStage(Stage):
+    """PipelineMiddleware 的計時 stage，在回應加上 X-Process-Time header 並記錄處理時間"""
 
-        try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
-            response.headers["X-Process-Time"] = str(process_time)
-            logger.info(f"Request processed successfully, duration: {process_time:.4f} seconds")
-            return response
-        except Exception as e:
-            process_time = time.time() - start_time
-            logger.error(f"Request processing failed: {str(e)}, duration: {process_time:.4f} seconds")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "Internal Server Error"}
-            )
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        logger.info(f"Start processing request: {ctx.method} {ctx.path}")
+        return None
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        headers["X-Process-Time"] = str(ctx.process_time)
+
+    async def on_complete(self, ctx: RequestContext):
+        if ctx.error is None:
+            logger.info(f"Request processed successfully, duration: {ctx.process_time:.4f} seconds")
+        else:
+            logger.error(f"Request processing failed: {ctx.error}, duration: {ctx.process_time:.4f} seconds")
@@ -1,144 +1,198 @@
-import time
-import uuid
+import os
+import random
 import datetime
 import json
-import io
 import logging
-from contextlib import redirect_stdout, redirect_stderr
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Any, Dict, Optional
+from starlette.datastructures import QueryParams
+from starlette.responses import Response
 from google.cloud import bigquery
+from porygon_api.monitoring.bq_shipper import BigQueryLogShipper
+from porygon_api.monitoring import log_capture
+from porygon_api.middleware.pipeline import RequestContext, Stage
 
 bq_client = bigquery.Client(project='genibuilder')
 table_id = "genibuilder.porygon_api_logs.api_records"
+# 寫入 BigQuery 改由背景批次處理，不佔用請求的延遲
+bq_shipper = BigQueryLogShipper(bq_client, table_id)
 
+# request / response body 只保留前段寫入紀錄
+LOG_BODY_MAX_BYTES = int(os.getenv("BQ_LOG_BODY_MAX_BYTES", 8000))
 
-class BigQueryLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        log_capture = io.StringIO()
-        request_id = str(uuid.uuid4())
-        request_time = datetime.datetime.now()
-        create_time = request_time.isoformat()
-        start_time = time.time()
 
-        path = request.url.path
-        method = request.method
-        client_ip = request.client.host if request.client else "unknown"
-        user_agent = request.headers.get("user-agent", "unknown")
+class CappedBuffer:
+    """只複製前 limit bytes 的 body，其餘只計算長度"""
 
-        request_body_str = ""
-        response_body_str = ""
-        status_code = 500
-        error = None
-        response = None
+    def __init__(self, limit: int = LOG_BODY_MAX_BYTES):
+        self.limit = limit
+        self.buffer = bytearray()
+        self.total_bytes = 0
 
-        try:
-            request_body = await request.body()
-            request_body_str = request_body.decode("utf-8")
+    def append(self, chunk: bytes):
+        self.total_bytes += len(chunk)
+        remaining = self.limit - len(self.buffer)
+        if remaining > 0 and chunk:
+            self.buffer += chunk[:remaining]
 
-            async def receive():
-                return {"type": "http.request", "body": request_body}
-            request._receive = receive
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.buffer)
 
-            with redirect_stdout(log_capture), redirect_stderr(log_capture):
-                try:
-                    response = await call_next(request)
-                    response_body = b""
-                    async for chunk in response.body_iterator:
-                        response_body += chunk
-                    response_body_str = response_body.decode("utf-8")
-                    from starlette.responses import Response
-                    response = Response(
-                        content=response_body,
-                        status_code=response.status_code,
-                        headers=dict(response.headers),
-                        media_type=response.media_type
-                    )
-
-                    status_code = response.status_code
-                except Exception as inner_e:
-                    error = str(inner_e)
-                    logging.exception(f"[Middleware] Inner exception during request {request_id}")
-                    from starlette.responses import JSONResponse
-                    response = JSONResponse(
-                        status_code=500,
-                        content={"detail": "Internal Server Error", "error": str(inner_e)}
-                    )
-                    status_code = 500
-
-        except Exception as e:
-            error = str(e)
-            logging.exception(f"[Middleware] Outer exception during request {request_id}")
-            from starlette.responses import JSONResponse
-            response = JSONResponse(
-                status_code=500,
-                content={"detail": "Middleware Error", "error": str(e)}
-            )
-            status_code = 500
+    def text(self) -> str:
+        # 截斷處可能切在多 byte 字元中間
+        return self.buffer.decode("utf-8", errors="replace")
+
+
+class LoggingPolicy:
+    """
+    決定每個請求寫入 BigQuery 的內容
+    錯誤、慢請求與抽樣到的請求保留 body、header 與 log；其餘只寫入 metadata。
+    header 只保留 allowlist 中的欄位，API key 等敏感 header 一律遮蔽
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = None,
+        slow_ms: float = None,
+        header_allowlist: str = None,
+        redact_headers: str = None,
+    ):
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("BQ_LOG_SAMPLE_RATE", 0.01))
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.getenv("BQ_LOG_SLOW_MS", 2000))
+        allowlist = header_allowlist if header_allowlist is not None else os.getenv(
+            "BQ_LOG_HEADER_ALLOWLIST", "user-agent,content-type,content-length,x-model-name,x-forwarded-for"
+        )
+        # "*" 表示保留所有 header (敏感 header 仍會遮蔽)
+        self.header_allowlist = None if allowlist.strip() == "*" else {
+            name.strip().lower() for name in allowlist.split(",") if name.strip()
+        }
+        redact = redact_headers if redact_headers is not None else os.getenv(
+            "BQ_LOG_REDACT_HEADERS", "x-api-key,authorization,proxy-authorization,cookie"
+        )
+        self.redact_headers = {name.strip().lower() for name in redact.split(",") if name.strip()}
+        self.full_rows = 0
+        self.compact_rows = 0
+
+    def keep_full(self, status_code: int, error: Optional[str], latency_ms: float) -> bool:
+        if status_code >= 400 or error is not None or latency_ms >= self.slow_ms:
+            return True
+        return random.random() < self.sample_rate
+
+    def filter_headers(self, headers) -> Dict[str, str]:
+        filtered = {}
+        for name, value in headers.items():
+            # Starlette 的 Headers 已是小寫，一般 dict 可能不是
+            name = name.lower()
+            if name in self.redact_headers:
+                filtered[name] = "[REDACTED]"
+            elif self.header_allowlist is None or name in self.header_allowlist:
+                filtered[name] = value
+        return filtered
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "full_rows": self.full_rows,
+            "compact_rows": self.compact_rows,
+        }
+
+
+logging_policy = LoggingPolicy()
+
+
+class LoggingStage(Stage):
+    """
+    PipelineMiddleware 的 BigQuery 紀錄 stage
+    request / response 的 chunk 直接轉送，只複製 body 前段；
+    以 contextvars 依請求分流 log，不切換 process 共用的 sys.stdout / sys.stderr
+    """
 
+    def __init__(self):
+        log_capture.install()
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        ctx.extras["request_time"] = datetime.datetime.now()
+        ctx.extras["request_body"] = CappedBuffer()
+        ctx.extras["response_body"] = CappedBuffer()
+        ctx.extras["log_capture"] = log_capture.start_capture(ctx.request_id)
+        return None
+
+    def on_request_body(self, ctx: RequestContext, body: bytes):
+        ctx.extras["request_body"].append(body)
+
+    def on_response_body(self, ctx: RequestContext, body: bytes):
+        ctx.extras["response_body"].append(body)
+
+    async def on_complete(self, ctx: RequestContext):
+        capture, token = ctx.extras["log_capture"]
+        try:
+            self._ship(ctx, capture)
         finally:
-            response_time = datetime.datetime.now()
-            process_time = time.time() - start_time
-            log_output = log_capture.getvalue()
-
-            if status_code != 200 and error is None:
-                if 400 <= status_code < 500:
-                    error = f"Client Error: HTTP {status_code}"
-                elif 500 <= status_code < 600:
-                    error = f"Server Error: HTTP {status_code}"
-                else:
-                    error = f"HTTP Status: {status_code}"
-
-                if response_body_str:
-                    try:
-                        response_data = json.loads(response_body_str)
-                        if isinstance(response_data, dict):
-                            error_detail = (
-                                response_data.get("detail") or
-                                response_data.get("error") or
-                                response_data.get("message") or
-                                response_data.get("responseMessage")
-                            )
-                            if error_detail:
-                                error = f"{error} - {error_detail}"
-                    except (json.JSONDecodeError, ValueError):
-                        pass
-            row = {
-                "request_id": request_id,
-                "request_body": request_body_str[:8000] if request_body_str else "",
-                "response_body": response_body_str[:8000] if response_body_str else "",
-                "create_time": create_time,
-                "request_time": request_time.isoformat(),
-                "response_time": response_time.isoformat(),
-                "method": method,
-                "path": path,
-                "status_code": status_code,
-                "latency_ms": process_time * 1000,
-                "client_ip": client_ip,
-                "user_agent": user_agent,
-                "error": error,
-                "log": log_output[:8000],
-                "request_headers": json.dumps(dict(request.headers)),
-                "query_params": json.dumps(dict(request.query_params))
-            }
-
-            try:
-                errors = bq_client.insert_rows_json(table_id, [row])
-                if errors:
-                    logging.error(f"[BigQuery] Insert errors for request {request_id}: {errors}")
-                else:
-                    logging.info(f"[BigQuery] Logged request {request_id} to {table_id}")
-            except Exception as bq_error:
-                logging.exception(f"[BigQuery] Failed to insert request {request_id}: {str(bq_error)}")
-
-            if response:
-                response.headers["X-Request-ID"] = request_id
-                response.headers["X-Process-Time"] = str(process_time)
-                return response
+            log_capture.stop_capture(token)
+
+    @staticmethod
+    def _ship(ctx: RequestContext, capture: log_capture.RequestLogCapture):
+        request_time = ctx.extras["request_time"]
+        response_time = datetime.datetime.now()
+        latency_ms = ctx.process_time * 1000
+        status_code = ctx.status_code
+        error = ctx.error
+        full = logging_policy.keep_full(status_code, error, latency_ms)
+
+        if status_code != 200 and error is None:
+            if 400 <= status_code < 500:
+                error = f"Client Error: HTTP {status_code}"
+            elif 500 <= status_code < 600:
+                error = f"Server Error: HTTP {status_code}"
             else:
-                from starlette.responses import JSONResponse
-                return JSONResponse(
-                    status_code=500,
-                    content={"detail": "No response generated", "request_id": request_id},
-                    headers={"X-Request-ID": request_id, "X-Process-Time": str(process_time)}
-                )
+                error = f"HTTP Status: {status_code}"
+
+            response_body = ctx.extras["response_body"]
+            response_body_str = response_body.text()
+            if response_body_str and not response_body.truncated:
+                try:
+                    response_data = json.loads(response_body_str)
+                    if isinstance(response_data, dict):
+                        error_detail = (
+                            response_data.get("detail") or
+                            response_data.get("error") or
+                            response_data.get("message") or
+                            response_data.get("responseMessage")
+                        )
+                        if error_detail:
+                            error = f"{error} - {error_detail}"
+                except (json.JSONDecodeError, ValueError):
+                    pass
+        client = ctx.scope.get("client")
+        row = {
+            "request_id": ctx.request_id,
+            "request_body": "",
+            "response_body": "",
+            "create_time": request_time.isoformat(),
+            "request_time": request_time.isoformat(),
+            "response_time": response_time.isoformat(),
+            "method": ctx.method,
+            "path": ctx.path,
+            "status_code": status_code,
+            "latency_ms": latency_ms,
+            "client_ip": client[0] if client else "unknown",
+            "user_agent": ctx.headers.get("user-agent", "unknown"),
+            "error": error,
+            "log": "",
+            "request_headers": "{}",
+            "query_params": json.dumps(dict(QueryParams(ctx.scope.get("query_string", b""))))
+        }
+        if full:
+            # 錯誤、慢請求與抽樣到的請求才保留 body、header 與 log
+            logging_policy.full_rows += 1
+            row["request_body"] = ctx.extras["request_body"].text()
+            row["response_body"] = ctx.extras["response_body"].text()
+            row["log"] = capture.getvalue()
+            row["request_headers"] = json.dumps(logging_policy.filter_headers(ctx.headers))
+        else:
+            logging_policy.compact_rows += 1
+
+        if not bq_shipper.enqueue(row):
+            logging.warning(f"[BigQuery] Log queue is full, dropped request {ctx.request_id}")
+
@@ -0,0 +1,26 @@
+from porygon_api.middleware.pipeline import RequestContext, Stage
+from porygon_api.monitoring.rolling_metrics import rolling_metrics
+from porygon_api.monitoring.prometheus import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+def route_template(ctx: RequestContext) -> str:
+    """以路由的 path 模板統計 (例如 /items/{item_id})，避免每個 id 都成為一個 route"""
+    route = ctx.scope.get("route")
+    if route is not None:
+        return getattr(route, "path", ctx.path)
+    return "unmatched"
+
+
+class MetricsStage(Stage):
+    """PipelineMiddleware 的統計 stage，記錄每個 route 的請求數、錯誤率與延遲，以及處理中的請求數"""
+
+    async def on_request(self, ctx: RequestContext):
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        return None
+
+    async def on_complete(self, ctx: RequestContext):
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        process_time = ctx.process_time
+        route = route_template(ctx)
+        rolling_metrics.record(f"{ctx.method} {route}", ctx.status_code, process_time * 1000)
+        HTTP_REQUEST_DURATION.labels(method=ctx.method, route=route, status=str(ctx.status_code)).observe(process_time)
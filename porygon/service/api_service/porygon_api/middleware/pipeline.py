@@ -0,0 +1,160 @@
+import time
+import uuid
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from porygon_api.monitoring.prometheus import MIDDLEWARE_STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContext:
+    """單一請求在各 stage 之間共用的狀態"""
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.headers = Headers(scope=scope)
+        self.path: str = scope["path"]
+        self.method: str = scope["method"]
+        self.start_time = time.time()
+        self.request_id: Optional[str] = None
+        self.status_code = 500
+        self.response_started = False
+        self.error: Optional[str] = None
+        # 各 stage 自己的資料，例如 log capture 的 token
+        self.extras: Dict[str, Any] = {}
+
+    @property
+    def process_time(self) -> float:
+        return time.time() - self.start_time
+
+
+class Stage:
+    """
+    Pipeline 中的一個 stage，只需覆寫需要的 hook
+    on_request 回傳 Response 時直接回應，後面的 stage 與 app 都不會執行
+    """
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        return None
+
+    def on_request_body(self, ctx: RequestContext, body: bytes):
+        pass
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        pass
+
+    def on_response_body(self, ctx: RequestContext, body: bytes):
+        pass
+
+    async def on_complete(self, ctx: RequestContext):
+        pass
+
+
+def _overrides(stage: Stage, hook: str) -> bool:
+    return getattr(type(stage), hook) is not getattr(Stage, hook)
+
+
+class PipelineMiddleware:
+    """
+    把 request id、計時、驗證、紀錄等橫切邏輯合併成一個 pure ASGI middleware
+    每個請求只包一層 receive / send，不像 BaseHTTPMiddleware 每層都多一個 task 與 stream
+    stage 依序執行 on_request，回應時依反序執行 on_complete
+    """
+
+    def __init__(self, app: ASGIApp, stages: Sequence[Stage] = ()):
+        self.app = app
+        self.stages: List[Stage] = list(stages)
+        # 預先綁定 label，每個請求只需 observe
+        self._stage_histograms = [MIDDLEWARE_STAGE_DURATION.labels(stage=type(stage).__name__) for stage in self.stages]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope)
+        entered: List[Stage] = []
+        # 各 stage 在 on_request + on_complete 花費的時間
+        durations = [0.0] * len(self.stages)
+        # 只有覆寫 body hook 的 stage 才需要包 receive / 看 body
+        request_body_stages: List[Stage] = []
+        response_body_stages: List[Stage] = []
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                for stage in request_body_stages:
+                    stage.on_request_body(ctx, body)
+            return message
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                ctx.response_started = True
+                ctx.status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                for stage in entered:
+                    stage.on_response_start(ctx, headers)
+            elif message["type"] == "http.response.body" and response_body_stages:
+                body = message.get("body", b"")
+                for stage in response_body_stages:
+                    stage.on_response_body(ctx, body)
+            await send(message)
+
+        try:
+            response = None
+            for stage in self.stages:
+                entered.append(stage)
+                if _overrides(stage, "on_request_body"):
+                    request_body_stages.append(stage)
+                if _overrides(stage, "on_response_body"):
+                    response_body_stages.append(stage)
+                start = time.perf_counter()
+                response = await stage.on_request(ctx)
+                durations[len(entered) - 1] = time.perf_counter() - start
+                if response is not None:
+                    break
+
+            if response is not None:
+                await response(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive_wrapper if request_body_stages else receive, send_wrapper)
+        except Exception as e:
+            ctx.error = str(e)
+            logger.exception(f"[Pipeline] Exception during request {ctx.request_id}")
+            if ctx.response_started:
+                # header 已送出，無法再改成錯誤回應
+                await self._complete(ctx, entered, durations)
+                raise
+            # 例外內容只寫入紀錄 (ctx.error)，不回傳給 client
+            error_response = JSONResponse(
+                status_code=500,
+                content={"detail": "Internal Server Error"}
+            )
+            await error_response(scope, receive, send_wrapper)
+
+        await self._complete(ctx, entered, durations)
+
+    async def _complete(self, ctx: RequestContext, entered: List[Stage], durations: List[float]):
+        for index in range(len(entered) - 1, -1, -1):
+            stage = entered[index]
+            start = time.perf_counter()
+            try:
+                await stage.on_complete(ctx)
+            except Exception:
+                logger.exception(f"[Pipeline] {type(stage).__name__} failed to complete request {ctx.request_id}")
+            self._stage_histograms[index].observe(durations[index] + time.perf_counter() - start)
+
+
+class RequestIdStage(Stage):
+    """產生 request id，並加到回應的 X-Request-ID header"""
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        ctx.request_id = str(uuid.uuid4())
+        return None
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        headers["X-Request-ID"] = ctx.request_id
@@ -0,0 +1,285 @@
+import os
+import json
+import math
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+from starlette.responses import Response
+from fastapi.responses import JSONResponse
+from porygon_api.schemas import BaseResponse
+from porygon_api.middleware.pipeline import RequestContext, Stage
+
+logger = logging.getLogger(__name__)
+
+# 未設定 RATE_LIMIT_CONFIG 時的預設值；rate 為每秒請求數，burst 為 bucket 容量，concurrency 為同時處理中的請求數
+DEFAULT_LIMITS = {
+    "default": {
+        "key": {"rate": 1.0, "burst": 10, "concurrency": 2},
+        "role": {"rate": 10.0, "burst": 50, "concurrency": 16},
+    }
+}
+
+
+class InMemoryRateLimitBackend:
+    """單一 process 內的 token bucket 與並行計數"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._slots: Dict[str, int] = {}
+
+    async def take_token(self, bucket: str, rate: float, burst: float) -> float:
+        """
+        Returns:
+            0 表示取得 token，否則為需要等待的秒數
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(bucket, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[bucket] = (tokens - 1, now)
+            return 0.0
+        self._buckets[bucket] = (tokens, now)
+        return (1 - tokens) / rate
+
+    async def refund_token(self, bucket: str, burst: float):
+        """把 take_token 取得的 token 還回去 (同一個請求被其他限制擋下時)"""
+        if bucket in self._buckets:
+            tokens, updated_at = self._buckets[bucket]
+            self._buckets[bucket] = (min(burst, tokens + 1), updated_at)
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        current = self._slots.get(key, 0)
+        if current >= limit:
+            return False
+        self._slots[key] = current + 1
+        return True
+
+    async def release_slot(self, key: str):
+        current = self._slots.get(key, 0)
+        if current <= 1:
+            self._slots.pop(key, None)
+        else:
+            self._slots[key] = current - 1
+
+    async def close(self):
+        pass
+
+
+# KEYS[1]: bucket, ARGV: rate, burst, now；回傳需要等待的毫秒數
+_TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait_ms = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait_ms = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return wait_ms
+"""
+
+# KEYS[1]: bucket, ARGV: burst
+_REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + 1))
+end
+return 0
+"""
+
+# KEYS[1]: slots, ARGV: limit, ttl；只在 key 建立 (或沒有過期時間) 時設定過期時間，回傳 1 表示取得
+_ACQUIRE_SLOT_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 or redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if current > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return 0
+end
+return 1
+"""
+
+# KEYS[1]: slots, ARGV: ttl；key 已過期時不再遞減 (避免計數變成負數)，歸零時刪除
+_RELEASE_SLOT_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if not current then
+    return 0
+end
+if current <= 1 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+current = redis.call('DECR', KEYS[1])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return current
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    以 Redis 共用計數，多個 replica 的限制合併計算
+    token bucket 與並行計數都以 Lua script 原子更新；並行計數在建立時設定過期時間，
+    worker 異常結束時不會永久佔用，持續有請求時也不會延長
+    """
+
+    def __init__(self, url: str, prefix: str = "porygon:ratelimit", slot_ttl: int = None):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.slot_ttl = slot_ttl or int(os.getenv("RATE_LIMIT_SLOT_TTL_SECONDS", 600))
+        self._token_bucket = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._refund = self.client.register_script(_REFUND_SCRIPT)
+        self._acquire_slot = self.client.register_script(_ACQUIRE_SLOT_SCRIPT)
+        self._release_slot = self.client.register_script(_RELEASE_SLOT_SCRIPT)
+
+    async def take_token(self, bucket: str, rate: float, burst: float) -> float:
+        wait_ms = await self._token_bucket(keys=[f"{self.prefix}:bucket:{bucket}"], args=[rate, burst, time.time()])
+        return int(wait_ms) / 1000
+
+    async def refund_token(self, bucket: str, burst: float):
+        await self._refund(keys=[f"{self.prefix}:bucket:{bucket}"], args=[burst])
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        acquired = await self._acquire_slot(keys=[f"{self.prefix}:slots:{key}"], args=[limit, self.slot_ttl])
+        return int(acquired) == 1
+
+    async def release_slot(self, key: str):
+        await self._release_slot(keys=[f"{self.prefix}:slots:{key}"], args=[self.slot_ttl])
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _load_limits() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """RATE_LIMIT_CONFIG 為 JSON，格式同 DEFAULT_LIMITS，以角色名稱為 key，未列出的角色使用 default"""
+    raw = os.getenv("RATE_LIMIT_CONFIG")
+    if not raw:
+        return DEFAULT_LIMITS
+    limits = json.loads(raw)
+    limits.setdefault("default", DEFAULT_LIMITS["default"])
+    return limits
+
+
+def create_backend():
+    """設定 RATE_LIMIT_REDIS_URL 時使用 Redis，否則在 process 內計數"""
+    url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if url:
+        try:
+            return RedisRateLimitBackend(url)
+        except ImportError:
+            logger.warning("redis is not installed, falling back to in-process rate limits")
+    return InMemoryRateLimitBackend()
+
+
+class RateLimitStage(Stage):
+    """
+    PipelineMiddleware 的限流 stage，需放在 AuthStage 之後
+    對同一個 API key (以 key_hash 區分，同一個使用者的多把 key 各自計算) 與同一個角色分別限制每秒請求數 (token bucket) 與同時處理中的請求數，
+    超過時回 429 並帶 Retry-After；被擋下的請求已取得的 token 會退回，不佔用其他限制的額度
+    """
+
+    def __init__(self, path_prefixes: Tuple[str, ...] = None, limits: Dict[str, Any] = None, backend=None):
+        prefixes = os.getenv("RATE_LIMIT_PATH_PREFIXES", "/api/v1/porygon/AIservice")
+        self.path_prefixes = path_prefixes or tuple(prefix for prefix in prefixes.split(",") if prefix)
+        self.limits = limits or _load_limits()
+        self.backend = backend or create_backend()
+        self.allowed = 0
+        self.throttled_rate = 0
+        self.throttled_concurrency = 0
+        self.backend_errors = 0
+
+    def _limits_for(self, role: str) -> Dict[str, Dict[str, float]]:
+        return self.limits.get(role, self.limits["default"])
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        if not ctx.path.startswith(self.path_prefixes):
+            return None
+        user_info = ctx.scope.get("state", {}).get("user")
+        if user_info is None:
+            return None
+
+        role = user_info.get("role", "viewer")
+        limits = self._limits_for(role)
+        key_id = user_info.get("key_hash", user_info["user_id"])
+        scopes = [(f"key:{key_id}", limits.get("key")), (f"role:{role}", limits.get("role"))]
+        scopes = [(name, limit) for name, limit in scopes if limit]
+
+        acquired = []
+        taken = []
+        try:
+            for name, limit in scopes:
+                if "rate" in limit:
+                    burst = float(limit.get("burst", limit["rate"]))
+                    wait = await self.backend.take_token(name, float(limit["rate"]), burst)
+                    if wait > 0:
+                        await self._refund(taken)
+                        self.throttled_rate += 1
+                        return self._throttled(ctx, name, math.ceil(wait))
+                    taken.append((name, burst))
+
+            for name, limit in scopes:
+                if "concurrency" in limit:
+                    if not await self.backend.acquire_slot(name, int(limit["concurrency"])):
+                        for acquired_name in acquired:
+                            await self.backend.release_slot(acquired_name)
+                        await self._refund(taken)
+                        self.throttled_concurrency += 1
+                        return self._throttled(ctx, name, 1)
+                    acquired.append(name)
+        except Exception as e:
+            # 共用後端失效時不擋請求
+            self.backend_errors += 1
+            logger.error(f"Rate limit backend failed, allowing request: {str(e)}")
+            ctx.extras["rate_limit_slots"] = acquired
+            return None
+
+        ctx.extras["rate_limit_slots"] = acquired
+        self.allowed += 1
+        return None
+
+    async def _refund(self, taken):
+        for name, burst in taken:
+            await self.backend.refund_token(name, burst)
+
+    async def on_complete(self, ctx: RequestContext):
+        for name in ctx.extras.get("rate_limit_slots", ()):
+            try:
+                await self.backend.release_slot(name)
+            except Exception as e:
+                logger.error(f"Failed to release rate limit slot {name}: {str(e)}")
+
+    @staticmethod
+    def _throttled(ctx: RequestContext, name: str, retry_after: int) -> JSONResponse:
+        logger.warning(f"Rate limited {ctx.method} {ctx.path} for {name}, retry after {retry_after}s")
+        return JSONResponse(
+            status_code=429,
+            content=BaseResponse(
+                responseCode=429,
+                responseMessage="Too many requests. Please try again later.",
+                results=None
+            ).model_dump(),
+            headers={"Retry-After": str(max(1, retry_after))}
+        )
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "throttled_rate": self.throttled_rate,
+            "throttled_concurrency": self.throttled_concurrency,
+            "backend_errors": self.backend_errors,
+        }
@@ -1,17 +1,96 @@
 import os
+import re
+import gc
+import json
 import logging
 import time
 import mlflow
+from collections import OrderedDict
 from mlflow.tracking import MlflowClient
 import threading
+from porygon_api.inference.run_logger import RunRecord, run_logger
+from porygon_api.inference.artifact_cache import ArtifactCacheError, artifact_cache
+from porygon_api.monitoring.prometheus import MODEL_PREDICT_DURATION, set_model_load_state
 
 logger = logging.getLogger(__name__)
 
+# models:/<registered model name>@<alias>
+ALIAS_URI_PATTERN = re.compile(r"^models:/(?P<name>[^/@]+)@(?P<alias>[^/@]+)$")
+
+DEFAULT_MODEL_URI = "gs://wiwi-bucket/1/15a6b7e29ad34d3fa1484ee9e0621774/artifacts/porygon_chain"
+DEFAULT_MODEL_TAGS = {'Knowledge': 'Pokemon', 'Type': 'Wikipedia', 'Model': 'Grok-2-1212'}
+
+
+class UnknownModelError(KeyError):
+    """請求的模型名稱不在 MODEL_REGISTRY 中"""
+
+
+def _artifact_bytes(path: str) -> int:
+    """本地模型目錄的檔案總大小，不是本地路徑時返回 0"""
+    if path.startswith("file://"):
+        path = path[len("file://"):]
+    if not os.path.isdir(path):
+        return 0
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+    return total
+
+
+def _resident_bytes() -> int:
+    """目前 process 的常駐記憶體 (RSS)，無法取得時返回 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class ModelSlot:
+    """單一模型的設定與載入狀態"""
+
+    def __init__(self, name, uri, alias_uri=None, tags=None, pinned=False):
+        self.name = name
+        self.uri = uri
+        # 例如 models:/Porygon_wikipedia_agent@production，設定後以 alias 指向的版本為準
+        self.alias_uri = alias_uri
+        self.tags = tags or {}
+        self.run_name = f"porygon-{name.replace('_', '-')}"
+        # 預設模型不會被 LRU 淘汰
+        self.pinned = pinned
+        self.model = None
+        self.version = None
+        # not_loaded -> loading -> ready / failed，被淘汰後為 evicted
+        # 初始狀態不寫入 gauge: --preload 時在 master 建立，master 的 series 不會被清掉
+        self._load_state = "not_loaded"
+        self.load_error = None
+        self.failed_at = 0.0
+        self.memory_bytes = 0
+        # 從 artifact 快取載入時持有的 lease，模型被淘汰或換版後才釋放
+        self.artifact_lease = None
+        self.last_used = 0.0
+        # 同一個模型同時只有一個執行緒在載入或換版
+        self.lock = threading.Lock()
+
+    @property
+    def load_state(self) -> str:
+        return self._load_state
+
+    @load_state.setter
+    def load_state(self, state: str):
+        self._load_state = state
+        set_model_load_state(self.name, state)
+
 
 class ModelManager:
     """
     模型管理類，負責處理模型加載和管理
-    使用單例模式確保只有一個實例，避免重複加載模型
+    使用單例模式確保只有一個實例，避免重複加載模型；
+    以 MODEL_REGISTRY 設定多個模型，按需載入，超過記憶體預算時淘汰最久未使用的模型
     """
     _instance = None
     _lock = threading.Lock()
@@ -29,18 +108,139 @@ class ModelManager:
             return
         mlflow.langchain.autolog()
         logger.info("Initialize ModelManager.")
-        self.model = None
-        self.model_uri = os.getenv("MODEL_URI", "gs://wiwi-bucket/1/15a6b7e29ad34d3fa1484ee9e0621774/artifacts/porygon_chain")
         self.mlflow_tracking_uri = os.getenv("MLFLOW_TRACKING_URI")
         self.mlflow_registry_uri = os.getenv("MLFLOW_REGISTRY_URI")
+        self.experiment_id = None
+        self.watch_interval = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", 60))
+        self.warmup_query = os.getenv("MODEL_WARMUP_QUERY", "Hello")
+        self._swap_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.max_load_retries = int(os.getenv("MODEL_LOAD_MAX_RETRIES", 5))
+        self.load_backoff = float(os.getenv("MODEL_LOAD_BACKOFF_SECONDS", 2))
+        # 按需載入失敗後，這段時間內的請求不再重試載入
+        self.load_failure_cooldown = float(os.getenv("MODEL_LOAD_FAILURE_COOLDOWN_SECONDS", 60))
+        self._loader = None
+
+        # 0 表示不限制
+        self.memory_budget = int(os.getenv("MODEL_MEMORY_BUDGET_BYTES", 0))
+        # 模型記憶體以 artifact 大小乘上這個倍數估算，取不到 artifact 大小時才用 RSS 差值
+        self.memory_per_artifact_byte = float(os.getenv("MODEL_MEMORY_ARTIFACT_FACTOR", 1.0))
+        self._resident = OrderedDict()
+        self._residency_lock = threading.Lock()
+        self.default_model_name, self.slots = self._load_registry_config()
+        logger.info(f"Registered models: {list(self.slots)}, default: {self.default_model_name}")
+
+        self._initialized = True
+
+    @staticmethod
+    def _load_registry_config():
+        """
+        讀取 MODEL_REGISTRY (JSON)，格式:
+            {"<name>": "<model uri>"} 或 {"<name>": {"uri": ..., "alias_uri": ..., "tags": {...}}}
+        未設定時只註冊 DEFAULT_MODEL_NAME，使用 MODEL_URI / MODEL_ALIAS_URI
+        """
+        default_name = os.getenv("DEFAULT_MODEL_NAME", "wikipedia_agent")
+        raw = os.getenv("MODEL_REGISTRY")
+        if raw:
+            config = json.loads(raw)
+        else:
+            config = {
+                default_name: {
+                    "uri": os.getenv("MODEL_URI", DEFAULT_MODEL_URI),
+                    "alias_uri": os.getenv("MODEL_ALIAS_URI"),
+                    "tags": DEFAULT_MODEL_TAGS,
+                }
+            }
+        if default_name not in config:
+            default_name = next(iter(config))
+
+        slots = {}
+        for name, entry in config.items():
+            if isinstance(entry, str):
+                entry = {"uri": entry}
+            slots[name] = ModelSlot(
+                name=name,
+                uri=entry.get("uri"),
+                alias_uri=entry.get("alias_uri"),
+                tags=entry.get("tags"),
+                pinned=name == default_name,
+            )
+        return default_name, slots
+
+    def get_slot(self, model_name=None) -> ModelSlot:
+        """
+        Raises:
+            UnknownModelError: 模型名稱未註冊
+        """
+        name = model_name or self.default_model_name
+        slot = self.slots.get(name)
+        if slot is None:
+            raise UnknownModelError(name)
+        return slot
+
+    # 以下屬性對應預設模型，維持單一模型時的介面
+    @property
+    def model(self):
+        return self.slots[self.default_model_name].model
+
+    @property
+    def model_uri(self):
+        return self.slots[self.default_model_name].uri
+
+    @property
+    def model_version(self):
+        return self.slots[self.default_model_name].version
 
-        # 配置 MLflow
+    @property
+    def model_alias_uri(self):
+        return self.slots[self.default_model_name].alias_uri
+
+    @property
+    def load_state(self):
+        return self.slots[self.default_model_name].load_state
+
+    @property
+    def load_error(self):
+        return self.slots[self.default_model_name].load_error
+
+    def start_loading(self):
+        """
+        在背景執行緒設置 MLflow 並載入預設模型，不阻塞 import 與 uvicorn 接受連線
+        其他模型在第一次請求時才載入；需在每個 worker 啟動後呼叫
+        """
+        with self._lock:
+            if self._loader is not None and self._loader.is_alive():
+                return
+            self.slots[self.default_model_name].load_state = "loading"
+            self._loader = threading.Thread(target=self._load_with_retry, name="model-loader", daemon=True)
+            self._loader.start()
+
+    def _load_with_retry(self):
+        """載入失敗時以指數退避重試，成功後啟動 alias watcher"""
         self._setup_mlflow()
+        slot = self.slots[self.default_model_name]
 
-        # 預加載模型
-        self._preload_model()
+        for attempt in range(1, self.max_load_retries + 1):
+            try:
+                with slot.lock:
+                    self._load_slot(slot)
+                logger.info("Model is loaded successfully! AI server is ready!")
+                self.start_alias_watcher()
+                return
+            except Exception:
+                if attempt == self.max_load_retries:
+                    break
+                slot.load_state = "loading"
+                delay = min(60.0, self.load_backoff * 2 ** (attempt - 1))
+                logger.warning(f"Model load attempt {attempt}/{self.max_load_retries} fail, retry in {delay:.0f} 秒")
+                time.sleep(delay)
 
-        self._initialized = True
+        logger.error(f"Model loading failed after {self.max_load_retries} attempts. AI server could not work.")
+
+    def is_ready(self) -> bool:
+        slot = self.slots[self.default_model_name]
+        return slot.load_state == "ready" and slot.model is not None
 
     def _setup_mlflow(self):
         """設置 MLflow 配置"""
@@ -55,8 +255,12 @@ class ModelManager:
             EXPERIMENT_NAME = "AI_Service_Experiment"
             experiment_info = mlflow.get_experiment_by_name(EXPERIMENT_NAME)
             mlflow.set_experiment(experiment_id=experiment_info.experiment_id)
+            self.experiment_id = experiment_info.experiment_id
             logger.info(f"Setting MLflow Experiment name: {EXPERIMENT_NAME}")
 
+            # 預測紀錄改由背景執行緒批次寫入，不再佔用預測延遲
+            run_logger.start(self.experiment_id)
+
             client = MlflowClient()
             try:
                 # 嘗試連接 MLflow 服務
@@ -67,63 +271,337 @@ class ModelManager:
         except Exception as e:
             logger.error(f"Setting MLflow Config Error: {str(e)}")
 
-    def _preload_model(self):
-        """預加載模型"""
-        if not self.model_uri:
-            logger.error("Enviroment MODEL_URI NOT SET.")
-            return
+    def _resolve_alias(self, slot: ModelSlot):
+        """
+        查詢 alias 目前指向的版本
+        Returns:
+            (version, model_uri)，沒有設定 alias 時返回 None
+        """
+        if not slot.alias_uri:
+            return None
+
+        match = ALIAS_URI_PATTERN.match(slot.alias_uri)
+        if match is None:
+            logger.error(f"Invalid alias uri for {slot.name}: {slot.alias_uri}")
+            return None
+
+        name, alias = match.group("name"), match.group("alias")
+        model_version = MlflowClient().get_model_version_by_alias(name, alias)
+        return model_version.version, f"models:/{name}/{model_version.version}"
+
+    def _load_model_from(self, model_uri):
+        """
+        有設定 ARTIFACT_CACHE_DIR 時從本地 artifact 快取載入，digest 沒變就不必重新下載；
+        快取不可用時直接從來源載入
+        Returns:
+            (model, 估計的記憶體大小, artifact lease 或 None)
+        """
+        resident_before = _resident_bytes()
+        lease = None
+        if artifact_cache.enabled:
+            try:
+                lease = artifact_cache.acquire(model_uri)
+            except ArtifactCacheError as e:
+                logger.warning(f"{str(e)}, loading from source directly")
+        if lease is not None:
+            try:
+                model = mlflow.pyfunc.load_model(lease.path)
+            except BaseException:
+                lease.release()
+                raise
+            artifact_bytes = lease.total_bytes
+        else:
+            model = mlflow.pyfunc.load_model(model_uri)
+            artifact_bytes = _artifact_bytes(model_uri)
+
+        # RSS 差值會受其他執行緒與 allocator 影響，只在沒有 artifact 大小時使用
+        if artifact_bytes:
+            return model, int(artifact_bytes * self.memory_per_artifact_byte), lease
+        return model, max(0, _resident_bytes() - resident_before), lease
+
+    def _load_slot(self, slot: ModelSlot):
+        """載入模型並記錄估計的記憶體大小，失敗時拋出例外；呼叫端需持有 slot.lock"""
+        if slot.alias_uri:
+            try:
+                slot.version, slot.uri = self._resolve_alias(slot)
+            except Exception as e:
+                logger.warning(f"Resolve model alias fail, fallback to {slot.uri}: {str(e)}")
 
         try:
-            start_time = time.time()
-            logger.info(f"Preloading Model...: {self.model_uri}")
+            if not slot.uri:
+                raise RuntimeError(f"Model uri of {slot.name} NOT SET.")
 
+            slot.load_state = "loading"
+            start_time = time.time()
+            logger.info(f"Preloading Model {slot.name}...: {slot.uri}")
             # Load model from MLflow
-            self.model = mlflow.pyfunc.load_model(self.model_uri)
+            model, slot.memory_bytes, lease = self._load_model_from(slot.uri)
+
+            with self._swap_lock:
+                slot.model = model
+                old_lease, slot.artifact_lease = slot.artifact_lease, lease
+            if old_lease is not None:
+                old_lease.release()
+            slot.load_state = "ready"
+            slot.load_error = None
 
             elapsed_time = time.time() - start_time
-            logger.info(f"Model Preloaded successfully, duration: {elapsed_time:.2f} 秒")
+            logger.info(
+                f"Model {slot.name} Preloaded successfully, duration: {elapsed_time:.2f} 秒, "
+                f"memory: {slot.memory_bytes / 1024 ** 2:.0f} MiB"
+            )
         except Exception as e:
-            logger.error(f"Model Preloaded fail: {str(e)}")
+            slot.load_state = "failed"
+            slot.load_error = str(e)
+            slot.failed_at = time.time()
+            logger.error(f"Model {slot.name} Preloaded fail: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
+            raise
 
-    def get_model(self):
+        self._touch(slot)
+        self._enforce_memory_budget(keep=slot.name)
+
+    def _ensure_loaded(self, slot: ModelSlot):
+        """
+        按需載入模型 (在推論執行緒中呼叫)
+        載入失敗後在退避時間內不再重試，避免每個請求都重新下載
+        """
+        if slot.model is not None:
+            return slot.model
+
+        with slot.lock:
+            if slot.model is not None:
+                return slot.model
+            if slot.load_state == "loading":
+                # 預設模型的背景載入尚未完成
+                return None
+            if slot.load_state == "failed" and time.time() - slot.failed_at < self.load_failure_cooldown:
+                return None
+            try:
+                self._load_slot(slot)
+            except Exception:
+                return None
+            return slot.model
+
+    def _touch(self, slot: ModelSlot):
+        slot.last_used = time.time()
+        with self._residency_lock:
+            self._resident[slot.name] = None
+            self._resident.move_to_end(slot.name)
+
+    def _enforce_memory_budget(self, keep=None):
+        """常駐記憶體總和超過預算時，依 LRU 順序淘汰模型 (不淘汰 keep 與預設模型)"""
+        if not self.memory_budget:
+            return
+
+        evicted = []
+        with self._residency_lock:
+            total = sum(self.slots[name].memory_bytes for name in self._resident)
+            for name in list(self._resident):
+                if total <= self.memory_budget:
+                    break
+                slot = self.slots[name]
+                if name == keep or slot.pinned:
+                    continue
+                del self._resident[name]
+                total -= slot.memory_bytes
+                with self._swap_lock:
+                    # 進行中的請求仍持有舊的參考，完成後才會被回收
+                    slot.model = None
+                    lease, slot.artifact_lease = slot.artifact_lease, None
+                if lease is not None:
+                    # 之後 artifact 快取才能淘汰這個版本
+                    lease.release()
+                slot.load_state = "evicted"
+                evicted.append(name)
+
+        if evicted:
+            gc.collect()
+            logger.info(f"Evicted models {evicted} to stay within memory budget {self.memory_budget} bytes")
+
+    def get_model(self, model_name=None):
         """
         獲取模型實例
-        如果模型沒有成功加載，返回 None
+        模型尚未載入完成時返回 None，不會在請求中觸發載入
         """
-        if self.model is None:
-            logger.warning("Model preloaded fail, retrying.")
-            self._preload_model()
+        return self.get_slot(model_name).model
+
+    def get_model_uri(self, model_name=None):
+        return self.get_slot(model_name).uri
 
-        return self.model
+    def _snapshot(self, slot: ModelSlot):
+        """一次取得 (model, model_uri)，避免讀到換版中途的組合"""
+        with self._swap_lock:
+            return slot.model, slot.uri
 
-    def predict(self, data):
+    def start_alias_watcher(self):
         """
-        使用模型進行預測
-        Args:
-            data: 模型輸入數據
+        啟動背景執行緒輪詢各模型的 alias
+        需在每個 worker 啟動後呼叫 (gunicorn --preload fork 後 master 的執行緒不會保留)
+        """
+        if not any(slot.alias_uri for slot in self.slots.values()):
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch_alias, name="model-alias-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching model aliases every {self.watch_interval:.0f} 秒")
+
+    def stop_alias_watcher(self):
+        self._stop_watching.set()
+
+    def _watch_alias(self):
+        while not self._stop_watching.wait(self.watch_interval):
+            self._check_aliases()
+
+    def _check_aliases(self):
+        """輪詢一次各模型的 alias，版本改變時換版"""
+        for slot in list(self.slots.values()):
+            # 未載入的模型下次載入時會直接解析 alias
+            if not slot.alias_uri or slot.model is None:
+                continue
+            try:
+                version, model_uri = self._resolve_alias(slot)
+                if version != slot.version:
+                    with slot.lock:
+                        self._hot_swap(slot, version, model_uri)
+            except Exception as e:
+                logger.warning(f"Model alias watch fail for {slot.name}: {str(e)}")
+
+    def _hot_swap(self, slot: ModelSlot, version, model_uri):
+        """
+        在背景載入新版本並以 warmup 驗證後原子性地切換
+        進行中的請求已持有舊的 model 參考，會在舊版本上完成
+        """
+        logger.info(f"Model alias of {slot.name} changed: version {slot.version} -> {version}, loading {model_uri}")
+        start_time = time.time()
+        new_model, memory_bytes, lease = self._load_model_from(model_uri)
+
+        try:
+            # warmup 失敗時保留舊版本，等下一次輪詢再試
+            new_model.predict([{"input": self.warmup_query}])
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            raise
+
+        with self._swap_lock:
+            slot.model, slot.uri, slot.version = new_model, model_uri, version
+            old_lease, slot.artifact_lease = slot.artifact_lease, lease
+        # 進行中的請求在舊版本上可能還會讀取檔案，這裡只是讓快取之後可以淘汰舊版本
+        if old_lease is not None:
+            old_lease.release()
+        slot.memory_bytes = memory_bytes
+        self._touch(slot)
+        self._enforce_memory_budget(keep=slot.name)
+
+        elapsed_time = time.time() - start_time
+        logger.info(f"Model {slot.name} swapped to version {version}, duration: {elapsed_time:.2f} 秒")
+
+    def stats(self):
+        """各模型的載入狀態與估計的記憶體大小"""
+        with self._residency_lock:
+            resident = list(self._resident)
+        return {
+            "default_model": self.default_model_name,
+            "memory_budget_bytes": self.memory_budget,
+            "resident_bytes": sum(self.slots[name].memory_bytes for name in resident),
+            "models": {
+                name: {
+                    "uri": slot.uri,
+                    "version": slot.version,
+                    "load_state": slot.load_state,
+                    "memory_bytes": slot.memory_bytes,
+                    "last_used": slot.last_used,
+                }
+                for name, slot in self.slots.items()
+            },
+        }
+
+    def _acquire(self, model_name):
+        """
+        按需載入並取得模型快照
         Returns:
-            預測結果，如果模型未加載則返回 None
+            (slot, model, model_uri)，模型無法使用時 model 為 None
         """
-        model = self.get_model()
+        slot = self.get_slot(model_name)
+        if self._ensure_loaded(slot) is None:
+            logger.error(f"模型 {slot.name} 未加載，無法進行預測")
+            return slot, None, None
+        model, model_uri = self._snapshot(slot)
         if model is None:
-            logger.error("模型未加載，無法進行預測")
-            return None
+            logger.error(f"模型 {slot.name} 已被淘汰，無法進行預測")
+            return slot, None, None
+        self._touch(slot)
+        return slot, model, model_uri
 
+    def _run_tracked(self, slot: ModelSlot, model_uri, batch_size, fn, data):
+        """執行預測並把 run 紀錄交給背景的 run_logger"""
+        record = RunRecord(
+            run_name=slot.run_name,
+            tags=slot.tags,
+            params={"model_name": slot.name, "model_uri": model_uri, "batch_size": batch_size},
+        )
+        start_time = time.perf_counter()
         try:
             logger.info(f"Model Predict, Input data: {data}")
-            tags = {'Knowledge': 'Pokemon', 'Type': 'Wikipedia', 'Model': 'Grok-2-1212'}
-            with mlflow.start_run(run_name="porygon-wikipedia-agent", tags=tags):
-                mlflow.log_param("model_uri", self.model_uri)
-                result = model.predict(data)
-                logger.info(f"Predict completed, result: {result}")
-                return result
+            result = fn(data)
+            logger.info(f"Predict completed, result: {result}")
+            return result
         except Exception as e:
+            record.status = "FAILED"
             logger.error(f"Prediction error: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return None
+        finally:
+            elapsed = time.perf_counter() - start_time
+            record.end_time = int(time.time() * 1000)
+            record.metrics["latency_ms"] = elapsed * 1000
+            MODEL_PREDICT_DURATION.labels(model=slot.name, status=record.status).observe(elapsed)
+            run_logger.log_run(record)
+
+    def predict(self, data, model_name=None):
+        """
+        使用模型進行預測
+        Args:
+            data: 模型輸入數據
+            model_name: MODEL_REGISTRY 中的模型名稱，預設為 DEFAULT_MODEL_NAME
+        Returns:
+            預測結果，如果模型未加載則返回 None
+        """
+        slot, model, model_uri = self._acquire(model_name)
+        if model is None:
+            return None
+        return self._run_tracked(slot, model_uri, len(data), model.predict, data)
+
+    def stream_predict(self, model_input, callbacks, model_name=None):
+        """
+        以 LangChain callbacks 執行單筆預測，讓 agent 的中間步驟與 token 可以即時串流
+        模型不是 LangChain flavor 時退回一般的 predict
+        Args:
+            model_input: 單筆模型輸入，例如 {"input": "..."}
+            callbacks: LangChain callback handlers
+            model_name: MODEL_REGISTRY 中的模型名稱，預設為 DEFAULT_MODEL_NAME
+        Returns:
+            最終答案，如果模型未加載或預測失敗則返回 None
+        """
+        slot, model, model_uri = self._acquire(model_name)
+        if model is None:
+            return None
+
+        def _invoke(item):
+            try:
+                lc_model = model.get_raw_model()
+            except NotImplementedError:
+                return model.predict([item])[0]
+            result = lc_model.invoke(item, config={"callbacks": callbacks})
+            return result.get("output") if isinstance(result, dict) else result
+
+        return self._run_tracked(slot, model_uri, 1, _invoke, model_input)
 
 
 model_manager = ModelManager()
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# stop() 放入 queue 喚醒背景執行緒，不必等到 flush_interval 結束
+_WAKEUP = None
+
+
+class BigQueryLogShipper:
+    """
+    背景批次寫入 BigQuery 的 log shipper
+    請求只把 row 放進記憶體中的有界 queue，由背景執行緒計算大小並依筆數、大小或時間間隔批次 insert_rows_json；
+    queue 滿時丟棄新的 row 並計數，不阻塞請求
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        table_id: str,
+        max_queue: int = None,
+        batch_rows: int = None,
+        batch_bytes: int = None,
+        flush_interval: float = None,
+        max_retries: int = None,
+    ):
+        self.client = client
+        self.table_id = table_id
+        self.max_queue = max_queue or int(os.getenv("BQ_LOG_MAX_QUEUE", 10000))
+        self.batch_rows = batch_rows or int(os.getenv("BQ_LOG_BATCH_ROWS", 500))
+        # BigQuery streaming insert 單次上限為 10 MB
+        self.batch_bytes = batch_bytes or int(os.getenv("BQ_LOG_BATCH_BYTES", 5 * 1024 * 1024))
+        self.flush_interval = flush_interval or float(os.getenv("BQ_LOG_FLUSH_INTERVAL_SECONDS", 2))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("BQ_LOG_MAX_RETRIES", 2))
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=self.max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.shipped = 0
+        self.dropped = 0
+        self.failed_rows = 0
+        self.flushes = 0
+
+    def _ensure_started(self):
+        """第一次 enqueue 時才啟動背景執行緒 (gunicorn fork 後每個 worker 各自一個)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="bq-log-shipper", daemon=True)
+            self._thread.start()
+            logger.info(f"[BigQuery] Log shipper started for {self.table_id}")
+
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """
+        放入 queue 後立即返回
+        Returns:
+            False 表示 queue 已滿，row 被丟棄
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"[BigQuery] Log queue is full, dropped {self.dropped} rows so far")
+            return False
+
+    def _next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """湊滿筆數或大小上限，或等到時間間隔結束"""
+        deadline = time.monotonic() + timeout
+        batch, batch_size = [], 0
+        while len(batch) < self.batch_rows and batch_size < self.batch_bytes:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    row = self._queue.get(timeout=remaining)
+                else:
+                    row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is _WAKEUP:
+                break
+            batch.append(row)
+            # 在背景執行緒序列化估算大小，不佔用請求時間
+            batch_size += len(json.dumps(row, default=str))
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self._ship(batch)
+
+    def _ship(self, batch: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                errors = self.client.insert_rows_json(self.table_id, batch)
+                self.flushes += 1
+                if errors:
+                    self.failed_rows += len(errors)
+                    logger.error(f"[BigQuery] Insert errors for {len(errors)}/{len(batch)} rows: {errors[:3]}")
+                self.shipped += len(batch) - len(errors or [])
+                return
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.failed_rows += len(batch)
+                    logger.error(f"[BigQuery] Failed to insert {len(batch)} rows: {str(e)}")
+                    return
+                delay = min(30.0, 0.5 * 2 ** attempt)
+                logger.warning(f"[BigQuery] Insert failed, retry in {delay:.1f} 秒: {str(e)}")
+                self._stop.wait(delay)
+
+    def flush(self, timeout: float = 5.0):
+        """關閉服務前把 queue 中剩下的 row 寫出"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            batch = self._next_batch(0)
+            if batch:
+                self._ship(batch)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self._queue.put_nowait(_WAKEUP)
+        except queue.Full:
+            # queue 已滿表示背景執行緒不會在等待 row
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "shipped": self.shipped,
+            "dropped": self.dropped,
+            "failed_rows": self.failed_rows,
+            "flushes": self.flushes,
+        }
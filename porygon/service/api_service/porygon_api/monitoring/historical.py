@@ -0,0 +1,55 @@
+import os
+import datetime
+import logging
+from typing import Any, Dict
+
+from google.cloud import bigquery
+
+from porygon_api.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DAILY_METRICS_QUERY = """
+    SELECT
+        COUNT(*) as total_requests,
+        AVG(latency_ms) as average_latency_ms,
+        SAFE_DIVIDE(COUNTIF(status_code >= 400), COUNT(*)) as error_rate
+    FROM `{table_id}`
+    WHERE DATE(create_time) = @date
+"""
+
+# 過去的日期不會再變動，快取較久；當天的資料仍在寫入
+_metrics_cache = TTLCache(maxsize=400, ttl=float(os.getenv("METRIC_HISTORY_CACHE_TTL_SECONDS", 24 * 3600)))
+TODAY_CACHE_TTL_SECONDS = float(os.getenv("METRIC_TODAY_CACHE_TTL_SECONDS", 60))
+
+
+def query_daily_metrics(client: bigquery.Client, table_id: str, date: datetime.date) -> Dict[str, Any]:
+    """
+    從 BigQuery 查詢某一天的請求統計，日期以 query parameter 傳入
+    會阻塞，請在 threadpool 中呼叫
+    """
+    cached = _metrics_cache.get(date)
+    if cached is not None:
+        return cached
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("date", "DATE", date)]
+    )
+    results = client.query(DAILY_METRICS_QUERY.format(table_id=table_id), job_config=job_config).result()
+
+    metrics = {"total_requests": 0, "average_latency_ms": 0, "error_rate": 0}
+    for row in results:
+        metrics = {
+            "total_requests": row.total_requests,
+            "average_latency_ms": row.average_latency_ms or 0,
+            "error_rate": row.error_rate or 0,
+        }
+        break
+
+    ttl = TODAY_CACHE_TTL_SECONDS if date >= datetime.date.today() else None
+    _metrics_cache.set(date, metrics, ttl=ttl)
+    return metrics
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _metrics_cache.stats()
@@ -0,0 +1,127 @@
+import os
+import sys
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+# 每個請求保留的 log 長度上限
+LOG_CAPTURE_MAX_CHARS = int(os.getenv("LOG_CAPTURE_MAX_CHARS", 8000))
+LOG_CAPTURE_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+
+class RequestLogCapture:
+    """單一請求的 log 緩衝區，第一次寫入時才配置，超過上限後只計數"""
+
+    def __init__(self, request_id: str, limit: int = LOG_CAPTURE_MAX_CHARS):
+        self.request_id = request_id
+        self.limit = limit
+        self.size = 0
+        self.dropped_chars = 0
+        self._parts: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+    def write(self, text: str):
+        if not text:
+            return
+        # 推論執行緒透過 copy_context 也會寫進同一個請求
+        with self._lock:
+            remaining = self.limit - self.size
+            if remaining <= 0:
+                self.dropped_chars += len(text)
+                return
+            if self._parts is None:
+                self._parts = []
+            self._parts.append(text[:remaining])
+            self.size += min(len(text), remaining)
+            self.dropped_chars += max(0, len(text) - remaining)
+
+    def getvalue(self) -> str:
+        if self._parts is None:
+            return ""
+        with self._lock:
+            return "".join(self._parts)
+
+
+_current_capture: ContextVar[Optional[RequestLogCapture]] = ContextVar("request_log_capture", default=None)
+
+
+def current_capture() -> Optional[RequestLogCapture]:
+    return _current_capture.get()
+
+
+def start_capture(request_id: str) -> Tuple[RequestLogCapture, Token]:
+    """在目前的 context 中開始收集 log 與 print，asyncio task 與 copy_context 的執行緒都會繼承"""
+    capture = RequestLogCapture(request_id)
+    return capture, _current_capture.set(capture)
+
+
+def stop_capture(token: Token):
+    _current_capture.reset(token)
+
+
+@contextmanager
+def capture_request_logs(request_id: str) -> Iterator[RequestLogCapture]:
+    capture, token = start_capture(request_id)
+    try:
+        yield capture
+    finally:
+        stop_capture(token)
+
+
+class ContextLogHandler(logging.Handler):
+    """把 log record 寫到目前請求的緩衝區，不在請求中時直接略過"""
+
+    def __init__(self, level: int = logging.INFO):
+        super().__init__(level)
+        self.setFormatter(logging.Formatter(LOG_CAPTURE_FORMAT))
+
+    def emit(self, record: logging.LogRecord):
+        capture = _current_capture.get()
+        if capture is None:
+            return
+        try:
+            capture.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+class ContextStreamProxy:
+    """
+    取代 sys.stdout / sys.stderr 的代理
+    輸出照常寫到原本的 stream (Cloud Logging 仍收得到)，同時複製一份到目前請求的緩衝區
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        capture = _current_capture.get()
+        if capture is not None:
+            capture.write(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+_installed = False
+
+
+def install():
+    """安裝 stdout / stderr 代理與 root logger handler，重複呼叫不會重複安裝"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        if not isinstance(sys.stdout, ContextStreamProxy):
+            sys.stdout = ContextStreamProxy(sys.stdout)
+        if not isinstance(sys.stderr, ContextStreamProxy):
+            sys.stderr = ContextStreamProxy(sys.stderr)
+        logging.getLogger().addHandler(ContextLogHandler())
+        _installed = True
@@ -0,0 +1,123 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# 請求、模型與資料庫的延遲分桶，秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# middleware stage 的開銷通常在微秒等級
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+# 取得連線的等待時間，大部分應在 1ms 內，接近 pool_timeout 代表 pool 不夠大
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+# 連線被取出時已存在的秒數，受 pool_recycle 限制
+CONNECTION_AGE_BUCKETS = (1, 10, 60, 300, 600, 1200, 1800, 3600)
+
+MODEL_LOAD_STATES = ("not_loaded", "loading", "ready", "failed", "evicted")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "porygon_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "porygon_http_requests_in_flight",
+    "HTTP requests currently being processed",
+    multiprocess_mode="livesum",
+)
+MIDDLEWARE_STAGE_DURATION = Histogram(
+    "porygon_middleware_stage_duration_seconds",
+    "Time spent in each PipelineMiddleware stage (on_request + on_complete)",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+MODEL_PREDICT_DURATION = Histogram(
+    "porygon_model_predict_duration_seconds",
+    "ModelManager.predict latency",
+    ["model", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_LOAD_STATE = Gauge(
+    "porygon_model_load_state",
+    "1 for the current load state of each model",
+    ["model", "state"],
+    multiprocess_mode="liveall",
+)
+DB_OPERATION_DURATION = Histogram(
+    "porygon_db_operation_duration_seconds",
+    "Cloud SQL and Firestore call latency",
+    ["backend", "operation", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "porygon_db_pool_checked_out",
+    "Cloud SQL connections currently checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "porygon_db_pool_overflow",
+    "Checked out Cloud SQL connections beyond pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "porygon_db_pool_wait_seconds",
+    "Time to get a Cloud SQL connection from the pool, including opening a new one",
+    ["pool"],
+    buckets=POOL_WAIT_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "porygon_db_pool_timeouts",
+    "Cloud SQL pool checkouts that gave up after pool_timeout",
+    ["pool"],
+)
+DB_CONNECTION_AGE = Histogram(
+    "porygon_db_connection_age_seconds",
+    "Age of Cloud SQL connections when checked out",
+    ["pool"],
+    buckets=CONNECTION_AGE_BUCKETS,
+)
+
+
+def set_model_load_state(model: str, state: str):
+    for known_state in MODEL_LOAD_STATES:
+        MODEL_LOAD_STATE.labels(model=model, state=known_state).set(1 if known_state == state else 0)
+
+
+@contextmanager
+def observe_db(backend: str, operation: str) -> Iterator[None]:
+    """記錄一次資料庫呼叫的延遲，發生例外時 status 為 error"""
+    start_time = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "success"
+    finally:
+        DB_OPERATION_DURATION.labels(backend=backend, operation=operation, status=status).observe(
+            time.perf_counter() - start_time
+        )
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    產生 text exposition 格式
+    gunicorn 多 worker 時設定 PROMETHEUS_MULTIPROC_DIR，合併所有 worker 的數值
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,265 @@
+import os
+import glob
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_FILE_PREFIX = "rolling_metrics_"
+
+
+class LatencySketch:
+    """
+    對數分桶的延遲 sketch (與 HDR histogram / DDSketch 相同做法)
+    每個桶的上下界比例固定，分位數的相對誤差不超過 relative_accuracy；
+    桶以 dict 稀疏儲存，可以相加也可以相減 (滑動視窗移除過期的時間片)
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(max(value, 1e-3)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "LatencySketch", sign: int = 1):
+        for index, count in other.buckets.items():
+            merged = self.buckets.get(index, 0) + sign * count
+            if merged:
+                self.buckets[index] = merged
+            else:
+                self.buckets.pop(index, None)
+        self.count += sign * other.count
+        self.sum += sign * other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # 桶的代表值，與桶內任一值的相對誤差不超過 relative_accuracy
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class _RouteStats:
+    __slots__ = ("count", "errors", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = LatencySketch()
+
+    def merge(self, other: "_RouteStats", sign: int = 1):
+        self.count += sign * other.count
+        self.errors += sign * other.errors
+        self.latency.merge(other.latency, sign)
+
+    def encode(self) -> list:
+        return [self.count, self.errors, self.latency.sum, self.latency.buckets]
+
+    @classmethod
+    def decode(cls, data: list) -> "_RouteStats":
+        stats = cls()
+        stats.count, stats.errors, stats.latency.sum, buckets = data
+        # JSON 的 key 只能是字串
+        stats.latency.buckets = {int(index): count for index, count in buckets.items()}
+        stats.latency.count = stats.count
+        return stats
+
+
+class RollingMetrics:
+    """
+    依 route 統計最近 window_seconds 的請求數、錯誤率與延遲分位數
+    視窗切成 slot_seconds 的時間片，另外維護整個視窗的累計值，時間片過期時從累計值扣除，
+    查詢時不需要重新加總
+    設定 shared_dir 時，每個 worker 每 flush_interval 秒把自己的時間片寫到該目錄，
+    查詢時合併所有 worker (其他 worker 的資料最多延遲 flush_interval 秒)；未設定時只統計目前的 worker
+    """
+
+    def __init__(
+        self,
+        window_seconds: int = None,
+        slot_seconds: int = None,
+        shared_dir: str = None,
+        flush_interval: float = None,
+    ):
+        self.window_seconds = window_seconds or int(os.getenv("METRICS_WINDOW_SECONDS", 24 * 3600))
+        self.slot_seconds = slot_seconds or int(os.getenv("METRICS_SLOT_SECONDS", 300))
+        self.max_slots = max(1, self.window_seconds // self.slot_seconds)
+        self.shared_dir = shared_dir if shared_dir is not None else os.getenv(
+            "METRICS_SHARED_DIR", os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        )
+        self.flush_interval = flush_interval or float(os.getenv("METRICS_SHARED_FLUSH_SECONDS", 5))
+        self._slots: Deque[Tuple[int, Dict[str, _RouteStats]]] = deque()
+        self._totals: Dict[str, _RouteStats] = {}
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid = None
+        self._dirty = False
+        self.started_at = time.time()
+        self._created_pid = os.getpid()
+
+    def _rotate(self, slot_id: int):
+        while self._slots and self._slots[0][0] <= slot_id - self.max_slots:
+            _, expired = self._slots.popleft()
+            for route, stats in expired.items():
+                total = self._totals[route]
+                total.merge(stats, sign=-1)
+                if total.count == 0:
+                    del self._totals[route]
+        if not self._slots or self._slots[-1][0] != slot_id:
+            self._slots.append((slot_id, {}))
+
+    def record(self, route: str, status_code: int, latency_ms: float):
+        slot_id = int(time.time() // self.slot_seconds)
+        if self.shared_dir:
+            self._ensure_writer()
+        with self._lock:
+            self._dirty = True
+            self._rotate(slot_id)
+            slot = self._slots[-1][1]
+            for stats in (slot.setdefault(route, _RouteStats()), self._totals.setdefault(route, _RouteStats())):
+                stats.count += 1
+                if status_code >= 400:
+                    stats.errors += 1
+                stats.latency.add(latency_ms)
+
+    @staticmethod
+    def _summary(stats: _RouteStats) -> Dict[str, Any]:
+        count = stats.count
+        return {
+            "total_requests": count,
+            "average_latency_ms": stats.latency.sum / count if count else 0,
+            "error_rate": stats.errors / count if count else 0,
+            "p50_latency_ms": stats.latency.quantile(0.5),
+            "p95_latency_ms": stats.latency.quantile(0.95),
+            "p99_latency_ms": stats.latency.quantile(0.99),
+        }
+
+    @property
+    def _shared_path(self) -> str:
+        # gunicorn --preload 時各 worker 的 started_at 相同，以 pid 區分；pid 重複使用時以 started_at 區分
+        return os.path.join(self.shared_dir, f"{SHARED_FILE_PREFIX}{os.getpid()}_{int(self.started_at * 1000)}.json")
+
+    def _ensure_writer(self):
+        """第一次 record 時才啟動背景寫入執行緒 (gunicorn fork 後每個 worker 各自一個)"""
+        if self._writer is not None and self._writer.is_alive() and self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive() and self._writer_pid == os.getpid():
+                return
+            if self._created_pid != os.getpid():
+                # gunicorn fork 出的 worker，從這裡開始計時
+                self.started_at = time.time()
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._write_loop, name="rolling-metrics-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        """把目前 worker 的時間片寫到 shared_dir (先寫暫存檔再 rename)"""
+        if not self.shared_dir:
+            return
+        with self._lock:
+            data = {
+                "started_at": self.started_at,
+                "slot_seconds": self.slot_seconds,
+                "slots": [
+                    [slot_id, {route: stats.encode() for route, stats in routes.items()}]
+                    for slot_id, routes in self._slots
+                ],
+            }
+            self._dirty = False
+        path = self._shared_path
+        try:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"Failed to write rolling metrics to {path}: {str(e)}")
+
+    def _read_other_workers(self, slot_id: int) -> Tuple[List[Dict[str, _RouteStats]], float]:
+        """讀取其他 worker 寫入的視窗內資料，全部過期的檔案 (已結束的 worker) 會被刪除"""
+        sources, started_at = [], self.started_at
+        own_path = self._shared_path
+        for path in glob.glob(os.path.join(self.shared_dir, f"{SHARED_FILE_PREFIX}*.json")):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("slot_seconds") != self.slot_seconds:
+                continue
+
+            totals: Dict[str, _RouteStats] = {}
+            for other_slot_id, routes in data["slots"]:
+                if other_slot_id <= slot_id - self.max_slots:
+                    continue
+                for route, encoded in routes.items():
+                    totals.setdefault(route, _RouteStats()).merge(_RouteStats.decode(encoded))
+            if totals:
+                sources.append(totals)
+                started_at = min(started_at, data["started_at"])
+            elif time.time() - os.path.getmtime(path) > self.window_seconds:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return sources, started_at
+
+    def snapshot(self) -> Dict[str, Any]:
+        slot_id = int(time.time() // self.slot_seconds)
+        merged: Dict[str, _RouteStats] = {}
+        with self._lock:
+            self._rotate(slot_id)
+            for route, stats in self._totals.items():
+                merged.setdefault(route, _RouteStats()).merge(stats)
+
+        started_at, workers = self.started_at, 1
+        if self.shared_dir:
+            sources, started_at = self._read_other_workers(slot_id)
+            workers += len(sources)
+            for totals in sources:
+                for route, stats in totals.items():
+                    merged.setdefault(route, _RouteStats()).merge(stats)
+
+        overall = _RouteStats()
+        routes = {}
+        for route, stats in merged.items():
+            overall.merge(stats)
+            routes[route] = self._summary(stats)
+
+        result = self._summary(overall)
+        result["window_seconds"] = min(self.window_seconds, int(time.time() - started_at))
+        # all_workers: 合併 shared_dir 中所有 worker；worker: 只有處理這個請求的 worker
+        result["scope"] = "all_workers" if self.shared_dir else "worker"
+        result["workers"] = workers
+        result["routes"] = routes
+        return result
+
+
+rolling_metrics = RollingMetrics()
@@ -1,6 +1,9 @@
+import os
 import re
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Pattern
 from fastapi import HTTPException, status
+from porygon_api.security.key_store import create_api_key_store, hash_api_key
 
 
 ROLES_PERMISSIONS = {
@@ -26,11 +29,22 @@ API_KEYS = {
 }
 
 
+# API_KEY_STORE 未設定時使用上面的 API_KEYS (僅供本地開發)
+api_key_store = create_api_key_store(API_KEYS)
+
+
+def _with_key_hash(user_info: Dict[str, Any], api_key: str) -> Dict[str, Any]:
+    """回傳 user_info 的副本並帶上 key_hash，限流等以單一 API key 為單位的功能使用"""
+    user_info = user_info.copy()
+    user_info["key_hash"] = hash_api_key(api_key)
+    return user_info
+
+
 def verify_api_key(api_key: str) -> Dict[str, Any]:
     """Verify API Key"""
-    if api_key in API_KEYS:
-        user_info = API_KEYS[api_key].copy()
-        return user_info
+    user_info = api_key_store.get(api_key)
+    if user_info is not None:
+        return _with_key_hash(user_info, api_key)
 
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,25 +52,78 @@ def verify_api_key(api_key: str) -> Dict[str, Any]:
     )
 
 
-def check_endpoint_permission(user_info: Dict[str, Any], endpoint_path: str, method: str) -> bool:
-    """Check permisssion of client"""
-    role = user_info.get("role", "viewer")
+async def averify_api_key(api_key: str) -> Dict[str, Any]:
+    """Verify API Key without blocking the event loop"""
+    user_info = await api_key_store.aget(api_key)
+    if user_info is not None:
+        return _with_key_hash(user_info, api_key)
+
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalide API Key."
+    )
 
-    # 獲取該角色的權限
-    role_permissions = ROLES_PERMISSIONS.get(role, {})
-    allowed_endpoints = role_permissions.get("endpoints", [])
 
-    if "*" in allowed_endpoints:
-        return True
+class PermissionMatcher:
+    """
+    編譯各角色的 endpoint pattern，每個角色合併成一個 regex
+    pattern 格式為 "METHOD /path/*"，* 代表任意字元，以前綴比對 (與 re.match 相同)；
+    (role, method, path) 的結果放在有上限的 LRU cache
+    """
 
-    # 將請求方法和路徑組合成權限格式
-    request_pattern = f"{method} {endpoint_path}"
+    def __init__(self, roles_permissions: Dict[str, Dict[str, Any]], cache_size: int = None):
+        self.cache_size = cache_size or int(os.getenv("PERMISSION_CACHE_SIZE", 4096))
+        self._decide_cached = lru_cache(maxsize=self.cache_size)(self._decide)
+        self.reload(roles_permissions)
 
-    # 檢查具體的權限
-    for pattern in allowed_endpoints:
-        # 將通配符轉換為正則表達式
-        regex_pattern = pattern.replace("*", ".*")
-        if re.match(regex_pattern, request_pattern):
+    def reload(self, roles_permissions: Dict[str, Dict[str, Any]]):
+        """角色表變更時重新載入並清空 cache，各角色的 regex 在第一次用到時才編譯"""
+        self._endpoints = {
+            role: list(permissions.get("endpoints", []))
+            for role, permissions in roles_permissions.items()
+        }
+        self._compiled: Dict[str, Optional[Pattern]] = {}
+        self._decide_cached.cache_clear()
+
+    @staticmethod
+    def _compile(endpoints: List[str]) -> Optional[Pattern]:
+        if not endpoints:
+            return None
+        alternatives = [re.escape(pattern).replace(r"\*", ".*") for pattern in endpoints]
+        return re.compile("|".join(f"(?:{alternative})" for alternative in alternatives))
+
+    def _decide(self, role: str, method: str, endpoint_path: str) -> bool:
+        endpoints = self._endpoints.get(role)
+        if not endpoints:
+            return False
+        if "*" in endpoints:
             return True
+        if role not in self._compiled:
+            self._compiled[role] = self._compile(endpoints)
+        return self._compiled[role].match(f"{method} {endpoint_path}") is not None
+
+    def clear_cache(self):
+        self._decide_cached.cache_clear()
+
+    def is_allowed(self, role: str, method: str, endpoint_path: str) -> bool:
+        return self._decide_cached(role, method, endpoint_path)
+
+    def stats(self) -> Dict[str, Any]:
+        info = self._decide_cached.cache_info()
+        return {
+            "roles": len(self._endpoints),
+            "compiled_roles": len(self._compiled),
+            "cache_size": info.currsize,
+            "cache_max_size": info.maxsize,
+            "hits": info.hits,
+            "misses": info.misses,
+        }
+
 
-    return False
+permission_matcher = PermissionMatcher(ROLES_PERMISSIONS)
+
+
+def check_endpoint_permission(user_info: Dict[str, Any], endpoint_path: str, method: str) -> bool:
+    """Check permisssion of client"""
+    role = user_info.get("role", "viewer")
+    return permission_matcher.is_allowed(role, method, endpoint_path)
@@ -0,0 +1,260 @@
+import os
+import hmac
+import time
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from porygon_api.utils.cache import TTLCache
+from porygon_api.monitoring.prometheus import observe_db
+
+logger = logging.getLogger(__name__)
+
+# 資料庫中只存 HMAC-SHA256(pepper, api_key)，pepper 由 secret 提供
+API_KEY_PEPPER = os.getenv("API_KEY_PEPPER", "")
+
+
+def hash_api_key(api_key: str) -> str:
+    """API key 的雜湊值，寫入資料庫前與驗證時都使用這個函式"""
+    return hmac.new(API_KEY_PEPPER.encode(), api_key.encode(), hashlib.sha256).hexdigest()
+
+
+class ApiKeyStore(ABC):
+    """API key 來源，key 以 hash_api_key 的結果作為索引"""
+
+    @abstractmethod
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """讀取所有有效 (未撤銷) 的 key，回傳 {key_hash: user_info}"""
+
+    @abstractmethod
+    def lookup(self, key_hash: str) -> Optional[Dict[str, Any]]:
+        """查詢單一 key，不存在或已撤銷時回傳 None"""
+
+
+class StaticApiKeyStore(ApiKeyStore):
+    """以明文 dict 設定的 key，載入時就轉成雜湊，供本地開發使用"""
+
+    def __init__(self, api_keys: Dict[str, Dict[str, Any]]):
+        self._keys = {hash_api_key(key): dict(info) for key, info in api_keys.items()}
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._keys)
+
+    def lookup(self, key_hash: str) -> Optional[Dict[str, Any]]:
+        return self._keys.get(key_hash)
+
+
+class CloudSQLApiKeyStore(ApiKeyStore):
+    """
+    Cloud SQL 中的 api_keys 資料表
+    CREATE TABLE api_keys (key_hash TEXT PRIMARY KEY, user_id TEXT NOT NULL, role TEXT NOT NULL, revoked_at TIMESTAMPTZ)
+    """
+
+    def __init__(self, table: str = None):
+        from porygon_api.database.db_connector import cloud_sql_connector
+        self.connector = cloud_sql_connector
+        self.table = table or os.getenv("API_KEY_TABLE", "api_keys")
+
+    def _query(self, where: str, params: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+        result = self.connector.execute_query(
+            f"SELECT key_hash, user_id, role FROM {self.table} WHERE revoked_at IS NULL{where}",
+            params
+        )
+        if result["status"] != "success":
+            raise RuntimeError(f"Failed to load API keys: {result.get('message')}")
+        return {
+            row["key_hash"]: {"user_id": row["user_id"], "role": row["role"]}
+            for row in result["data"]
+        }
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return self._query("")
+
+    def lookup(self, key_hash: str) -> Optional[Dict[str, Any]]:
+        return self._query(" AND key_hash = :key_hash", {"key_hash": key_hash}).get(key_hash)
+
+
+class FirestoreApiKeyStore(ApiKeyStore):
+    """Firestore 中的 api_keys collection，document id 為 key_hash，欄位 user_id / role / revoked"""
+
+    def __init__(self, collection: str = None):
+        from porygon_api.database.db_connector import firestore_connector
+        self.connector = firestore_connector
+        self.collection = collection or os.getenv("API_KEY_COLLECTION", "api_keys")
+
+    @staticmethod
+    def _user_info(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {"user_id": data["user_id"], "role": data["role"]}
+
+    @staticmethod
+    def _active(data: Dict[str, Any]) -> bool:
+        # 沒有 revoked 欄位的 document 視為有效，load_all 與 lookup 判斷一致
+        return not data.get("revoked")
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        # where("revoked", "==", False) 會漏掉沒有 revoked 欄位的 document，改為全部讀出再篩選
+        with observe_db("firestore", "load_api_keys"):
+            docs = self.connector.connect().collection(self.collection).stream()
+            keys = {}
+            for doc in docs:
+                data = doc.to_dict()
+                if self._active(data):
+                    keys[doc.id] = self._user_info(data)
+            return keys
+
+    def lookup(self, key_hash: str) -> Optional[Dict[str, Any]]:
+        with observe_db("firestore", "lookup_api_key"):
+            doc = self.connector.connect().collection(self.collection).document(key_hash).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if not self._active(data):
+            return None
+        return self._user_info(data)
+
+
+class CachedApiKeyStore:
+    """
+    驗證請求時只查記憶體中的快照，不經過資料庫
+    啟動時整批載入，背景每 refresh_interval 秒重新整批載入，撤銷的 key 最晚在這個間隔內失效；
+    重新載入持續失敗、快照超過 max_stale 秒時，改為逐筆查詢資料庫 (async 路徑在 threadpool 中查詢)。
+    無效的 key 放在有上限的 negative cache，避免重複查詢；
+    逐筆查詢失敗時使用最後一次成功的快照，並在 error_ttl 秒內不再查詢資料庫
+    """
+
+    def __init__(
+        self,
+        backend: ApiKeyStore,
+        refresh_interval: float = None,
+        max_stale: float = None,
+        negative_ttl: float = None,
+        negative_max_size: int = None,
+        error_ttl: float = None,
+    ):
+        self.backend = backend
+        self.refresh_interval = refresh_interval or float(os.getenv("API_KEY_REFRESH_SECONDS", 60))
+        self.max_stale = max_stale or float(os.getenv("API_KEY_MAX_STALE_SECONDS", 5 * self.refresh_interval))
+        self.negative_cache = TTLCache(
+            maxsize=negative_max_size or int(os.getenv("API_KEY_NEGATIVE_CACHE_SIZE", 10000)),
+            ttl=negative_ttl or float(os.getenv("API_KEY_NEGATIVE_TTL_SECONDS", 30)),
+        )
+        self.error_ttl = error_ttl or float(os.getenv("API_KEY_ERROR_TTL_SECONDS", 5))
+        self._lookup_retry_at = 0.0
+        # 逐筆查詢得到的結果，存活時間與快照相同
+        self.lookup_cache = TTLCache(maxsize=10000, ttl=self.refresh_interval)
+        self._snapshot: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refresh_failures = 0
+        self.backend_lookups = 0
+        self.lookup_failures = 0
+
+    @property
+    def snapshot_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.max_stale
+
+    def refresh(self) -> bool:
+        """整批重新載入，失敗時保留舊快照"""
+        try:
+            snapshot = self.backend.load_all()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"Failed to refresh API keys from {type(self.backend).__name__}: {str(e)}")
+            return False
+        # 整個 dict 替換，驗證中的請求不需要加鎖
+        self._snapshot = snapshot
+        self._loaded_at = time.monotonic()
+        self.lookup_cache.clear()
+        logger.info(f"Loaded {len(snapshot)} API keys from {type(self.backend).__name__}")
+        return True
+
+    def start(self):
+        """啟動時整批載入，之後在背景定期重新載入"""
+        self.refresh()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="api-key-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def _cached(self, key_hash: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """不需查詢資料庫就能判斷時回傳 (True, user_info)，否則回傳 (False, None)"""
+        if self.snapshot_fresh:
+            # 快照是完整的 key 清單，不在其中就是無效 (新建立的 key 在下次載入後生效)
+            return True, self._snapshot.get(key_hash)
+        if time.monotonic() < self._lookup_retry_at:
+            # 資料庫剛查詢失敗，暫時以舊快照判斷
+            return True, self._snapshot.get(key_hash)
+
+        if self.negative_cache.get(key_hash) is not None:
+            return True, None
+        user_info = self.lookup_cache.get(key_hash)
+        if user_info is not None:
+            return True, user_info
+        return False, None
+
+    def _lookup(self, key_hash: str) -> Optional[Dict[str, Any]]:
+        self.backend_lookups += 1
+        try:
+            user_info = self.backend.lookup(key_hash)
+        except Exception as e:
+            self.lookup_failures += 1
+            self._lookup_retry_at = time.monotonic() + self.error_ttl
+            logger.error(f"API key lookup failed, using the last snapshot for {self.error_ttl:.0f} 秒: {str(e)}")
+            return self._snapshot.get(key_hash)
+        if user_info is None:
+            self.negative_cache.set(key_hash, True)
+        else:
+            self.lookup_cache.set(key_hash, user_info)
+        return user_info
+
+    def get(self, api_key: str) -> Optional[Dict[str, Any]]:
+        key_hash = hash_api_key(api_key)
+        found, user_info = self._cached(key_hash)
+        if found:
+            return user_info
+        return self._lookup(key_hash)
+
+    async def aget(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """與 get 相同，需要查詢資料庫時在 threadpool 中執行，不阻塞 event loop"""
+        key_hash = hash_api_key(api_key)
+        found, user_info = self._cached(key_hash)
+        if found:
+            return user_info
+        return await run_in_threadpool(self._lookup, key_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "keys": len(self._snapshot),
+            "snapshot_age_seconds": None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+            "snapshot_fresh": self.snapshot_fresh,
+            "refresh_failures": self.refresh_failures,
+            "backend_lookups": self.backend_lookups,
+            "lookup_failures": self.lookup_failures,
+            "negative_cache": self.negative_cache.stats(),
+        }
+
+
+def create_api_key_store(static_keys: Dict[str, Dict[str, Any]]) -> CachedApiKeyStore:
+    """依 API_KEY_STORE 選擇來源: static (預設) / cloudsql / firestore"""
+    backend_name = os.getenv("API_KEY_STORE", "static").lower()
+    if backend_name == "cloudsql":
+        backend = CloudSQLApiKeyStore()
+    elif backend_name == "firestore":
+        backend = FirestoreApiKeyStore()
+    else:
+        backend = StaticApiKeyStore(static_keys)
+    return CachedApiKeyStore(backend)
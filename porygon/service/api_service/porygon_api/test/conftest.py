@@ -0,0 +1,8 @@
+# 這些是對實際部署的服務 / 資料庫手動執行的腳本，import 時就會連線，不列入 pytest
+collect_ignore = [
+    "test_cloud_endpoint.py",
+    "test_cloudsql.py",
+    "test_endpoint.py",
+    "test_firestor.py",
+    "test_mlflow_nedpoint.py",
+]
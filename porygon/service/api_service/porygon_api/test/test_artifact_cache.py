@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from porygon_api.inference.artifact_cache import LOCK_DIR, MANIFEST_FILE, ArtifactCache, ArtifactCacheError
+
+
+def make_source(path, size, content=b"x"):
+    path.mkdir()
+    (path / "model.bin").write_bytes(content * size)
+    (path / "MLmodel").write_text("flavors: {}")
+    return str(path)
+
+
+def entries(root):
+    return sorted(name for name in os.listdir(root) if name != LOCK_DIR)
+
+
+def lock_files(root):
+    return sorted(name[:-len(".lock")] for name in os.listdir(os.path.join(root, LOCK_DIR)))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=10 ** 6, verify=True)
+    source = make_source(tmp_path / "v1", 100)
+
+    with cache.checkout(source) as path:
+        assert open(os.path.join(path, "model.bin"), "rb").read() == b"x" * 100
+    with cache.checkout(source) as again:
+        assert again == path
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+
+def test_manifest_sha256_detects_corruption(tmp_path):
+    root = tmp_path / "cache"
+    cache = ArtifactCache(root=str(root), max_bytes=10 ** 6, verify=True)
+    source = make_source(tmp_path / "v1", 100)
+    with cache.checkout(source) as path:
+        pass
+
+    manifest = json.loads((root / entries(root)[0] / MANIFEST_FILE).read_text())
+    assert manifest["total_bytes"] == 100 + len("flavors: {}")
+    # 大小相同但內容被改動，只有 sha256 能發現
+    with open(os.path.join(path, "model.bin"), "wb") as f:
+        f.write(b"y" * 100)
+
+    with cache.checkout(source) as path:
+        assert open(os.path.join(path, "model.bin"), "rb").read() == b"x" * 100
+    assert cache.stats()["misses"] == 2
+
+
+def test_evicts_least_recently_used_and_its_lock(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = ArtifactCache(root=root, max_bytes=2500, verify=False)
+    sources = [make_source(tmp_path / f"v{i}", 1000) for i in range(3)]
+
+    digests = []
+    for source in sources:
+        lease = cache.acquire(source)
+        digests.append(lease.digest)
+        lease.release()
+
+    assert entries(root) == sorted(digests[1:])
+    assert lock_files(root) == sorted(digests[1:])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_leased_entry_is_not_evicted(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = ArtifactCache(root=root, max_bytes=1500, verify=False)
+    first = cache.acquire(make_source(tmp_path / "v1", 1000))
+    second = cache.acquire(make_source(tmp_path / "v2", 1000))
+
+    # 第一個版本的模型仍在使用，超過上限也不淘汰
+    assert entries(root) == sorted([first.digest, second.digest])
+    assert os.path.exists(os.path.join(first.path, "model.bin"))
+
+    first.release()
+    second.release()
+    third = cache.acquire(make_source(tmp_path / "v3", 1000))
+    third.release()
+    assert entries(root) == [third.digest]
+
+
+def test_missing_source_raises(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=10 ** 6)
+    with pytest.raises(ArtifactCacheError):
+        cache.acquire(str(tmp_path / "missing"))
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from porygon_api.app.UserQuery.loader import BatchLoader
+
+
+class FakeBatch:
+    def __init__(self, data=None, error=None):
+        self.data = data or {}
+        self.error = error
+        self.calls = []
+
+    async def __call__(self, keys):
+        self.calls.append(list(keys))
+        if self.error is not None:
+            raise self.error
+        return {key: self.data[key] for key in keys if key in self.data}
+
+
+def test_loads_in_window_are_batched():
+    batch = FakeBatch({"a": 1, "b": 2, "c": 3})
+    loader = BatchLoader(batch, window_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(*(loader.load(key) for key in ("a", "b", "c")))
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
+    assert batch.calls == [["a", "b", "c"]]
+    assert loader.stats()["average_batch_size"] == 3
+
+
+def test_zero_window_batches_same_tick():
+    batch = FakeBatch({"a": 1, "b": 2})
+    loader = BatchLoader(batch, window_ms=0)
+
+    async def scenario():
+        first = await asyncio.gather(loader.load("a"), loader.load("b"))
+        second = await loader.load("a")
+        return first, second
+
+    assert asyncio.run(scenario()) == ([1, 2], 1)
+    assert batch.calls == [["a", "b"], ["a"]]
+
+
+def test_duplicate_keys_are_queried_once():
+    batch = FakeBatch({"a": 1})
+    loader = BatchLoader(batch)
+
+    async def scenario():
+        return await asyncio.gather(*(loader.load("a") for _ in range(4)))
+
+    assert asyncio.run(scenario()) == [1, 1, 1, 1]
+    assert batch.calls == [["a"]]
+    stats = loader.stats()
+    assert stats["loads"] == 4 and stats["batched_keys"] == 1
+
+
+def test_full_batch_dispatches_without_waiting_for_window():
+    batch = FakeBatch({key: key for key in range(5)})
+    # 時間窗很長，只有達到 max_batch_size 才會送出
+    loader = BatchLoader(batch, max_batch_size=2, window_ms=60000)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(*(loader.load(key) for key in range(4))), timeout=1)
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3]
+    assert batch.calls == [[0, 1], [2, 3]]
+
+
+def test_missing_key_resolves_to_none():
+    batch = FakeBatch({"a": 1})
+    loader = BatchLoader(batch)
+
+    async def scenario():
+        return await asyncio.gather(loader.load("a"), loader.load("missing"))
+
+    assert asyncio.run(scenario()) == [1, None]
+
+
+def test_batch_error_reaches_every_caller():
+    batch = FakeBatch(error=RuntimeError("db down"))
+    loader = BatchLoader(batch)
+
+    async def scenario():
+        return await asyncio.gather(loader.load("a"), loader.load("a"), loader.load("b"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batch.calls == [["a", "b"]]
+
+
+def test_cancelled_caller_does_not_break_batch():
+    batch = FakeBatch({"a": 1, "b": 2})
+    loader = BatchLoader(batch, window_ms=5)
+
+    async def scenario():
+        first = asyncio.create_task(loader.load("a"))
+        second = asyncio.create_task(loader.load("b"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 2
+    assert batch.calls == [["a", "b"]]
@@ -0,0 +1,82 @@
+import threading
+
+from porygon_api.monitoring.bq_shipper import BigQueryLogShipper
+
+
+class FakeClient:
+    def __init__(self, errors=None):
+        self.batches = []
+        self.errors = errors or []
+        self.inserted = threading.Event()
+
+    def insert_rows_json(self, table_id, rows):
+        self.batches.append(list(rows))
+        self.inserted.set()
+        return self.errors
+
+
+def make_shipper(client, **kwargs):
+    kwargs.setdefault("flush_interval", 60)
+    return BigQueryLogShipper(client, "project.dataset.table", **kwargs)
+
+
+def test_batches_by_row_count():
+    client = FakeClient()
+    shipper = make_shipper(client, batch_rows=3)
+    shipper._ensure_started = lambda: None
+    for i in range(7):
+        shipper.enqueue({"i": i})
+    shipper.flush()
+
+    assert [len(batch) for batch in client.batches] == [3, 3, 1]
+    assert shipper.stats()["shipped"] == 7
+
+
+def test_batches_by_size():
+    client = FakeClient()
+    shipper = make_shipper(client, batch_bytes=100)
+    shipper._ensure_started = lambda: None
+    for i in range(4):
+        shipper.enqueue({"payload": "x" * 60})
+    shipper.flush()
+
+    # 第二筆讓大小超過上限，每批兩筆
+    assert [len(batch) for batch in client.batches] == [2, 2]
+
+
+def test_drops_when_queue_is_full():
+    client = FakeClient()
+    shipper = make_shipper(client, max_queue=2)
+    shipper._ensure_started = lambda: None
+    results = [shipper.enqueue({"i": i}) for i in range(5)]
+
+    assert results == [True, True, False, False, False]
+    assert shipper.stats()["dropped"] == 3
+    shipper.flush()
+    assert client.batches == [[{"i": 0}, {"i": 1}]]
+
+
+def test_background_thread_ships_and_stop_flushes_rest():
+    client = FakeClient()
+    shipper = make_shipper(client, batch_rows=2)
+    shipper.enqueue({"i": 0})
+    shipper.enqueue({"i": 1})
+    assert client.inserted.wait(5)
+
+    shipper.enqueue({"i": 2})
+    # flush_interval 為 60 秒，stop 不應等到間隔結束
+    shipper.stop()
+    assert [row["i"] for batch in client.batches for row in batch] == [0, 1, 2]
+    assert not shipper._thread.is_alive()
+
+
+def test_counts_rows_rejected_by_bigquery():
+    client = FakeClient(errors=[{"index": 0, "errors": ["invalid"]}])
+    shipper = make_shipper(client)
+    shipper._ensure_started = lambda: None
+    shipper.enqueue({"i": 0})
+    shipper.enqueue({"i": 1})
+    shipper.flush()
+
+    stats = shipper.stats()
+    assert (stats["shipped"], stats["failed_rows"]) == (1, 1)
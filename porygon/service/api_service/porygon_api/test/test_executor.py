@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+from porygon_api.inference.batching import PredictBatcher
+from porygon_api.inference.executor import InferenceExecutor, InferenceQueueFull
+
+
+def test_rejects_when_running_and_waiting_reach_limit():
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        waiting = executor.submit(lambda: "done")
+        with pytest.raises(InferenceQueueFull):
+            executor.submit(lambda: None)
+        release.set()
+        await running
+        assert await waiting == "done"
+        executor.shutdown()
+        return executor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["running"] == 0
+
+
+def test_cancel_before_start_releases_slot():
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        try:
+            waiting = executor.submit(lambda: "never")
+            waiting.cancel()
+            await asyncio.sleep(0.01)
+            # 被取消的工作不再佔用等待名額
+            admitted = executor.submit(lambda: "admitted")
+        finally:
+            release.set()
+        await running
+        result = await admitted
+        executor.shutdown()
+        return result, executor.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "admitted"
+    assert stats["cancelled"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["running"] == 0
+
+
+def test_batcher_merges_requests_into_one_predict():
+    calls = []
+
+    def predict(inputs):
+        calls.append(list(inputs))
+        return [item["input"].upper() for item in inputs]
+
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_queue=4)
+        batcher = PredictBatcher(predict, max_batch_size=8, window_ms=20, executor=executor)
+        results = await asyncio.gather(*(batcher.submit({"input": text}) for text in ("a", "b", "c")))
+        executor.shutdown()
+        return results
+
+    assert asyncio.run(scenario()) == ["A", "B", "C"]
+    assert len(calls) == 1
+
+
+def test_batcher_rejects_when_pending_limit_reached():
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_queue=1)
+        batcher = PredictBatcher(lambda inputs: inputs, max_batch_size=2, window_ms=50, executor=executor, max_pending=2)
+        first = asyncio.ensure_future(batcher.submit(1))
+        second = asyncio.ensure_future(batcher.submit(2))
+        third = asyncio.ensure_future(batcher.submit(3))
+        await asyncio.sleep(0)
+        # worker 尚未取出任何請求，第三筆超過上限
+        with pytest.raises(InferenceQueueFull):
+            await third
+        results = await asyncio.gather(first, second)
+        executor.shutdown()
+        return results
+
+    assert asyncio.run(scenario()) == [1, 2]
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from porygon_api.app.UserQuery.cache import ReadThroughCache
+
+
+class FakeLoader:
+    def __init__(self, data=None, error=None):
+        self.data = data or {}
+        self.error = error
+        self.calls = []
+        self.release = None
+
+    async def __call__(self, key):
+        self.calls.append(key)
+        # 查詢開始時讀取的值，等同資料庫已回傳但結果尚未送達
+        value = self.data.get(key)
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return value
+
+
+async def settle():
+    # 讓 get 與 loader task 都執行到等待 release 的位置
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_misses_share_one_load():
+    loader = FakeLoader({"a": {"id": "a"}})
+    cache = ReadThroughCache(loader)
+
+    async def scenario():
+        loader.release = asyncio.Event()
+        tasks = [asyncio.create_task(cache.get("a")) for _ in range(10)]
+        await settle()
+        loader.release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+    assert results == [{"id": "a"}] * 10
+    assert loader.calls == ["a"]
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 9 and stats["inflight"] == 0
+
+
+def test_hit_after_load():
+    loader = FakeLoader({"a": {"id": "a"}})
+    cache = ReadThroughCache(loader)
+
+    async def scenario():
+        await cache.get("a")
+        return await cache.get("a")
+
+    assert asyncio.run(scenario()) == {"id": "a"}
+    assert loader.calls == ["a"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_missing_key_is_negative_cached():
+    loader = FakeLoader()
+    cache = ReadThroughCache(loader, negative_ttl=60)
+
+    async def scenario():
+        return [await cache.get("missing") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [None, None, None]
+    assert loader.calls == ["missing"]
+    assert cache.stats()["negative_hits"] == 2
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    loader = FakeLoader(error=RuntimeError("db down"))
+    cache = ReadThroughCache(loader)
+
+    async def scenario():
+        loader.release = asyncio.Event()
+        tasks = [asyncio.create_task(cache.get("a")) for _ in range(3)]
+        await settle()
+        loader.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 錯誤恢復後下一次 get 重新查詢
+        loader.error = None
+        loader.release = None
+        loader.data = {"a": {"id": "a"}}
+        return results, await cache.get("a")
+
+    results, recovered = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert recovered == {"id": "a"}
+    assert loader.calls == ["a", "a"]
+    assert cache.stats()["load_errors"] == 1
+
+
+def test_invalidate_during_load_does_not_store_stale_value():
+    loader = FakeLoader({"a": {"id": "a", "version": 1}})
+    cache = ReadThroughCache(loader)
+
+    async def scenario():
+        loader.release = asyncio.Event()
+        first = asyncio.create_task(cache.get("a"))
+        await settle()
+        cache.invalidate("a")
+        loader.data["a"] = {"id": "a", "version": 2}
+        loader.release.set()
+        stale = await first
+        loader.release = None
+        return stale, await cache.get("a")
+
+    stale, fresh = asyncio.run(scenario())
+    # 進行中的請求拿到舊值，但不寫回快取
+    assert stale["version"] == 1
+    assert fresh["version"] == 2
+    assert loader.calls == ["a", "a"]
+
+
+def test_cancelled_caller_does_not_cancel_shared_load():
+    loader = FakeLoader({"a": {"id": "a"}})
+    cache = ReadThroughCache(loader)
+
+    async def scenario():
+        loader.release = asyncio.Event()
+        first = asyncio.create_task(cache.get("a"))
+        second = asyncio.create_task(cache.get("a"))
+        await settle()
+        first.cancel()
+        await settle()
+        loader.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await cache.get("a")
+
+    waiting, cached = asyncio.run(scenario())
+    assert waiting == cached == {"id": "a"}
+    assert loader.calls == ["a"]
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from porygon_api.security.key_store import (
+    CachedApiKeyStore,
+    FirestoreApiKeyStore,
+    StaticApiKeyStore,
+    hash_api_key,
+)
+
+
+class FakeBackend(StaticApiKeyStore):
+    def __init__(self, api_keys):
+        super().__init__(api_keys)
+        self.lookups = 0
+        self.lookup_threads = []
+        self.fail = False
+
+    def lookup(self, key_hash):
+        self.lookups += 1
+        self.lookup_threads.append(threading.current_thread())
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return super().lookup(key_hash)
+
+
+def make_store(keys=None, **kwargs):
+    backend = FakeBackend(keys or {"good": {"user_id": "u1", "role": "admin"}})
+    store = CachedApiKeyStore(backend, refresh_interval=60, **kwargs)
+    store.refresh()
+    return store, backend
+
+
+def make_stale(store):
+    store._loaded_at = time.monotonic() - store.max_stale - 1
+
+
+def test_fresh_snapshot_does_not_query_backend():
+    store, backend = make_store()
+    assert store.get("good") == {"user_id": "u1", "role": "admin"}
+    assert store.get("bad") is None
+    assert backend.lookups == 0
+
+
+def test_stale_snapshot_looks_up_and_caches_misses():
+    store, backend = make_store()
+    make_stale(store)
+
+    assert store.get("good")["user_id"] == "u1"
+    assert store.get("bad") is None
+    assert store.get("good")["user_id"] == "u1"
+    assert store.get("bad") is None
+    assert backend.lookups == 2
+
+
+def test_lookup_failure_falls_back_to_snapshot_and_backs_off():
+    store, backend = make_store(error_ttl=60)
+    make_stale(store)
+    backend.fail = True
+
+    # 最後一次成功的快照中有這個 key，不因資料庫故障而回 401
+    assert store.get("good")["user_id"] == "u1"
+    assert store.get("bad") is None
+    assert store.get("good")["user_id"] == "u1"
+    assert backend.lookups == 1
+    assert store.stats()["lookup_failures"] == 1
+
+
+def test_lookup_resumes_after_error_ttl():
+    store, backend = make_store(error_ttl=0.01)
+    make_stale(store)
+    backend.fail = True
+    store.get("good")
+    time.sleep(0.02)
+    backend.fail = False
+
+    assert store.get("good")["user_id"] == "u1"
+    assert backend.lookups == 2
+
+
+def test_aget_looks_up_off_the_event_loop():
+    store, backend = make_store()
+    make_stale(store)
+
+    async def scenario():
+        return await store.aget("good"), threading.current_thread()
+
+    user_info, loop_thread = asyncio.run(scenario())
+    assert user_info["user_id"] == "u1"
+    assert backend.lookup_threads and backend.lookup_threads[0] is not loop_thread
+
+
+class FakeFirestore:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def connect(self):
+        return self
+
+    def collection(self, name):
+        return self
+
+    def stream(self):
+        return [SimpleNamespace(id=doc_id, to_dict=lambda data=data: dict(data)) for doc_id, data in self.docs.items()]
+
+    def document(self, doc_id):
+        data = self.docs.get(doc_id)
+        return SimpleNamespace(get=lambda: SimpleNamespace(exists=data is not None, to_dict=lambda: dict(data)))
+
+
+def test_firestore_load_all_and_lookup_agree_on_missing_revoked():
+    docs = {
+        hash_api_key("no-field"): {"user_id": "u1", "role": "admin"},
+        hash_api_key("active"): {"user_id": "u2", "role": "viewer", "revoked": False},
+        hash_api_key("revoked"): {"user_id": "u3", "role": "viewer", "revoked": True},
+    }
+    store = FirestoreApiKeyStore.__new__(FirestoreApiKeyStore)
+    store.connector = FakeFirestore(docs)
+    store.collection = "api_keys"
+
+    loaded = store.load_all()
+    for key_hash in docs:
+        assert loaded.get(key_hash) == store.lookup(key_hash)
+    assert set(loaded) == {hash_api_key("no-field"), hash_api_key("active")}
+
+
+def test_verified_user_info_carries_key_hash():
+    from porygon_api.security.api_key import API_KEYS, averify_api_key, verify_api_key
+
+    user_info = verify_api_key("admin_key")
+    assert user_info["key_hash"] == hash_api_key("admin_key")
+    assert asyncio.run(averify_api_key("admin_key")) == user_info
+    # 回傳副本，不修改快取中的資料
+    assert "key_hash" not in API_KEYS["admin_key"]
@@ -0,0 +1,66 @@
+import pytest
+
+from porygon_api.database.db_connector import _keyset_query, _next_cursor, cloud_sql_connector
+
+
+def test_first_page_query():
+    query = _keyset_query("items", "id", ["id", "name"], None, has_cursor=False)
+    assert query == "SELECT id, name FROM items ORDER BY id LIMIT :keyset_limit"
+
+
+def test_cursor_and_where_are_combined():
+    query = _keyset_query("public.items", "id", ["*"], "category = :category", has_cursor=True)
+    assert query == (
+        "SELECT * FROM public.items WHERE (category = :category) AND id > :keyset_after "
+        "ORDER BY id LIMIT :keyset_limit"
+    )
+
+
+@pytest.mark.parametrize(
+    "table, key, columns",
+    [
+        ("items; DROP TABLE items", "id", ["id"]),
+        ("items", "id desc", ["id"]),
+        ("items", "id", ["id", "name, password"]),
+        ("items", "id", ["id", "1name"]),
+        ("a.b.c", "id", ["id"]),
+        ('"items"', "id", ["id"]),
+    ],
+)
+def test_invalid_identifiers_are_rejected(table, key, columns):
+    with pytest.raises(ValueError, match="Invalid identifier"):
+        _keyset_query(table, key, columns, None, has_cursor=False)
+
+
+def test_key_must_be_plain_column():
+    with pytest.raises(ValueError, match="plain column name"):
+        _keyset_query("items", "items.id", ["items.id"], None, has_cursor=False)
+
+
+def test_key_must_be_selected():
+    with pytest.raises(ValueError, match="must be selected"):
+        _keyset_query("items", "id", ["name"], None, has_cursor=False)
+
+
+def test_paginate_keyset_returns_error_without_querying(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("query should not run")
+
+    monkeypatch.setattr(cloud_sql_connector, "execute_query", fail)
+    response = cloud_sql_connector.paginate_keyset("items", "id", columns=["id", "name; --"])
+    assert response["status"] == "error"
+    assert "Invalid identifier" in response["message"]
+
+
+@pytest.mark.parametrize(
+    "response, row_format",
+    [
+        ({"data": [{"id": "a"}, {"id": "b"}]}, "dict"),
+        ({"data": [("x", "a"), ("y", "b")], "columns": ["name", "id"]}, "tuple"),
+        ({"data": {"id": ["a", "b"], "name": ["x", "y"]}}, "columnar"),
+    ],
+)
+def test_next_cursor_is_last_key_of_full_page(response, row_format):
+    assert _next_cursor(response, "id", limit=2, row_format=row_format) == "b"
+    # 本頁未滿代表沒有下一頁
+    assert _next_cursor(response, "id", limit=3, row_format=row_format) is None
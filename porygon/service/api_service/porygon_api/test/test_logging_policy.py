@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from porygon_api.middleware import logging as bq_logging
+from porygon_api.middleware.logging import LoggingPolicy, LoggingStage
+from porygon_api.middleware.pipeline import RequestContext
+
+HEADERS = {
+    "X-API-Key": "secret-key",
+    "Authorization": "Bearer secret-token",
+    "User-Agent": "pytest",
+    "X-Internal-Trace": "abc",
+}
+
+
+def test_sensitive_headers_are_redacted_with_wildcard_allowlist():
+    policy = LoggingPolicy(header_allowlist="*")
+    filtered = policy.filter_headers(HEADERS)
+    assert filtered["x-api-key"] == "[REDACTED]"
+    assert filtered["authorization"] == "[REDACTED]"
+    assert filtered["user-agent"] == "pytest"
+    assert filtered["x-internal-trace"] == "abc"
+
+
+def test_headers_outside_allowlist_are_dropped():
+    policy = LoggingPolicy(header_allowlist="user-agent")
+    filtered = policy.filter_headers(HEADERS)
+    assert filtered == {"x-api-key": "[REDACTED]", "authorization": "[REDACTED]", "user-agent": "pytest"}
+    assert "secret" not in json.dumps(filtered)
+
+
+@pytest.mark.parametrize(
+    "status_code, error, latency_ms, sample_rate, expected",
+    [
+        (200, None, 10, 0.0, False),
+        (404, None, 10, 0.0, True),
+        (200, "boom", 10, 0.0, True),
+        (200, None, 2500, 0.0, True),
+        (200, None, 10, 1.0, True),
+    ],
+)
+def test_keep_full(status_code, error, latency_ms, sample_rate, expected):
+    policy = LoggingPolicy(sample_rate=sample_rate, slow_ms=2000)
+    assert policy.keep_full(status_code, error, latency_ms) is expected
+
+
+@pytest.fixture
+def ship(monkeypatch):
+    """執行 LoggingStage 的完整流程，回傳寫入 BigQuery 的 row"""
+    rows = []
+    monkeypatch.setattr(bq_logging.log_capture, "install", lambda: None)
+    monkeypatch.setattr(bq_logging.bq_shipper, "enqueue", lambda row: rows.append(row) or True)
+
+    def run(policy, status_code=200, latency_ms=10):
+        monkeypatch.setattr(bq_logging, "logging_policy", policy)
+        headers = [(name.lower().encode(), value.encode()) for name, value in HEADERS.items()]
+        ctx = RequestContext({"type": "http", "path": "/api/v1/items", "method": "POST", "headers": headers})
+        ctx.request_id = "req-1"
+
+        async def scenario():
+            stage = LoggingStage()
+            await stage.on_request(ctx)
+            stage.on_request_body(ctx, b'{"query": "hello"}')
+            bq_logging.log_capture.current_capture().write("handler log\n")
+            stage.on_response_body(ctx, b'{"detail": "done"}')
+            ctx.status_code = status_code
+            ctx.start_time = time.time() - latency_ms / 1000
+            await stage.on_complete(ctx)
+
+        asyncio.run(scenario())
+        return rows.pop()
+
+    return run
+
+
+@pytest.mark.parametrize(
+    "policy, status_code, latency_ms",
+    [
+        (LoggingPolicy(sample_rate=0.0, slow_ms=2000), 500, 10),
+        (LoggingPolicy(sample_rate=0.0, slow_ms=2000), 200, 2500),
+        (LoggingPolicy(sample_rate=1.0, slow_ms=2000), 200, 10),
+    ],
+    ids=["error", "slow", "sampled"],
+)
+def test_full_rows_keep_body_log_and_filtered_headers(ship, policy, status_code, latency_ms):
+    row = ship(policy, status_code, latency_ms)
+    assert row["request_body"] == '{"query": "hello"}'
+    assert row["response_body"] == '{"detail": "done"}'
+    assert "handler log" in row["log"]
+    headers = json.loads(row["request_headers"])
+    assert headers["x-api-key"] == "[REDACTED]"
+    assert "secret" not in row["request_headers"]
+    assert policy.stats()["full_rows"] == 1
+
+
+def test_other_rows_are_metadata_only(ship):
+    policy = LoggingPolicy(sample_rate=0.0, slow_ms=2000)
+    row = ship(policy)
+    assert row["request_body"] == row["response_body"] == row["log"] == ""
+    assert row["request_headers"] == "{}"
+    assert (row["method"], row["path"], row["status_code"]) == ("POST", "/api/v1/items", 200)
+    assert policy.stats()["compact_rows"] == 1
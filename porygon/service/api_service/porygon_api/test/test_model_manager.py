@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import mlflow
+import pytest
+
+from porygon_api.model_manager import ModelSlot, model_manager
+
+
+@pytest.fixture
+def slot(monkeypatch):
+    slot = ModelSlot(name="test_model", uri=None)
+    monkeypatch.setitem(model_manager.slots, slot.name, slot)
+    monkeypatch.setattr(mlflow.pyfunc, "load_model", lambda uri: mock.Mock())
+    yield slot
+    model_manager._resident.pop(slot.name, None)
+
+
+def make_artifact(path, size):
+    path.mkdir()
+    (path / "model.bin").write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_memory_estimated_from_artifact_size(tmp_path, monkeypatch, slot):
+    monkeypatch.setattr(model_manager, "memory_per_artifact_byte", 2.0)
+    slot.uri = make_artifact(tmp_path / "v1", 1000)
+    with slot.lock:
+        model_manager._load_slot(slot)
+    assert slot.memory_bytes == 2000
+
+
+def test_hot_swap_updates_memory(tmp_path, slot):
+    slot.uri = make_artifact(tmp_path / "v1", 1000)
+    with slot.lock:
+        model_manager._load_slot(slot)
+        model_manager._hot_swap(slot, "2", make_artifact(tmp_path / "v2", 3000))
+    assert slot.version == "2"
+    assert slot.memory_bytes == 3000
+    assert model_manager.stats()["models"]["test_model"]["memory_bytes"] == 3000
+
+
+def test_hot_swap_releases_previous_artifact_lease(tmp_path, monkeypatch, slot):
+    from porygon_api.inference.artifact_cache import artifact_cache
+
+    monkeypatch.setattr(artifact_cache, "root", str(tmp_path / "cache"))
+    monkeypatch.setattr(artifact_cache, "max_bytes", 1500)
+    slot.uri = make_artifact(tmp_path / "v1", 1000)
+    with slot.lock:
+        model_manager._load_slot(slot)
+        first = slot.artifact_lease
+        model_manager._hot_swap(slot, "2", make_artifact(tmp_path / "v2", 1000))
+
+    assert slot.memory_bytes == 1000
+    assert slot.artifact_lease is not first
+    # 舊版本的 lease 已釋放，下一次寫入快取時可以被淘汰
+    artifact_cache.acquire(make_artifact(tmp_path / "v3", 1000)).release()
+    assert not os.path.exists(first.path)
+    assert os.path.exists(slot.artifact_lease.path)
+    slot.artifact_lease.release()
+
+
+def test_new_slot_does_not_emit_load_state():
+    from prometheus_client import REGISTRY
+
+    labels = {"model": "preload_model", "state": "not_loaded"}
+    slot = ModelSlot(name="preload_model", uri=None)
+    assert slot.load_state == "not_loaded"
+    assert REGISTRY.get_sample_value("porygon_model_load_state", labels) is None
+
+    slot.load_state = "loading"
+    assert REGISTRY.get_sample_value("porygon_model_load_state", {**labels, "state": "loading"}) == 1
+
+
+class FakeModel:
+    def __init__(self, version, fail_warmup=False):
+        self.version = version
+        self.fail_warmup = fail_warmup
+        self.calls = []
+
+    def predict(self, data):
+        if self.fail_warmup and data == [{"input": model_manager.warmup_query}]:
+            raise RuntimeError("warmup failed")
+        self.calls.append(data)
+        return [self.version for _ in data]
+
+
+class FakeRegistry:
+    """代替 MlflowClient，alias 指向 self.version"""
+
+    def __init__(self):
+        self.version = "1"
+        self.models = {}
+        # 設定後，載入這些版本時會等到 gate 被 set
+        self.slow_versions = set()
+        self.gate = threading.Event()
+        self.loading = threading.Event()
+
+    def get_model_version_by_alias(self, name, alias):
+        return SimpleNamespace(version=self.version)
+
+    def load_model(self, uri):
+        version = uri.rsplit("/", 1)[-1]
+        if version in self.slow_versions:
+            self.loading.set()
+            assert self.gate.wait(5)
+        return self.models[version]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    from porygon_api.inference.artifact_cache import artifact_cache
+
+    registry = FakeRegistry()
+    registry.models = {"1": FakeModel("1"), "2": FakeModel("2")}
+    monkeypatch.setattr("porygon_api.model_manager.MlflowClient", lambda: registry)
+    monkeypatch.setattr(mlflow.pyfunc, "load_model", registry.load_model)
+    monkeypatch.setattr(artifact_cache, "root", None)
+
+    slot = ModelSlot(name="alias_model", uri=None, alias_uri="models:/porygon@production")
+    monkeypatch.setitem(model_manager.slots, slot.name, slot)
+    with slot.lock:
+        model_manager._load_slot(slot)
+    yield registry
+    model_manager._resident.pop(slot.name, None)
+
+
+def test_alias_move_swaps_in_new_version(registry):
+    slot = model_manager.slots["alias_model"]
+    assert slot.version == "1"
+    assert model_manager.predict([{"input": "q"}], model_name="alias_model") == ["1"]
+
+    registry.version = "2"
+    model_manager._check_aliases()
+
+    assert (slot.version, slot.uri) == ("2", "models:/porygon/2")
+    assert model_manager.predict([{"input": "q"}], model_name="alias_model") == ["2"]
+    # 換版前以 warmup 驗證過新版本
+    assert registry.models["2"].calls[0] == [{"input": model_manager.warmup_query}]
+
+
+def test_failed_warmup_keeps_old_model(registry):
+    slot = model_manager.slots["alias_model"]
+    registry.models["2"] = FakeModel("2", fail_warmup=True)
+    registry.version = "2"
+    model_manager._check_aliases()
+
+    assert slot.version == "1"
+    assert slot.model is registry.models["1"]
+    assert slot.load_state == "ready"
+    assert model_manager.predict([{"input": "q"}], model_name="alias_model") == ["1"]
+
+
+def test_predictions_during_swap_use_old_model(registry):
+    slot = model_manager.slots["alias_model"]
+    registry.version = "2"
+    registry.slow_versions.add("2")
+    swapper = threading.Thread(target=model_manager._check_aliases)
+    swapper.start()
+    try:
+        assert registry.loading.wait(5)
+        # 新版本載入中，slot.lock 被換版持有，預測不需要等待
+        results = [model_manager.predict([{"input": "q"}], model_name="alias_model") for _ in range(3)]
+        assert results == [["1"]] * 3
+        assert slot.version == "1"
+    finally:
+        registry.gate.set()
+        swapper.join(5)
+
+    assert slot.version == "2"
+    assert model_manager.predict([{"input": "q"}], model_name="alias_model") == ["2"]
+
+
+def test_alias_watcher_thread_swaps(registry, monkeypatch):
+    monkeypatch.setattr(model_manager, "watch_interval", 0.01)
+    registry.version = "2"
+    model_manager.start_alias_watcher()
+    try:
+        deadline = time.time() + 5
+        while model_manager.slots["alias_model"].version != "2" and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        model_manager.stop_alias_watcher()
+        model_manager._watcher.join(5)
+    assert model_manager.slots["alias_model"].version == "2"
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse, Response
+
+from porygon_api.middleware.pipeline import PipelineMiddleware, RequestContext, RequestIdStage, Stage
+
+
+class RecordingStage(Stage):
+    def __init__(self, name: str, calls: List[str], reject: bool = False):
+        self.name = name
+        self.calls = calls
+        self.reject = reject
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        self.calls.append(f"{self.name}.request")
+        if self.reject:
+            return JSONResponse(status_code=401, content={"detail": "rejected"})
+        return None
+
+    def on_response_start(self, ctx, headers):
+        self.calls.append(f"{self.name}.response_start")
+
+    async def on_complete(self, ctx: RequestContext):
+        self.calls.append(f"{self.name}.complete:{ctx.status_code}:{ctx.error}")
+
+
+class BodyStage(Stage):
+    def __init__(self):
+        self.request_body = b""
+        self.response_body = b""
+
+    def on_request_body(self, ctx, body):
+        self.request_body += body
+
+    def on_response_body(self, ctx, body):
+        self.response_body += body
+
+
+def make_client(stages, calls=None):
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(payload: dict):
+        if calls is not None:
+            calls.append("app")
+        return payload
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("secret detail")
+
+    app.add_middleware(PipelineMiddleware, stages=stages)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_stages_run_in_order_and_complete_in_reverse():
+    calls = []
+    client = make_client([RecordingStage("a", calls), RecordingStage("b", calls)], calls)
+
+    response = client.post("/echo", json={"x": 1})
+
+    assert response.status_code == 200
+    assert calls == [
+        "a.request", "b.request", "app",
+        "a.response_start", "b.response_start",
+        "b.complete:200:None", "a.complete:200:None",
+    ]
+
+
+def test_short_circuit_skips_later_stages_and_app():
+    calls = []
+    client = make_client(
+        [RecordingStage("a", calls), RecordingStage("auth", calls, reject=True), RecordingStage("c", calls)],
+        calls,
+    )
+
+    response = client.post("/echo", json={"x": 1})
+
+    assert response.status_code == 401
+    assert calls == [
+        "a.request", "auth.request",
+        "a.response_start", "auth.response_start",
+        "auth.complete:401:None", "a.complete:401:None",
+    ]
+
+
+def test_exception_returns_generic_500_and_records_error():
+    calls = []
+    client = make_client([RequestIdStage(), RecordingStage("a", calls)])
+
+    response = client.get("/boom")
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Internal Server Error"}
+    assert response.headers["X-Request-ID"]
+    assert calls[-1] == "a.complete:500:secret detail"
+
+
+def test_body_hooks_see_request_and_response():
+    stage = BodyStage()
+    client = make_client([stage])
+
+    response = client.post("/echo", json={"x": 1})
+
+    assert response.json() == {"x": 1}
+    assert stage.request_body == b'{"x":1}'
+    assert stage.response_body == b'{"x":1}'
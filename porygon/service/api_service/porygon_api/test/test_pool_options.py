@@ -0,0 +1,42 @@
+import pytest
+
+from porygon_api.database.db_connector import _pool_options, _sync_pool_options
+
+POOL_ENV = ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_MAX_CONNECTIONS", "WEB_CONCURRENCY", "DB_SYNC_POOL_SIZE", "DB_SYNC_MAX_OVERFLOW")
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in POOL_ENV:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_defaults():
+    assert _pool_options()["pool_size"] == 5
+    assert _pool_options()["max_overflow"] == 2
+    sync = _sync_pool_options()
+    assert (sync["pool_size"], sync["max_overflow"]) == (1, 1)
+
+
+def test_explicit_pool_size_wins(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "8")
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "100")
+    assert _pool_options()["pool_size"] == 8
+
+
+@pytest.mark.parametrize("max_connections, workers, sync_size, sync_overflow", [(100, 4, 1, 1), (60, 3, 2, 0), (40, 1, 3, 2)])
+def test_max_connections_budget_covers_both_engines(monkeypatch, max_connections, workers, sync_size, sync_overflow):
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", str(max_connections))
+    monkeypatch.setenv("WEB_CONCURRENCY", str(workers))
+    monkeypatch.setenv("DB_SYNC_POOL_SIZE", str(sync_size))
+    monkeypatch.setenv("DB_SYNC_MAX_OVERFLOW", str(sync_overflow))
+    options, sync = _pool_options(), _sync_pool_options()
+
+    per_worker = options["pool_size"] + options["max_overflow"] + sync["pool_size"] + sync["max_overflow"]
+    assert per_worker == max_connections // workers
+
+
+def test_small_budget_keeps_one_connection(monkeypatch):
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "8")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert _pool_options()["pool_size"] == 1
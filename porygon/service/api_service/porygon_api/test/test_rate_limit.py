@@ -0,0 +1,168 @@
+import asyncio
+import types
+
+import fakeredis
+import pytest
+
+from porygon_api.middleware.pipeline import RequestContext
+from porygon_api.middleware.rate_limit import InMemoryRateLimitBackend, RateLimitStage, RedisRateLimitBackend
+
+PATH = "/api/v1/porygon/AIservice/predict"
+# 測試期間幾乎不會補充 token
+SLOW_RATE = 0.001
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_backend(request, monkeypatch):
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.aioredis.FakeRedis())
+
+    def factory():
+        if request.param == "memory":
+            return InMemoryRateLimitBackend()
+        return RedisRateLimitBackend("redis://fake")
+    return factory
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    # 兩個 backend 都以固定時間計算，等待秒數不受測試執行速度影響
+    clock = types.SimpleNamespace(time=lambda: 1000.0, monotonic=lambda: 1000.0)
+    monkeypatch.setattr("porygon_api.middleware.rate_limit.time", clock)
+    return clock
+
+
+def make_context(user_id, role="viewer", key_hash=None):
+    user = {"user_id": user_id, "role": role}
+    if key_hash is not None:
+        user["key_hash"] = key_hash
+    scope = {"type": "http", "path": PATH, "method": "POST", "headers": [], "state": {"user": user}}
+    return RequestContext(scope)
+
+
+def test_token_bucket_allows_burst_then_waits(make_backend, frozen_clock):
+    async def scenario():
+        backend = make_backend()
+        return [await backend.take_token("key:u1", rate=2.0, burst=3) for _ in range(4)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    # 第四個 token 需等 1 / rate 秒
+    assert waits[3] == 0.5
+
+
+def test_role_rejection_refunds_key_token(make_backend):
+    limits = {"default": {"key": {"rate": SLOW_RATE, "burst": 1}, "role": {"rate": SLOW_RATE, "burst": 1}}}
+
+    async def scenario():
+        backend = make_backend()
+        stage = RateLimitStage(path_prefixes=(PATH,), limits=limits, backend=backend)
+        first = await stage.on_request(make_context("u1"))
+        # 角色額度已用完，u2 被擋下，但 u2 自己的 token 不應被扣掉
+        second = await stage.on_request(make_context("u2"))
+        remaining = await backend.take_token("key:u2", SLOW_RATE, 1)
+        return first, second, remaining
+
+    first, second, remaining = asyncio.run(scenario())
+    assert first is None
+    assert second.status_code == 429
+    assert remaining == 0.0
+
+
+def test_concurrency_slots_are_released_on_complete(make_backend):
+    limits = {"default": {"key": {"concurrency": 1}}}
+
+    async def scenario():
+        stage = RateLimitStage(path_prefixes=(PATH,), limits=limits, backend=make_backend())
+        first = make_context("u1")
+        results = [await stage.on_request(first)]
+        results.append(await stage.on_request(make_context("u1")))
+        await stage.on_complete(first)
+        results.append(await stage.on_request(make_context("u1")))
+        return results, stage.stats()
+
+    (first, second, third), stats = asyncio.run(scenario())
+    assert first is None and third is None
+    assert second.status_code == 429
+    assert stats["throttled_concurrency"] == 1
+
+
+def test_redis_slot_ttl_is_set_only_on_create(monkeypatch):
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.aioredis.FakeRedis())
+
+    async def scenario():
+        backend = RedisRateLimitBackend("redis://fake", prefix="test", slot_ttl=600)
+        key = "test:slots:key:u1"
+        assert await backend.acquire_slot("key:u1", 10)
+        first_ttl = await backend.client.ttl(key)
+        await backend.client.expire(key, 5)
+        assert await backend.acquire_slot("key:u1", 10)
+        return first_ttl, await backend.client.ttl(key)
+
+    first_ttl, ttl = asyncio.run(scenario())
+    assert first_ttl == 600
+    # 持續有請求時不會延長，異常結束留下的計數仍會過期
+    assert ttl <= 5
+
+
+def test_each_api_key_has_its_own_bucket(make_backend):
+    limits = {"default": {"key": {"rate": SLOW_RATE, "burst": 1}}}
+
+    async def scenario():
+        stage = RateLimitStage(path_prefixes=(PATH,), limits=limits, backend=make_backend())
+        return [
+            await stage.on_request(make_context("u1", key_hash="hash-a")),
+            await stage.on_request(make_context("u1", key_hash="hash-b")),
+            await stage.on_request(make_context("u1", key_hash="hash-a")),
+        ]
+
+    first, other_key, same_key = asyncio.run(scenario())
+    # 同一個使用者的另一把 key 不共用額度
+    assert first is None and other_key is None
+    assert same_key.status_code == 429
+
+
+def test_redis_release_after_expire_does_not_go_negative(monkeypatch):
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.aioredis.FakeRedis())
+    limits = {"default": {"key": {"concurrency": 2}}}
+
+    async def scenario():
+        backend = RedisRateLimitBackend("redis://fake", prefix="test", slot_ttl=600)
+        stage = RateLimitStage(path_prefixes=(PATH,), limits=limits, backend=backend)
+        key = "test:slots:key:u1"
+        in_flight = [make_context("u1"), make_context("u1")]
+        for ctx in in_flight:
+            assert await stage.on_request(ctx) is None
+        # 處理中的請求尚未結束，計數就過期了
+        await backend.client.delete(key)
+        for ctx in in_flight:
+            await stage.on_complete(ctx)
+        after_release = await backend.client.get(key)
+
+        results = [await stage.on_request(make_context("u1")) for _ in range(4)]
+        return after_release, results, await backend.client.get(key), await backend.client.ttl(key)
+
+    after_release, results, current, ttl = asyncio.run(scenario())
+    assert after_release is None
+    assert results[0] is None and results[1] is None
+    assert [response.status_code for response in results[2:]] == [429, 429]
+    assert int(current) == 2
+    assert 0 < ttl <= 600
+
+
+def test_redis_release_deletes_key_at_zero_and_restores_missing_ttl(monkeypatch):
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.aioredis.FakeRedis())
+
+    async def scenario():
+        backend = RedisRateLimitBackend("redis://fake", prefix="test", slot_ttl=600)
+        key = "test:slots:key:u1"
+        # 舊版 DECR 留下的沒有過期時間的計數
+        await backend.client.set(key, 3)
+        await backend.release_slot("key:u1")
+        ttl = await backend.client.ttl(key)
+        await backend.release_slot("key:u1")
+        await backend.release_slot("key:u1")
+        return ttl, await backend.client.exists(key)
+
+    ttl, exists = asyncio.run(scenario())
+    assert ttl == 600
+    assert exists == 0
@@ -0,0 +1,64 @@
+import os
+
+from porygon_api.monitoring.rolling_metrics import LatencySketch, RollingMetrics
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in range(1, 1001):
+        sketch.add(float(value))
+    for q, expected in ((0.5, 500), (0.95, 950), (0.99, 990)):
+        assert abs(sketch.quantile(q) - expected) / expected <= 0.02
+
+
+def test_single_worker_scope_without_shared_dir():
+    metrics = RollingMetrics(window_seconds=3600, slot_seconds=60, shared_dir="")
+    metrics.record("/a", 200, 10)
+    metrics.record("/a", 500, 30)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["scope"] == "worker"
+    assert snapshot["total_requests"] == 2
+    assert snapshot["error_rate"] == 0.5
+
+
+def test_merges_workers_through_shared_dir(tmp_path):
+    workers = [RollingMetrics(window_seconds=3600, slot_seconds=60, shared_dir=str(tmp_path)) for _ in range(2)]
+    # 同一個 process 中以不同的 started_at 模擬兩個 worker
+    workers[1].started_at -= 1
+    for worker in workers:
+        worker._ensure_writer = lambda: None
+
+    for _ in range(3):
+        workers[0].record("/a", 200, 10)
+    workers[1].record("/a", 500, 100)
+    workers[1].record("/b", 200, 20)
+    workers[1].flush()
+
+    snapshot = workers[0].snapshot()
+    assert snapshot["scope"] == "all_workers"
+    assert snapshot["workers"] == 2
+    assert snapshot["total_requests"] == 5
+    assert snapshot["routes"]["/a"]["total_requests"] == 4
+    assert snapshot["routes"]["/a"]["error_rate"] == 0.25
+    assert snapshot["routes"]["/b"]["total_requests"] == 1
+    assert abs(snapshot["routes"]["/b"]["p50_latency_ms"] - 20) <= 0.5
+    assert abs(snapshot["average_latency_ms"] - 30) <= 0.01
+
+
+def test_expired_worker_files_are_ignored_and_removed(tmp_path):
+    current = RollingMetrics(window_seconds=120, slot_seconds=60, shared_dir=str(tmp_path))
+    stopped = RollingMetrics(window_seconds=120, slot_seconds=60, shared_dir=str(tmp_path))
+    stopped.started_at -= 1
+    stopped._ensure_writer = lambda: None
+    stopped.record("/a", 200, 10)
+    # 讓所有時間片過期
+    stopped._slots = type(stopped._slots)((slot_id - 10, routes) for slot_id, routes in stopped._slots)
+    stopped.flush()
+    path = stopped._shared_path
+    os.utime(path, (0, 0))
+
+    snapshot = current.snapshot()
+    assert snapshot["total_requests"] == 0
+    assert snapshot["workers"] == 1
+    assert not os.path.exists(path)
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+from porygon_api.inference.run_logger import MlflowRunLogger, RunRecord
+
+
+class FakeClient:
+    def __init__(self):
+        self.runs = []
+        self.batches = []
+        self.terminated = []
+
+    def create_run(self, experiment_id, start_time, tags, run_name):
+        run_id = f"run-{len(self.runs)}"
+        self.runs.append({"run_id": run_id, "start_time": start_time, "tags": tags, "run_name": run_name})
+        return SimpleNamespace(info=SimpleNamespace(run_id=run_id))
+
+    def log_batch(self, run_id, metrics, params):
+        self.batches.append((run_id, metrics, params))
+
+    def set_terminated(self, run_id, status, end_time):
+        self.terminated.append((run_id, status, end_time))
+
+
+def make_record(i, status="FINISHED"):
+    return RunRecord(
+        run_name="predict",
+        tags={"model": "demo"},
+        params={"model_uri": "models:/demo/1", "batch_size": i + 1},
+        metrics={"latency_ms": float(i)},
+        start_time=1000 + i,
+        end_time=2000 + i,
+        status=status,
+    )
+
+
+def test_flush_groups_records_into_one_run():
+    client = FakeClient()
+    run_logger = MlflowRunLogger()
+    run_logger._client = client
+    run_logger.experiment_id = "0"
+    run_logger._flush([make_record(i) for i in range(5)] + [make_record(9, status="FAILED")])
+
+    # 成功與失敗各一個 run，而不是每筆預測一個 run
+    assert len(client.runs) == 2
+    assert [status for _, status, _ in client.terminated] == ["FINISHED", "FAILED"]
+    run_id, metrics, params = client.batches[0]
+    assert client.runs[0]["start_time"] == 1000
+    assert client.runs[0]["tags"]["prediction_count"] == "5"
+    assert client.terminated[0][2] == 2004
+    assert [(p.key, p.value) for p in params] == [("model_uri", "models:/demo/1")]
+    latency = [m for m in metrics if m.key == "latency_ms"]
+    assert [m.step for m in latency] == [0, 1, 2, 3, 4]
+    assert [m.value for m in metrics if m.key == "batch_size"] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert run_logger.stats()["logged"] == 6
+
+
+def test_log_run_is_skipped_when_not_started():
+    run_logger = MlflowRunLogger(max_queue=1)
+    for i in range(3):
+        run_logger.log_run(make_record(i))
+    stats = run_logger.stats()
+    assert stats["skipped"] == 3
+    assert stats["dropped"] == 0
+    assert stats["queue_size"] == 0
+
+
+def test_stop_flushes_queued_records():
+    client = FakeClient()
+    run_logger = MlflowRunLogger(flush_interval=60)
+    run_logger.start("0", client=client)
+    for i in range(3):
+        run_logger.log_run(make_record(i))
+    run_logger.stop()
+    assert len(client.runs) == 1
+    assert run_logger.stats()["logged"] == 3